@@ -0,0 +1,104 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+# Synthetic Jira issues shaped like /rest/api/3 responses, generated deterministically from (seed, index)
+# so the mock server can build any issue on demand instead of holding 50k issues in memory.
+
+PROJECT_KEY = "BENCH"
+TEAM_IDS = ["34e068f6-978d-4ad9-a4ef-3bf5eec72f65", "8d39d512-0220-4711-9ad0-f14fbf74a50e", "ac9cc58b-b860-4c4d-8a4e-5a64f50c5122"]
+SPRINT_PREFIXES = ["A Team", "Avengers", "Phoenix"]
+ISSUE_TYPES = ["Story", "Story", "Story", "Bug", "Task"]
+STORY_POINTS = [None, 1, 2, 3, 5, 8, 13, 21]
+# Jira renders timestamps in the viewing user's zone, so real payloads mix offsets
+UTC_OFFSETS = [timezone.utc, timezone(timedelta(hours=10)), timezone(timedelta(hours=-5)), timezone(timedelta(hours=5, minutes=30))]
+# Non-status changelog items that real histories are mostly made of; the report has to skip them
+NOISE_FIELDS = ["assignee", "Sprint", "description", "labels", "priority", "Rank", "Story Points"]
+BASE_CREATED = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+# Happy path through WORKFLOW_STATUSES; each step may detour (failed QA, pauses) before moving on
+HAPPY_PATH = ["To Do", "In Progress", "In Review", "Ready for Testing", "In Testing", "QA Complete", "In UAT", "Ready for Release", "Released"]
+
+def issue_key(index):
+    return f"{PROJECT_KEY}-{index}"
+
+def issue_index(key):
+    return int(key.rsplit("-", 1)[1])
+
+def format_jira_time(moment, tz):
+    local = moment.astimezone(tz)
+    return local.strftime("%Y-%m-%dT%H:%M:%S.") + f"{local.microsecond // 1000:03d}" + local.strftime("%z")
+
+def build_status_walk(rng):
+    # Returns [(from, to)] status moves; the issue stops early (still open) about a quarter of the time
+    moves = []
+    position = 0
+    stop_at = len(HAPPY_PATH) - 1 if rng.random() > 0.25 else rng.randint(1, len(HAPPY_PATH) - 2)
+    while position < stop_at:
+        current = HAPPY_PATH[position]
+        if current == "In Testing" and rng.random() < 0.25:
+            moves.append(("In Testing", "Rejected"))
+            moves.append(("Rejected", "In Progress"))
+            position = HAPPY_PATH.index("In Progress")
+            continue
+        if current == "In Progress" and rng.random() < 0.1:
+            moves.append(("In Progress", "Paused"))
+            moves.append(("Paused", "In Progress"))
+        moves.append((current, HAPPY_PATH[position + 1]))
+        position += 1
+        if len(moves) > 60:
+            break
+    # Long-tail issues: bounced around a lot, which is what pushes changelogs past the embed limit
+    extra_bounces = int(rng.lognormvariate(0, 1.2)) if rng.random() < 0.05 else 0
+    for _ in range(extra_bounces * 10):
+        moves.insert(rng.randint(1, len(moves)), ("In Review", "In Progress"))
+        moves.insert(rng.randint(1, len(moves)), ("In Progress", "In Review"))
+    return moves
+
+def make_issue(index, seed=0, history_scale=1.0):
+    rng = random.Random(seed * 1_000_003 + index)
+    tz = rng.choice(UTC_OFFSETS)
+    created = BASE_CREATED + timedelta(minutes=index * 7 + rng.randint(0, 600))
+    moves = build_status_walk(rng)
+    noise_count = int(len(moves) * history_scale * rng.uniform(0.5, 2.0))
+
+    histories = []
+    moment = created
+    events = [("status", move) for move in moves] + [("noise", None)] * noise_count
+    rng.shuffle(events)
+    # Keep status moves in walk order while interleaving the noise between them
+    status_moves = iter(moves)
+    for kind, _ in events:
+        moment += timedelta(minutes=rng.randint(5, 60 * 36))
+        items = []
+        if kind == "status":
+            from_status, to_status = next(status_moves)
+            items.append({"field": "status", "fieldtype": "jira", "from": None, "fromString": from_status, "to": None, "toString": to_status})
+            if rng.random() < 0.3:
+                items.append({"field": "timespent", "fieldtype": "jira", "from": None, "fromString": None, "to": str(rng.randint(600, 8 * 3600)), "toString": None})
+        else:
+            noise_field = rng.choice(NOISE_FIELDS)
+            items.append({"field": noise_field, "fieldtype": "custom" if noise_field in ("Sprint", "Rank", "Story Points") else "jira", "from": None, "fromString": "old", "to": None, "toString": "new"})
+        histories.append({
+            "id": str(index * 1000 + len(histories)),
+            "author": {"displayName": f"User {rng.randint(1, 40)}"},
+            "created": format_jira_time(moment, tz),
+            "items": items,
+        })
+    # Jira returns embedded changelogs newest first
+    histories.reverse()
+
+    status = moves[-1][1] if moves else "To Do"
+    team_slot = index % len(TEAM_IDS)
+    sprint_base = rng.randint(1, 20)
+    fields = {
+        "issuetype": {"name": rng.choice(ISSUE_TYPES)},
+        "summary": f"Synthetic issue {index}",
+        "assignee": {"displayName": f"User {rng.randint(1, 40)}"} if rng.random() > 0.1 else None,
+        "status": {"name": status},
+        "created": format_jira_time(created, tz),
+        "updated": format_jira_time(moment, tz),
+        "customfield_10010": [{"id": sprint_base + offset, "name": f"{SPRINT_PREFIXES[team_slot]} 2025.{sprint_base + offset:02d}"} for offset in range(rng.randint(0, 3))] or None,
+        "customfield_10014": rng.choice(STORY_POINTS),
+        "customfield_10001": {"id": TEAM_IDS[team_slot]},
+    }
+    return {"key": issue_key(index), "id": str(100000 + index), "fields": fields, "histories": histories}
@@ -0,0 +1,177 @@
+import argparse
+import gzip
+import json
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+from functools import lru_cache
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+import fixtures
+
+# A local stand-in for the Jira Cloud REST endpoints the report uses, serving fixtures.make_issue issues.
+# Run it standalone (python benchmarks/mock_jira.py --issues 5000) to point the app at it, or start it
+# from a benchmark with start_mock_server(), which runs it in its own process so serving requests does
+# not compete with the code being measured for the GIL.
+
+SEARCH_MAX_RESULTS = 100
+EMBEDDED_CHANGELOG_LIMIT = 100 # Jira embeds at most this many histories with expand=changelog
+
+class MockJiraConfig:
+    def __init__(self, issue_count=1000, seed=0, history_scale=1.0, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, rate_429=0.0, retry_after_seconds=0, gzip_responses=True):
+        self.issue_count = issue_count
+        self.seed = seed
+        self.history_scale = history_scale
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_429 = rate_429
+        self.retry_after_seconds = retry_after_seconds
+        self.gzip_responses = gzip_responses
+        self.request_counts = {}
+        self.lock = threading.Lock()
+
+def make_handler(config):
+    @lru_cache(maxsize=20000)
+    def get_issue(index):
+        return fixtures.make_issue(index, config.seed, config.history_scale)
+
+    def issue_json(issue, fields=None, expand_changelog=False):
+        data = {"key": issue["key"], "id": issue["id"], "fields": issue["fields"] if fields is None else {name: issue["fields"].get(name) for name in fields}}
+        if expand_changelog:
+            histories = issue["histories"]
+            data["changelog"] = {"startAt": 0, "maxResults": EMBEDDED_CHANGELOG_LIMIT, "total": len(histories), "histories": histories[:EMBEDDED_CHANGELOG_LIMIT]}
+        return data
+
+    def matching_indices(jql):
+        key_match = re.search(r"key\s+in\s*\(([^)]*)\)", jql, re.I)
+        if key_match:
+            keys = [key.strip().strip('"') for key in key_match.group(1).split(",") if key.strip()]
+            indices = [fixtures.issue_index(key) for key in keys if key.startswith(fixtures.PROJECT_KEY + "-")]
+            return [index for index in indices if 1 <= index <= config.issue_count]
+        if re.search(r"updated\s*>=", jql, re.I):
+            return [] # Delta queries: nothing changed since the last run
+        indices = range(1, config.issue_count + 1)
+        team_match = re.search(r"'Team\[Team\]'\s*=\s*\"([^\"]+)\"", jql)
+        if team_match and team_match.group(1) in fixtures.TEAM_IDS:
+            team_slot = fixtures.TEAM_IDS.index(team_match.group(1))
+            return [index for index in indices if index % len(fixtures.TEAM_IDS) == team_slot]
+        return list(indices)
+
+    class MockJiraHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def send_json(self, status, payload, headers=None):
+            body = json.dumps(payload).encode("utf-8")
+            extra_headers = dict(headers or {})
+            if config.gzip_responses and "gzip" in self.headers.get("Accept-Encoding", ""):
+                body = gzip.compress(body, compresslevel=1)
+                extra_headers["Content-Encoding"] = "gzip"
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in extra_headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = parse_qs(url.query)
+            endpoint = re.sub(r"/issue/[^/]+", "/issue/{key}", url.path)
+            with config.lock:
+                config.request_counts[endpoint] = config.request_counts.get(endpoint, 0) + 1
+            if config.latency_ms or config.jitter_ms:
+                time.sleep((config.latency_ms + random.uniform(0, config.jitter_ms)) / 1000)
+            if config.rate_429 and random.random() < config.rate_429:
+                return self.send_json(429, {"errorMessages": ["Rate limit exceeded"]}, {"Retry-After": str(config.retry_after_seconds)})
+            if config.error_rate and random.random() < config.error_rate:
+                return self.send_json(random.choice([502, 503, 504]), {"errorMessages": ["Injected error"]})
+
+            if url.path in ("/rest/api/3/search", "/rest/api/3/search/jql"):
+                indices = matching_indices(params.get("jql", [""])[0])
+                start_at = int(params.get("startAt", ["0"])[0])
+                max_results = min(int(params.get("maxResults", ["50"])[0]), SEARCH_MAX_RESULTS)
+                fields = [name for name in params.get("fields", [""])[0].split(",") if name] or None
+                expand_changelog = "changelog" in params.get("expand", [""])[0]
+                page = [issue_json(get_issue(index), fields, expand_changelog) for index in indices[start_at:start_at + max_results]]
+                return self.send_json(200, {"startAt": start_at, "maxResults": max_results, "total": len(indices), "issues": page})
+
+            issue_match = re.match(r"/rest/api/3/issue/([^/]+)(/changelog)?$", url.path)
+            if issue_match:
+                key = issue_match.group(1)
+                index = fixtures.issue_index(key) if key.startswith(fixtures.PROJECT_KEY + "-") else 0
+                if not 1 <= index <= config.issue_count:
+                    return self.send_json(404, {"errorMessages": [f"Issue {key} does not exist"]})
+                issue = get_issue(index)
+                if issue_match.group(2):
+                    # The paged changelog endpoint is oldest first
+                    histories = issue["histories"][::-1]
+                    start_at = int(params.get("startAt", ["0"])[0])
+                    max_results = min(int(params.get("maxResults", ["100"])[0]), 100)
+                    values = histories[start_at:start_at + max_results]
+                    return self.send_json(200, {"startAt": start_at, "maxResults": max_results, "total": len(histories), "isLast": start_at + max_results >= len(histories), "values": values})
+                return self.send_json(200, issue_json(issue, expand_changelog="changelog" in params.get("expand", [""])[0]))
+
+            if url.path in ("/rest/api/2/serverInfo", "/rest/api/3/serverInfo"):
+                return self.send_json(200, {"baseUrl": "", "version": "1001.0.0", "versionNumbers": [1001, 0, 0], "deploymentType": "Cloud"})
+            if url.path == "/rest/api/3/myself":
+                return self.send_json(200, {"accountId": "benchmark", "displayName": "Benchmark User"})
+            return self.send_json(404, {"errorMessages": [f"No mock for {url.path}"]})
+
+    return MockJiraHandler
+
+def serve(config, port=0):
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(config))
+    server.daemon_threads = True
+    return server
+
+def start_mock_server(**config_kwargs):
+    # Starts the server in a child process; returns (process, base_url). Stop it with process.terminate().
+    args = [sys.executable, __file__, "--port", "0"]
+    for name, value in config_kwargs.items():
+        if isinstance(value, bool):
+            if not value:
+                args.append(f"--no-{name.replace('_', '-')}")
+            continue
+        args += [f"--{name.replace('_', '-')}", str(value)]
+    process = subprocess.Popen(args, stdout=subprocess.PIPE, text=True)
+    base_url = process.stdout.readline().strip()
+    if not base_url.startswith("http"):
+        process.terminate()
+        raise RuntimeError("Mock Jira server failed to start")
+    return process, base_url
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local mock Jira server with synthetic issues.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--issue-count", "--issues", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--history-scale", type=float, default=1.0, help="Multiplier for non-status changelog items per issue")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with a transient 502/503/504")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--retry-after-seconds", type=int, default=0)
+    parser.add_argument("--no-gzip-responses", dest="gzip_responses", action="store_false")
+    args = parser.parse_args(argv)
+    config = MockJiraConfig(
+        args.issue_count, args.seed, args.history_scale, args.latency_ms, args.jitter_ms,
+        args.error_rate, args.rate_429, args.retry_after_seconds, args.gzip_responses
+    )
+    server = serve(config, args.port)
+    print(f"http://127.0.0.1:{server.server_address[1]}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
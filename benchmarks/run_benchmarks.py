@@ -0,0 +1,333 @@
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, REPO_ROOT)
+# Keep the benchmarks away from the real issue cache
+os.environ.setdefault("JIRA_METRICS_CACHE_PATH", os.path.join(tempfile.mkdtemp(prefix="jira-metrics-bench-"), "issues.sqlite3"))
+
+import fixtures
+import mock_jira
+import jira_metrics
+import transition_store
+
+RESULTS_DIR = os.path.join(BENCHMARKS_DIR, "results")
+SUITES = ["imports", "e2e", "durations", "excel", "preview"]
+DEFAULT_SIZES = [100, 1000, 10000]
+CYCLE_THRESHOLD_HOURS = 7 * 24
+LEAD_THRESHOLD_HOURS = 21 * 24
+BENCH_TEAM_NAME = "Phoenix"
+PER_ISSUE_FETCH_MAX_SIZE = 2000 # One request per issue: too slow to be worth running on big sizes
+
+# Cold import of the library and the Streamlit page, each in a fresh interpreter. Streamlit re-runs the
+# page on every interaction but a new pod pays the imports once; these modules must only load on first use.
+IMPORT_TIME_BUDGET_SECONDS = {"jira_metrics": 1.0, "streamlit_jira_metrics": 1.5}
+LAZY_MODULES = ["openpyxl", "jira", "aiohttp", "matplotlib", "seaborn", "plotly"]
+IMPORT_PROBE = "import sys, time; started = time.perf_counter(); import {module}; print(time.perf_counter() - started); print(','.join(name for name in {lazy_modules!r} if name in sys.modules))"
+
+# End-to-end variants: fetch option overrides on top of DEFAULT_FETCH_OPTIONS
+E2E_VARIANTS = [
+    ("bulk, threads", {"bulk_fetch": True, "fetch_engine": "threads"}),
+    ("bulk, asyncio", {"bulk_fetch": True, "fetch_engine": "asyncio"}),
+    ("per issue, threads", {"bulk_fetch": False, "fetch_engine": "threads"}),
+]
+
+# === FIXTURES ===
+def build_issue_data(size, seed, history_scale):
+    # Issues shaped the way the report sees them once the changelog has been completed
+    issues = []
+    for index in range(1, size + 1):
+        issue = fixtures.make_issue(index, seed, history_scale)
+        issues.append((issue["key"], {"key": issue["key"], "fields": issue["fields"], "changelog": {"startAt": 0, "maxResults": len(issue["histories"]), "total": len(issue["histories"]), "histories": issue["histories"]}}))
+    return issues
+
+def build_report_df(issues):
+    all_metrics = [jira_metrics.build_issue_metrics(key, issue_data) for key, issue_data in issues]
+    rows = [jira_metrics.create_row(meta, metrics, BENCH_TEAM_NAME) for meta, metrics in all_metrics]
+    return jira_metrics.build_report_dataframe(rows)
+
+def time_calls(fn, repeat):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings), statistics.median(timings), result
+
+def measure_peak_memory(fn):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+# === SUITES ===
+def bench_imports(args):
+    results = []
+    for module, budget in IMPORT_TIME_BUDGET_SECONDS.items():
+        timings = []
+        for _ in range(args.repeat):
+            probe = subprocess.run(
+                [sys.executable, "-c", IMPORT_PROBE.format(module=module, lazy_modules=LAZY_MODULES)],
+                cwd=REPO_ROOT, capture_output=True, text=True, check=True
+            )
+            seconds, eager_modules = probe.stdout.splitlines()[-2:]
+            timings.append(float(seconds))
+        eager_modules = [name for name in eager_modules.split(",") if name]
+        problems = ([f"over the {budget:.1f}s budget"] if min(timings) > budget else []) + [f"imports {name} eagerly" for name in eager_modules]
+        results.append({
+            "suite": "imports", "name": f"import {module}", "size": 0, "seconds": min(timings), "median_seconds": statistics.median(timings),
+            "budget_seconds": budget, "eager_modules": eager_modules, "error": "; ".join(problems) or None,
+        })
+    return results
+
+def bench_e2e(size, args):
+    results = []
+    process, base_url = mock_jira.start_mock_server(
+        issue_count=size, seed=args.seed, history_scale=args.history_scale, latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms, error_rate=args.error_rate, rate_429=args.rate_429
+    )
+    try:
+        for name, overrides in E2E_VARIANTS:
+            if overrides["fetch_engine"] == "asyncio" and not jira_metrics.is_async_engine_available():
+                continue
+            if not overrides["bulk_fetch"] and size > PER_ISSUE_FETCH_MAX_SIZE:
+                continue
+            fetch_options = {**jira_metrics.DEFAULT_FETCH_OPTIONS, **overrides, "use_issue_cache": False}
+            job = jira_metrics.ReportJob(f"benchmark {name}")
+            http_before = jira_metrics.get_http_stats().snapshot()
+            started = time.perf_counter()
+            df, error = None, None
+            try:
+                with jira_metrics.bind_job(job):
+                    _, _, df = jira_metrics.run_report_pipeline(
+                        "project = BENCH", base_url, "bench", "token", CYCLE_THRESHOLD_HOURS, LEAD_THRESHOLD_HOURS,
+                        "benchmark", BENCH_TEAM_NAME, fetch_options
+                    )
+            except jira_metrics.ReportAborted as e:
+                # Expected once the injected error rate outlasts the retries; still worth recording
+                error = str(e)
+            elapsed = time.perf_counter() - started
+            job.end_phase()
+            http_stats = jira_metrics.diff_http_stats(http_before, jira_metrics.get_http_stats().snapshot())
+            perf = job.perf.snapshot()
+            results.append({
+                "suite": "e2e", "name": name, "size": size, "seconds": elapsed,
+                "issues_per_second": size / elapsed, "rows": 0 if df is None else len(df),
+                "requests": sum(counts["requests"] for counts in http_stats.values()),
+                "retries": sum(counts["retries"] for counts in http_stats.values()),
+                "downloaded_mb": perf["counters"].get("bytes downloaded", 0) / 1e6,
+                "error": error,
+                "phases": {step["step"][len("phase: "):]: step["total_seconds"] for step in perf["steps"] if step["step"].startswith("phase: ")},
+            })
+    finally:
+        process.terminate()
+        process.wait()
+    return results
+
+def bench_durations(size, args, issues):
+    # Both variants include the changelog scan, so they time the same work
+    def run_per_issue():
+        for key, issue_data in issues:
+            jira_metrics.calculate_state_durations(key, issue_data)
+
+    def build_store():
+        store = transition_store.TransitionStore()
+        for key, issue_data in issues:
+            store.add_issue(key, issue_data["fields"]["created"], jira_metrics.get_issue_changelog_scan(issue_data))
+        return store.freeze()
+
+    scans = [jira_metrics.get_issue_changelog_scan(issue_data) for _, issue_data in issues]
+
+    def build_transition_tuples():
+        return [
+            [(from_status, to_status, jira_metrics.parse_jira_timestamp(created)) for created, kind, from_status, to_status in changelog_scan["events"] if kind == "status" and to_status]
+            for changelog_scan in scans
+        ]
+
+    best, median, _ = time_calls(run_per_issue, args.repeat)
+    store_best, store_median, _ = time_calls(lambda: transition_store.calculate_store_state_durations(build_store()), args.repeat)
+    histories = sum(len(issue_data["changelog"]["histories"]) for _, issue_data in issues)
+    return [
+        {
+            "suite": "durations", "name": "calculate_state_durations", "size": size, "seconds": best, "median_seconds": median,
+            "issues_per_second": size / best, "histories": histories, "transition_tuples_mb": measure_peak_memory(build_transition_tuples) / 1e6,
+        },
+        {
+            "suite": "durations", "name": "TransitionStore (vectorised)", "size": size, "seconds": store_best, "median_seconds": store_median,
+            "issues_per_second": size / store_best, "transition_store_mb": build_store().nbytes / 1e6,
+        },
+    ]
+
+def bench_excel(size, args, df):
+    results = []
+    for excel_mode in jira_metrics.EXCEL_EXPORT_MODES.values():
+        def run():
+            return jira_metrics.format_excel(df, "benchmark", CYCLE_THRESHOLD_HOURS, LEAD_THRESHOLD_HOURS, excel_mode)
+        best, median, output_buffer = time_calls(run, args.repeat)
+        results.append({
+            "suite": "excel", "name": f"format_excel ({excel_mode})", "size": size, "seconds": best, "median_seconds": median,
+            "rows_per_second": size / best, "peak_memory_mb": measure_peak_memory(run) / 1e6,
+            "file_mb": len(output_buffer.getvalue()) / 1e6,
+        })
+    return results
+
+def bench_preview(size, args, df):
+    app = import_streamlit_app()
+    page_size = app.PREVIEW_PAGE_SIZES[0]
+    story_point_bounds = app.get_story_point_bounds(df["Story Points"])
+
+    def render_page():
+        row_positions = np.arange(min(page_size, len(df)))
+        styled_page = app.build_styled_report_page(df, row_positions, story_point_bounds, CYCLE_THRESHOLD_HOURS, LEAD_THRESHOLD_HOURS)
+        return styled_page.to_html()
+
+    def style_all():
+        display_df = df.copy()
+        display_df["Story Points"] = app.format_story_points_for_display(display_df["Story Points"])
+        return app.build_report_preview_styles(display_df, CYCLE_THRESHOLD_HOURS, LEAD_THRESHOLD_HOURS, story_point_bounds)
+
+    page_best, page_median, _ = time_calls(render_page, args.repeat)
+    all_best, all_median, _ = time_calls(style_all, args.repeat)
+    return [
+        {"suite": "preview", "name": f"styled page ({page_size} rows)", "size": size, "seconds": page_best, "median_seconds": page_median},
+        {"suite": "preview", "name": "styles for all rows", "size": size, "seconds": all_best, "median_seconds": all_median, "rows_per_second": size / all_best},
+    ]
+
+def import_streamlit_app():
+    # Importing the page outside `streamlit run` works but warns about the missing script context on every st call
+    import streamlit.logger
+    streamlit.logger.set_log_level("error")
+    import streamlit_jira_metrics
+    return streamlit_jira_metrics
+
+# === RESULTS ===
+def get_git_revision():
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        return revision + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def format_result(result):
+    extras = []
+    for field, unit in (("issues_per_second", "issues/s"), ("rows_per_second", "rows/s"), ("requests", "requests"), ("retries", "retries"), ("downloaded_mb", "MB down"), ("transition_tuples_mb", "MB as tuples"), ("transition_store_mb", "MB in store"), ("peak_memory_mb", "MB peak"), ("file_mb", "MB file")):
+        if field in result:
+            value = result[field]
+            extras.append(f"{value:,.0f} {unit}" if value >= 100 or isinstance(value, int) else f"{value:.2f} {unit}")
+    if result.get("error"):
+        extras.append(f"{'FAILED' if result['suite'] == 'imports' else 'aborted'}: {result['error']}")
+    return f"{result['suite']:<10} {result['name']:<32} {result['size']:>7,} {result['seconds']:>9.3f}s  " + ", ".join(extras)
+
+def result_id(result):
+    return (result["suite"], result["name"], result["size"])
+
+def print_comparison(results, baseline_path):
+    with open(baseline_path) as baseline_file:
+        baseline = json.load(baseline_file)
+    baseline_results = {result_id(result): result for result in baseline["results"]}
+    print(f"\nCompared with {os.path.basename(baseline_path)} ({baseline['meta']['git_revision']}):")
+    for result in results:
+        previous = baseline_results.get(result_id(result))
+        if previous is None or previous.get("error") or result.get("error"):
+            continue
+        speedup = previous["seconds"] / result["seconds"] if result["seconds"] else float("inf")
+        print(f"{result['suite']:<10} {result['name']:<32} {result['size']:>7,} {previous['seconds']:>9.3f}s -> {result['seconds']:>9.3f}s  x{speedup:.2f}")
+
+def save_results(results, args):
+    started_at = datetime.now()
+    payload = {
+        "meta": {
+            "git_revision": get_git_revision(), "label": args.label, "timestamp": started_at.isoformat(timespec="seconds"),
+            "python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count(),
+            "args": {name: value for name, value in vars(args).items() if name not in ("output", "compare")},
+        },
+        "results": results,
+    }
+    output_path = args.output or os.path.join(RESULTS_DIR, f"{started_at:%Y%m%d-%H%M%S}-{payload['meta']['git_revision']}{'-' + args.label if args.label else ''}.json")
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    with open(output_path, "w") as output_file:
+        json.dump(payload, output_file, indent=2)
+    return output_path
+
+# === MAIN ===
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks against a local mock Jira server and synthetic issues.")
+    parser.add_argument("--sizes", type=lambda value: [int(size) for size in value.split(",")], default=DEFAULT_SIZES, help="Comma separated issue counts (default: 100,1000,10000; up to 50000)")
+    parser.add_argument("--suites", type=lambda value: value.split(","), default=SUITES, help=f"Comma separated subset of {','.join(SUITES)}")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per in-process benchmark; the best time is reported")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--history-scale", type=float, default=1.0, help="Multiplier for non-status changelog items per issue")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Mock server latency per request")
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of mock requests answered with a 5xx")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Fraction of mock requests answered with 429")
+    parser.add_argument("--label", default="", help="Added to the results file name, e.g. 'before-parser-change'")
+    parser.add_argument("--output", help="Results JSON path (default: benchmarks/results/<time>-<git revision>.json)")
+    parser.add_argument("--compare", help="Earlier results JSON to compare against")
+    args = parser.parse_args(argv)
+    unknown_suites = set(args.suites) - set(SUITES)
+    if unknown_suites:
+        parser.error(f"Unknown suites: {', '.join(sorted(unknown_suites))}")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.ERROR)
+    jira_metrics.set_message_sink(lambda level, message: None)
+    results = []
+    if "imports" in args.suites:
+        results += bench_imports(args)
+        for result in results:
+            print(format_result(result), flush=True)
+    for size in args.sizes:
+        if "e2e" in args.suites:
+            e2e_results = bench_e2e(size, args)
+            for result in e2e_results:
+                print(format_result(result), flush=True)
+            results += e2e_results
+        if not {"durations", "excel", "preview"} & set(args.suites):
+            continue
+        issues = build_issue_data(size, args.seed, args.history_scale)
+        size_results = []
+        if "durations" in args.suites:
+            size_results += bench_durations(size, args, issues)
+        df = build_report_df(issues) if {"excel", "preview"} & set(args.suites) else None
+        del issues
+        if "excel" in args.suites:
+            size_results += bench_excel(size, args, df)
+        if "preview" in args.suites:
+            size_results += bench_preview(size, args, df)
+        for result in size_results:
+            print(format_result(result), flush=True)
+        results += size_results
+
+    output_path = save_results(results, args)
+    print(f"\nResults written to {output_path}")
+    if args.compare:
+        print_comparison(results, args.compare)
+    # A slow or eager import fails the run so it can guard CI
+    if any(result["suite"] == "imports" and result["error"] for result in results):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+from array import array
+from datetime import datetime, timedelta, timezone
+import time
+
+import numpy as np
+
+from jira_metrics import JIRA_LOCAL_TIME_LENGTH, JIRA_TIMESTAMP_LENGTH, WORKFLOW_STATUSES, parse_jira_timestamp
+
+# Experimental column-wise alternative to the per-issue duration path, kept here so the durations benchmark
+# can compare the two. It matches calculate_state_durations exactly and holds transitions in a few bytes
+# each, but the report still needs one metrics dict per issue for its rows, snapshots and live preview,
+# so it is not used by jira_metrics itself.
+
+UNIX_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+ONE_MICROSECOND = timedelta(microseconds=1)
+
+def jira_timestamp_to_epoch_us(value):
+    return (parse_jira_timestamp(value) - UNIX_EPOCH) // ONE_MICROSECOND
+
+def jira_timestamps_to_epoch_us(values):
+    # Batch version for a whole changelog: one int64 array, parsed by numpy's datetime64 instead of per value
+    texts = np.asarray(values, dtype=str)
+    if not len(texts):
+        return np.zeros(0, dtype=np.int64)
+    if texts.dtype.itemsize != JIRA_TIMESTAMP_LENGTH * 4 or not (np.char.str_len(texts) == JIRA_TIMESTAMP_LENGTH).all():
+        return np.fromiter((jira_timestamp_to_epoch_us(value) for value in values), dtype=np.int64, count=len(texts))
+    codes = texts.view(np.uint32).reshape(len(texts), JIRA_TIMESTAMP_LENGTH)
+    offset_codes = codes[:, JIRA_LOCAL_TIME_LENGTH:].astype(np.int64)
+    signs = offset_codes[:, 0]
+    digits = offset_codes[:, 1:] - ord("0")
+    if not (((signs == ord("+")) | (signs == ord("-"))).all() and ((digits >= 0) & (digits <= 9)).all()):
+        return np.fromiter((jira_timestamp_to_epoch_us(value) for value in values), dtype=np.int64, count=len(texts))
+    local_us = texts.astype(f"U{JIRA_LOCAL_TIME_LENGTH}").astype("datetime64[us]").astype(np.int64)
+    offset_seconds = (digits[:, 0] * 10 + digits[:, 1]) * 3600 + (digits[:, 2] * 10 + digits[:, 3]) * 60
+    return local_us - np.where(signs == ord("-"), -offset_seconds, offset_seconds) * 1_000_000
+
+# === TRANSITION STORE ===
+# Status transitions of many issues held column-wise: interned status codes, int64 epoch-microsecond timestamps
+# and CSR-style offsets (issue i owns events offsets[i]:offsets[i + 1], in changelog order). A few bytes per
+# transition instead of a tuple, a datetime and two strings, and every issue's durations come out of one
+# vectorised pass (calculate_store_state_durations) with the same values calculate_state_durations gives.
+TIMESTAMP_MISSING = np.iinfo(np.int64).max
+
+class TransitionStore:
+    def __init__(self):
+        self.issue_keys = []
+        self.status_codes = {None: -1}
+        self.status_names = []
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.from_codes = np.zeros(0, dtype=np.int16)
+        self.to_codes = np.zeros(0, dtype=np.int16)
+        self.timestamps = np.zeros(0, dtype=np.int64)
+        self.created = np.zeros(0, dtype=np.int64)
+        # Appended issues are buffered here and their timestamps parsed in one batch by freeze()
+        self._pending_counts = array("q")
+        self._pending_from_codes = array("h")
+        self._pending_to_codes = array("h")
+        self._pending_timestamps = []
+        self._pending_created = []
+
+    def __len__(self):
+        return len(self.issue_keys)
+
+    def status_code(self, status):
+        code = self.status_codes.get(status)
+        if code is None:
+            code = self.status_codes[status] = len(self.status_names)
+            self.status_names.append(status)
+        return code
+
+    def add_issue(self, issue_key, created, changelog_scan):
+        # created is the issue's raw 'created' field; only status events that lead somewhere count, as in scan_changelog
+        count = 0
+        status_code = self.status_codes.get
+        for event_created, kind, from_status, to_status in changelog_scan["events"]:
+            if kind != "status" or not to_status:
+                continue
+            from_code = status_code(from_status)
+            if from_code is None:
+                from_code = self.status_code(from_status)
+            to_code = status_code(to_status)
+            if to_code is None:
+                to_code = self.status_code(to_status)
+            self._pending_from_codes.append(from_code)
+            self._pending_to_codes.append(to_code)
+            self._pending_timestamps.append(event_created)
+            count += 1
+        self.issue_keys.append(issue_key)
+        self._pending_counts.append(count)
+        self._pending_created.append(created)
+
+    def freeze(self):
+        if not self._pending_counts:
+            return self
+        self.offsets = np.concatenate([self.offsets, self.offsets[-1] + np.cumsum(np.frombuffer(self._pending_counts, dtype=np.int64))])
+        self.from_codes = np.concatenate([self.from_codes, np.frombuffer(self._pending_from_codes, dtype=np.int16)])
+        self.to_codes = np.concatenate([self.to_codes, np.frombuffer(self._pending_to_codes, dtype=np.int16)])
+        self.timestamps = np.concatenate([self.timestamps, jira_timestamps_to_epoch_us(self._pending_timestamps)])
+        self.created = np.concatenate([self.created, jira_timestamps_to_epoch_us(self._pending_created)])
+        self._pending_counts = array("q")
+        self._pending_from_codes = array("h")
+        self._pending_to_codes = array("h")
+        self._pending_timestamps = []
+        self._pending_created = []
+        return self
+
+    @property
+    def nbytes(self):
+        return self.offsets.nbytes + self.from_codes.nbytes + self.to_codes.nbytes + self.timestamps.nbytes + self.created.nbytes
+
+def get_store_status_times(store):
+    # (entered, reached): issues x statuses matrices of the first entry in changelog order and the earliest
+    # entry in time, TIMESTAMP_MISSING where an issue never entered the status
+    store.freeze()
+    issue_count, status_count = len(store), len(store.status_names)
+    issue_index = np.repeat(np.arange(issue_count, dtype=np.int64), np.diff(store.offsets))
+    cells = issue_index * status_count + store.to_codes
+    entered = np.full(issue_count * status_count, TIMESTAMP_MISSING, dtype=np.int64)
+    first_cells, first_positions = np.unique(cells, return_index=True)
+    entered[first_cells] = store.timestamps[first_positions]
+    reached = np.full(issue_count * status_count, TIMESTAMP_MISSING, dtype=np.int64)
+    np.minimum.at(reached, cells, store.timestamps)
+    return entered.reshape(issue_count, status_count), reached.reshape(issue_count, status_count)
+
+def get_store_status_column(store, status_times, status):
+    code = store.status_codes.get(status)
+    if code is None:
+        return np.full(len(store), TIMESTAMP_MISSING, dtype=np.int64)
+    return status_times[:, code]
+
+def calculate_store_durations(store, entered, now_us):
+    # Vectorised calculate_durations: (issues x WORKFLOW_STATUSES hours with NaN, column of the open status or -1)
+    issue_count = len(store)
+    status_times = np.column_stack([
+        store.created if status == "To Do" else get_store_status_column(store, entered, status)
+        for status in WORKFLOW_STATUSES
+    ])
+    # Stable, so statuses entered at the same moment keep WORKFLOW_STATUSES order like sorted() does
+    order = np.argsort(status_times, axis=1, kind="stable")
+    ordered_times = np.take_along_axis(status_times, order, axis=1)
+    present = ordered_times != TIMESTAMP_MISSING
+    ordered_times = np.where(present, ordered_times, 0)
+
+    ordered_hours = np.full(ordered_times.shape, np.nan)
+    ordered_hours[:, :-1] = np.where(present[:, 1:], (ordered_times[:, 1:] - ordered_times[:, :-1]) / 1e6 / 3600.0, np.nan)
+    # The latest status is still open: its duration runs until now
+    rows = np.arange(issue_count)
+    last_positions = present.sum(axis=1) - 1
+    open_hours = (now_us - ordered_times[rows, last_positions]) / 1e6 / 3600.0
+    is_open = (last_positions >= 0) & (open_hours >= 0)
+    ordered_hours[rows[is_open], last_positions[is_open]] = open_hours[is_open]
+
+    hours = np.empty_like(ordered_hours)
+    hours[rows[:, None], order] = ordered_hours
+    open_columns = np.where(is_open, order[rows, np.maximum(last_positions, 0)], -1)
+    return hours, open_columns
+
+def calculate_store_metrics(store, reached):
+    # Vectorised calculate_metrics: (lead time hours, cycle time hours), NaN where not reached
+    released = get_store_status_column(store, reached, "Released")
+    lead_end = np.where(released != TIMESTAMP_MISSING, released, get_store_status_column(store, reached, "Closed"))
+    cycle_start = get_store_status_column(store, reached, "In Progress")
+    cycle_end = get_store_status_column(store, reached, "QA Complete")
+    lead_time = np.where(lead_end != TIMESTAMP_MISSING, (lead_end - store.created) / 1e6 / 3600.0, np.nan)
+    has_cycle = (cycle_start != TIMESTAMP_MISSING) & (cycle_end != TIMESTAMP_MISSING)
+    cycle_time = np.where(has_cycle, (np.where(has_cycle, cycle_end, 0) - np.where(has_cycle, cycle_start, 0)) / 1e6 / 3600.0, np.nan)
+    return lead_time, cycle_time
+
+def calculate_store_state_durations(store, now=None):
+    # One metrics dict per issue in the store, as calculate_state_durations would return them
+    now = time.time() if now is None else now
+    entered, reached = get_store_status_times(store)
+    hours, open_columns = calculate_store_durations(store, entered, round(now * 1e6))
+    lead_time, cycle_time = calculate_store_metrics(store, reached)
+    all_metrics = []
+    for issue_hours, open_column, issue_lead_time, issue_cycle_time in zip(hours.tolist(), open_columns.tolist(), lead_time.tolist(), cycle_time.tolist()):
+        all_metrics.append({
+            "lead_time_hours": None if issue_lead_time != issue_lead_time else issue_lead_time,
+            "cycle_time_hours": None if issue_cycle_time != issue_cycle_time else issue_cycle_time,
+            "durations_by_status_hours": {status: value for status, value in zip(WORKFLOW_STATUSES, issue_hours) if value == value},
+            "open_status": WORKFLOW_STATUSES[open_column] if open_column >= 0 else None,
+            "computed_at": now,
+        })
+    return all_metrics
@@ -0,0 +1,2583 @@
+import pandas as pd
+import re
+import numpy as np
+import io
+import argparse
+import asyncio
+import contextvars
+import cProfile
+import hashlib
+import json
+import logging
+import marshal
+import pstats
+import queue
+import random
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+import warnings
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import datetime, date
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+from operator import itemgetter
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from requests.auth import HTTPBasicAuth
+from importlib.util import find_spec
+# openpyxl and aiohttp are imported where they are used: each adds ~0.2 s to a cold start and the
+# Streamlit page only needs them once a report is exported or fetched with the asyncio engine
+import os
+import zipfile
+import zlib
+from copy import copy
+from collections import OrderedDict
+
+# --- Configuration Constants (from your jira_cycle_lead_time.ipynb) ---
+STATUS_INPUT = "Released, Closed"
+CYCLE_STATUSES = ["In Progress", "In Review", "Ready for Testing", "In Testing"]
+WORKFLOW_STATUSES = [
+    "To Do", "In Progress", "Paused", "In Review", "Ready for Testing",
+    "In Testing", "QA Complete", "In UAT", "In UAT Testing",
+    "Ready for Release", "Released", "Closed"
+]
+# Report columns holding hours as floats (NaN = N/A); they are only turned into "2 days 3 hrs" text for display and Excel
+REPORT_DURATION_COLUMNS = ["Cycle Time", "Lead Time"] + WORKFLOW_STATUSES
+# Typed report frame: repeated text as categoricals, counts as nullable small ints, hours as float32 and
+# Created/Resolved as datetimes in the wall-clock time Jira reported them in (Excel has no time zones)
+REPORT_CATEGORY_COLUMNS = ["Type", "Assignee", "Status", "Sprints"]
+REPORT_INTEGER_COLUMNS = ["Story Points", "Failed QA Count"]
+REPORT_DATETIME_COLUMNS = ["Created", "Resolved"]
+REPORT_INTEGER_DTYPE = "Int32"
+REPORT_HOURS_DTYPE = "float32"
+RESOLVED_STATUSES = ("qa complete", "done", "closed")
+
+# Hardcoded TEAMS data from your ipynb file (name mapped to ID)
+TEAMS_DATA = OrderedDict([
+    ("A Team", "34e068f6-978d-4ad9-a4ef-3bf5eec72f65"),
+    ("Avengers", "8d39d512-0220-4711-9ad0-f14fbf74a50e"),
+    ("Jarvis", "1ec8443e-a42c-4613-bc88-513ee29203d0"),
+    ("Mavrix", "1d8f251a-8fd9-4385-8f5f-6541c28bda19"),
+    ("Phoenix", "ac9cc58b-b860-4c4d-8a4e-5a64f50c5122"),
+    ("Quantum", "99b45e3f-49de-446c-b28d-25ef8e915ad6")
+])
+
+# Hardcoded DURATIONS data from your ipynb file
+DURATIONS_DATA = OrderedDict([
+    ("Year to Date", "startOfYear()"),
+    ("Current Month", "startOfMonth()"),
+    ("Last Month", "startOfMonth(-1)"),
+    ("Last 2 Months", "startOfMonth(-2)"),
+    ("Last 3 Months", "startOfMonth(-3)"),
+    ("Last 6 Months", "startOfMonth(-6)"),
+    ("Custom Date Range", "customDateRange()")
+])
+
+# --- Custom Field IDs (from previous context, used in extract_issue_meta) ---
+CUSTOM_FIELD_ACCOUNT_ID = 'customfield_10267' # Not used in this report script's JQL
+CUSTOM_FIELD_TEAM_ID = 'customfield_10001' # Used for JQL based on name, not ID here
+CUSTOM_FIELD_STORY_POINTS_ID = 'customfield_10014' # Used in extract_issue_meta for Story Points column
+CUSTOM_FIELD_SPRINTS_ID = 'customfield_10010' # Used in extract_issue_meta for Sprints column
+
+# --- Bulk fetch settings ---
+# Only the fields read by extract_issue_meta / calculate_state_durations, so bulk search pages stay small
+ISSUE_FIELDS = ["issuetype", "summary", "assignee", "status", "created", "updated", CUSTOM_FIELD_SPRINTS_ID, CUSTOM_FIELD_STORY_POINTS_ID]
+SEARCH_PAGE_SIZE = 100
+CHANGELOG_PAGE_SIZE = 100
+
+# --- HTTP transport settings ---
+HTTP_TIMEOUT_SECONDS = 30
+HTTP_MAX_RETRIES = 5
+HTTP_BACKOFF_BASE_SECONDS = 0.5
+HTTP_BACKOFF_MAX_SECONDS = 30
+HTTP_RETRY_STATUSES = {429, 502, 503, 504}
+HTTP_THROTTLE_STATUSES = {429, 503}
+
+# --- Adaptive fetch concurrency (AIMD) settings ---
+CONCURRENCY_FLOOR = 2
+CONCURRENCY_CEILING = 32 # Also the connection pool size
+CONCURRENCY_START = 5
+CONCURRENCY_DECREASE_FACTOR = 0.5
+CONCURRENCY_LATENCY_TOLERANCE = 2.0 # Stop growing once latency exceeds this multiple of the best seen
+
+# --- Fetch engines ---
+FETCH_ENGINES = OrderedDict([
+    ("Threads", "threads"),
+    ("Asyncio", "asyncio")
+])
+
+# --- Persistent issue cache settings ---
+ISSUE_CACHE_PATH = os.environ.get("JIRA_METRICS_CACHE_PATH", os.path.join(os.path.expanduser("~"), ".cache", "jira-metrics", "issues.sqlite3"))
+ISSUE_CACHE_MAX_AGE_DAYS = 30
+ISSUE_CACHE_MAX_SIZE_MB = 256
+DELTA_OVERLAP_MINUTES = 5 # Re-read a little before the last run to cover clock skew and in-flight edits
+
+# --- Shared report cache settings ---
+REPORT_CACHE_TTL_SECONDS = 15 * 60
+REPORT_CACHE_MAX_ENTRIES = 16
+REPORT_CACHE_WAIT_POLL_SECONDS = 0.5 # How often a job waiting on another job's crawl checks for Cancel
+
+# --- Background job settings ---
+JOB_WORKERS = 4
+JOB_ABANDON_SECONDS = 120 # A job whose page stopped polling for this long is cancelled
+JOB_RETENTION_SECONDS = 3600
+# Structured events worker threads emit for the page: an issue (or search page) fetched, parsed or failed, or a request retried
+JOB_EVENT_KINDS = ("fetched", "parsed", "failed", "retried")
+
+# --- Opt-in profiling of report jobs ---
+PROFILE_MODES = ("cprofile", "sampling")
+PROFILE_MODE = os.environ.get("JIRA_METRICS_PROFILE", "").strip().lower() or None # cprofile / sampling; unset = off
+PROFILE_TOP_N = 30
+PROFILE_SAMPLE_INTERVAL_SECONDS = 0.005
+
+# Excel highlighting: baked-in cell styles, or conditional-formatting rules Excel evaluates itself
+EXCEL_EXPORT_MODES = OrderedDict([
+    ("Styled cells", "cells"),
+    ("Conditional formatting", "rules")
+])
+EXCEL_HEATMAP_BUCKETS = 8
+
+DEFAULT_FETCH_OPTIONS = {
+    "bulk_fetch": True,
+    "fetch_engine": "threads",
+    "use_issue_cache": True,
+    "force_refresh": False,
+    "delta_refresh": False,
+    "concurrency_limits": (CONCURRENCY_FLOOR, CONCURRENCY_CEILING),
+    "excel_mode": "cells",
+}
+
+# === APP MESSAGES ===
+logger = logging.getLogger("jira_metrics")
+
+APP_MESSAGE_LOG_LEVELS = {"critical": logging.CRITICAL, "error": logging.ERROR, "warning": logging.WARNING, "info": logging.INFO, "success": logging.INFO}
+
+# Where messages raised outside a report job go; the Streamlit page installs one that renders them
+_message_sink = None
+
+def set_message_sink(sink):
+    global _message_sink
+    _message_sink = sink
+
+def log_app_message(level, message):
+    logger.log(APP_MESSAGE_LOG_LEVELS.get(level.lower(), logging.INFO), message)
+
+def add_app_message(level, message):
+    job = get_current_job()
+    if job is not None:
+        # Background jobs must not touch st.*; the page publishes their log when it polls them
+        job.log(level, message)
+        return
+    (_message_sink or log_app_message)(level, message)
+
+class ReportAborted(Exception):
+    pass
+
+def stop_report(message):
+    # Reports run on job threads or headless, where st.stop() would be a no-op, so aborting always raises
+    add_app_message("error", message)
+    raise ReportAborted(message)
+
+# === BACKGROUND JOBS ===
+class JobCancelled(BaseException):
+    # BaseException so the per-issue 'except Exception' handlers don't swallow a cancellation
+    pass
+
+class PerfRecorder:
+    # Timing samples (seconds) and counters for one report run, shared by all of its worker threads
+    def __init__(self):
+        self._samples = OrderedDict()
+        self._counters = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds):
+        with self._lock:
+            self._samples.setdefault(name, []).append(seconds)
+
+    def count(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def snapshot(self):
+        with self._lock:
+            samples = OrderedDict((name, np.array(values)) for name, values in self._samples.items())
+            counters = dict(self._counters)
+        steps = []
+        for name, values in samples.items():
+            p50, p95, p99 = np.percentile(values, [50, 95, 99]) * 1000
+            steps.append({
+                "step": name, "count": len(values), "total_seconds": round(float(values.sum()), 4),
+                "p50_ms": round(float(p50), 2), "p95_ms": round(float(p95), 2), "p99_ms": round(float(p99), 2), "max_ms": round(float(values.max()) * 1000, 2),
+            })
+        return {"steps": steps, "counters": counters}
+
+# === PROFILING ===
+# Only active for jobs submitted with a profile mode; bind_job profiles every thread working for such a job
+_profile_thread_state = threading.local()
+
+class CProfileReportProfiler:
+    # Deterministic: one cProfile per thread (a profiler only sees its own thread), merged when read
+    artifact_suffix = ".prof"
+
+    def __init__(self):
+        self._profiles = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def profile_thread(self):
+        if getattr(_profile_thread_state, "active", False):
+            yield
+            return
+        thread_id = threading.get_ident()
+        with self._lock:
+            profiler = self._profiles.setdefault(thread_id, cProfile.Profile())
+        _profile_thread_state.active = True
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            _profile_thread_state.active = False
+
+    def stats(self):
+        with self._lock:
+            profiles = list(self._profiles.values())
+        if not profiles:
+            return None
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        return stats
+
+    def top_functions(self, limit=PROFILE_TOP_N):
+        stats = self.stats()
+        if stats is None:
+            return []
+        rows = [
+            {"function": f"{func_name} ({os.path.basename(filename)}:{line})", "calls": total_calls, "self_seconds": round(self_time, 4), "cumulative_seconds": round(cumulative_time, 4)}
+            for (filename, line, func_name), (_, total_calls, self_time, cumulative_time, _) in stats.stats.items()
+        ]
+        return sorted(rows, key=lambda row: row["self_seconds"], reverse=True)[:limit]
+
+    def artifact(self):
+        # Same bytes pstats.Stats.dump_stats writes; opens with pstats, snakeviz and friends
+        stats = self.stats()
+        return marshal.dumps(stats.stats if stats is not None else {})
+
+class SamplingReportProfiler:
+    # Statistical: a helper thread snapshots the stacks of the threads working for the job
+    artifact_suffix = ".folded.txt"
+
+    def __init__(self, interval=PROFILE_SAMPLE_INTERVAL_SECONDS):
+        self.interval = interval
+        self._stack_counts = {}
+        self._thread_ids = {}
+        self._sampler = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def profile_thread(self):
+        thread_id = threading.get_ident()
+        with self._lock:
+            self._thread_ids[thread_id] = self._thread_ids.get(thread_id, 0) + 1
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._sample_until_idle, name="report-profiler", daemon=True)
+                self._sampler.start()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._thread_ids[thread_id] -= 1
+                if not self._thread_ids[thread_id]:
+                    del self._thread_ids[thread_id]
+
+    def _sample_until_idle(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._thread_ids:
+                    self._sampler = None
+                    return
+                thread_ids = set(self._thread_ids)
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id not in thread_ids:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_name, os.path.basename(code.co_filename), code.co_firstlineno))
+                    frame = frame.f_back
+                stack = tuple(reversed(stack))
+                with self._lock:
+                    self._stack_counts[stack] = self._stack_counts.get(stack, 0) + 1
+
+    def top_functions(self, limit=PROFILE_TOP_N):
+        with self._lock:
+            stack_counts = dict(self._stack_counts)
+        self_samples, total_samples = {}, {}
+        for stack, count in stack_counts.items():
+            self_samples[stack[-1]] = self_samples.get(stack[-1], 0) + count
+            for frame in set(stack):
+                total_samples[frame] = total_samples.get(frame, 0) + count
+        rows = [
+            {"function": f"{func_name} ({filename}:{line})", "self_samples": self_samples.get((func_name, filename, line), 0), "total_samples": count,
+             "self_seconds": round(self_samples.get((func_name, filename, line), 0) * self.interval, 4), "cumulative_seconds": round(count * self.interval, 4)}
+            for (func_name, filename, line), count in total_samples.items()
+        ]
+        return sorted(rows, key=lambda row: row["self_samples"], reverse=True)[:limit]
+
+    def artifact(self):
+        # Folded stacks ("outer;inner count" per line) for flamegraph.pl / speedscope
+        with self._lock:
+            stack_counts = dict(self._stack_counts)
+        return "".join(
+            ";".join(f"{func_name} ({filename}:{line})" for func_name, filename, line in stack) + f" {count}\n"
+            for stack, count in sorted(stack_counts.items(), key=lambda item: item[1], reverse=True)
+        ).encode("utf-8")
+
+def create_report_profiler(profile_mode):
+    if profile_mode == "cprofile":
+        return CProfileReportProfiler()
+    if profile_mode == "sampling":
+        return SamplingReportProfiler()
+    return None
+
+class ReportJob:
+    def __init__(self, description, profile_mode=None):
+        self.job_id = uuid.uuid4().hex[:12]
+        self.description = description
+        self.status = "queued"
+        self.phase = "Queued"
+        self.done = 0
+        self.total = 0
+        self.result = None
+        self.error = None
+        self.created_at = time.monotonic()
+        self.phase_started_at = self.created_at
+        self.finished_at = None
+        self.perf = PerfRecorder()
+        self.profiler = create_report_profiler(profile_mode)
+        self._phase_entered_at = self.created_at
+        self.last_polled = time.monotonic()
+        self._messages = []
+        self._partial_results = []
+        # Worker threads only ever put() structured events here; the page thread drains them
+        self._events = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._cancel_event = threading.Event()
+
+    def log(self, level, message):
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._lock:
+            self._messages.append((level.lower(), timestamp, message))
+        self.emit("log", detail=(level.lower(), timestamp, message))
+
+    def emit(self, kind, issue_key=None, elapsed=None, detail=None):
+        self._events.put((kind, time.monotonic(), issue_key, elapsed, detail))
+
+    def drain_events(self):
+        events = []
+        try:
+            while True:
+                events.append(self._events.get_nowait())
+        except queue.Empty:
+            return events
+
+    def messages(self):
+        with self._lock:
+            return list(self._messages)
+
+    def set_phase(self, phase, total=None):
+        self.end_phase()
+        with self._lock:
+            self.phase = phase
+            if total is not None:
+                self.total = total
+                self.done = 0
+                self.phase_started_at = time.monotonic()
+
+    def end_phase(self):
+        # Phases run back to back, so each one's wall time is recorded when the next one starts
+        now = time.monotonic()
+        with self._lock:
+            phase, elapsed = self.phase, now - self._phase_entered_at
+            self._phase_entered_at = now
+        self.perf.record(f"phase: {phase}", elapsed)
+
+    def set_total(self, total):
+        with self._lock:
+            self.total = total
+
+    def advance(self, count=1):
+        with self._lock:
+            self.done += count
+
+    def eta_seconds(self):
+        with self._lock:
+            if not self.done or self.done >= self.total:
+                return None
+            return (time.monotonic() - self.phase_started_at) / self.done * (self.total - self.done)
+
+    def add_partial_result(self, result):
+        with self._lock:
+            self._partial_results.append(result)
+
+    def partial_results(self, start=0):
+        with self._lock:
+            return self._partial_results[start:]
+
+    def heartbeat(self):
+        self.last_polled = time.monotonic()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def check_cancelled(self):
+        if not self._cancel_event.is_set() and time.monotonic() - self.last_polled > JOB_ABANDON_SECONDS:
+            self.log("warning", "Report abandoned (page stopped polling); cancelling.")
+            self._cancel_event.set()
+        if self._cancel_event.is_set():
+            raise JobCancelled()
+
+class JobRunner:
+    def __init__(self, max_workers=JOB_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="report-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, description, job_fn, profile_mode=None):
+        job = ReportJob(description, profile_mode)
+        with self._lock:
+            self._prune()
+            self._jobs[job.job_id] = job
+        self._executor.submit(self._run, job, job_fn)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job, job_fn):
+        job.status = "running"
+        try:
+            with bind_job(job):
+                job.check_cancelled()
+                job.result = job_fn(job)
+            job.status = "done"
+        except JobCancelled:
+            job.status = "cancelled"
+        except BaseException as e:
+            job.error = str(e) or e.__class__.__name__
+            if not isinstance(e, ReportAborted):
+                job.log("error", f"Report job failed: {job.error}")
+            job.status = "failed"
+        finally:
+            job.end_phase()
+            job.finished_at = time.monotonic()
+
+    def _prune(self):
+        now = time.monotonic()
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished_at and now - job.finished_at > JOB_RETENTION_SECONDS]:
+            del self._jobs[job_id]
+
+@lru_cache(maxsize=None)
+def get_job_runner():
+    return JobRunner()
+
+# The report job bound to the current thread; worker threads inherit it through bind_job
+_job_context = threading.local()
+
+def get_current_job():
+    return getattr(_job_context, "job", None)
+
+@contextmanager
+def bind_job(job):
+    previous_job = get_current_job()
+    _job_context.job = job
+    try:
+        if job is not None and job.profiler is not None:
+            with job.profiler.profile_thread():
+                yield job
+        else:
+            yield job
+    finally:
+        _job_context.job = previous_job
+
+def check_job_cancelled():
+    job = get_current_job()
+    if job is not None:
+        job.check_cancelled()
+
+def set_job_phase(phase, total=None):
+    job = get_current_job()
+    if job is not None:
+        job.set_phase(phase, total)
+
+def set_job_total(total):
+    job = get_current_job()
+    if job is not None:
+        job.set_total(total)
+
+def advance_job_progress(count=1):
+    job = get_current_job()
+    if job is not None:
+        job.advance(count)
+
+def publish_job_result(result):
+    job = get_current_job()
+    if job is not None:
+        job.add_partial_result(result)
+
+def record_perf(name, seconds):
+    job = get_current_job()
+    if job is not None:
+        job.perf.record(name, seconds)
+
+def count_perf(name, value=1):
+    job = get_current_job()
+    if job is not None:
+        job.perf.count(name, value)
+
+@contextmanager
+def perf_timer(name):
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_perf(name, time.perf_counter() - started_at)
+
+def emit_job_event(kind, issue_key=None, elapsed=None, detail=None):
+    # kind is one of JOB_EVENT_KINDS; elapsed is in seconds
+    job = get_current_job()
+    if job is not None:
+        job.emit(kind, issue_key, elapsed, detail)
+
+def summarize_job_events(events, summary=None):
+    # Folds drained events into running counts and total seconds per kind, plus the log lines
+    summary = summary if summary is not None else {"counts": dict.fromkeys(JOB_EVENT_KINDS, 0), "seconds": dict.fromkeys(JOB_EVENT_KINDS, 0.0), "log": []}
+    for kind, _, _, elapsed, detail in events:
+        if kind == "log":
+            summary["log"].append(detail)
+            continue
+        summary["counts"][kind] += 1
+        if elapsed is not None:
+            summary["seconds"][kind] += elapsed
+    return summary
+
+def format_job_event_summary(summary):
+    counts, seconds = summary["counts"], summary["seconds"]
+    parts = [f"{counts['fetched']} fetched", f"{counts['parsed']} parsed", f"{counts['failed']} failed", f"{counts['retried']} retries"]
+    if counts["fetched"]:
+        parts.append(f"avg fetch {seconds['fetched'] / counts['fetched'] * 1000:.0f} ms")
+    if counts["parsed"]:
+        parts.append(f"avg parse {seconds['parsed'] / counts['parsed'] * 1000:.1f} ms")
+    return ", ".join(parts)
+
+# === HTTP TRANSPORT ===
+class HttpStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_host = {}
+
+    def record(self, host, counter):
+        with self._lock:
+            host_stats = self._by_host.setdefault(host, {"requests": 0, "retries": 0})
+            host_stats[counter] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {host: dict(counts) for host, counts in self._by_host.items()}
+
+@lru_cache(maxsize=None)
+def get_http_stats():
+    return HttpStats()
+
+def get_backoff_delay(attempt):
+    # Full jitter: spread retries from concurrent workers instead of retrying in lockstep
+    return random.uniform(0, min(HTTP_BACKOFF_MAX_SECONDS, HTTP_BACKOFF_BASE_SECONDS * (2 ** attempt)))
+
+def get_retry_after_delay(response):
+    retry_after = response.headers.get("Retry-After")
+    if not retry_after:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(retry_after)
+        return max(0.0, (retry_at - datetime.now(tz=retry_at.tzinfo)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+# Per-thread count of throttled responses, read by the concurrency limiter around each fetch
+_http_thread_state = threading.local()
+
+def get_thread_throttle_count():
+    return getattr(_http_thread_state, "throttled", 0)
+
+class RetryingHTTPAdapter(HTTPAdapter):
+    def __init__(self, stats, retries=HTTP_MAX_RETRIES, **kwargs):
+        self.stats = stats
+        self.retries = retries
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = HTTP_TIMEOUT_SECONDS
+        host = urlparse(request.url).netloc
+        attempt = 0
+        while True:
+            check_job_cancelled()
+            self.stats.record(host, "requests")
+            request_started_at = time.perf_counter()
+            try:
+                response = super().send(request, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if attempt >= self.retries:
+                    raise
+                delay = get_backoff_delay(attempt)
+            else:
+                if response.status_code in HTTP_THROTTLE_STATUSES:
+                    _http_thread_state.throttled = get_thread_throttle_count() + 1
+                if response.status_code not in HTTP_RETRY_STATUSES or attempt >= self.retries:
+                    if not kwargs.get("stream"):
+                        # requests reads the body right after this anyway; once read, raw.tell() is its size on the wire
+                        response.content
+                        count_perf("bytes downloaded", response.raw.tell())
+                    record_perf("http request", time.perf_counter() - request_started_at)
+                    return response
+                delay = get_retry_after_delay(response)
+                if delay is None:
+                    delay = get_backoff_delay(attempt)
+                response.close()
+            attempt += 1
+            self.stats.record(host, "retries")
+            count_perf("http retries")
+            emit_job_event("retried", elapsed=min(delay, HTTP_BACKOFF_MAX_SECONDS), detail=host)
+            time.sleep(min(delay, HTTP_BACKOFF_MAX_SECONDS))
+
+# One keep-alive session per site and credentials, shared by search, changelog fetches and the python-jira client
+_http_sessions = {}
+_http_sessions_lock = threading.Lock()
+
+def get_http_session(jira_url, username, api_token, pool_size=CONCURRENCY_CEILING):
+    session_key = (jira_url.rstrip("/"), get_credential_fingerprint(username, api_token))
+    with _http_sessions_lock:
+        session = _http_sessions.get(session_key)
+        if session is None:
+            session = _http_sessions[session_key] = requests.Session()
+            session.auth = HTTPBasicAuth(username, api_token)
+            session.headers.update({"Accept": "application/json", "Accept-Encoding": "gzip, deflate"})
+            adapter = RetryingHTTPAdapter(get_http_stats(), pool_connections=4, pool_maxsize=pool_size)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+        else:
+            grow_http_pool(session.get_adapter("https://"), pool_size)
+    return session
+
+def grow_http_pool(adapter, pool_size):
+    # A higher concurrency ceiling needs more pooled connections per host. The pool manager is swapped
+    # rather than the adapter: requests in flight keep their connections, new ones use the larger pool.
+    if pool_size > adapter._pool_maxsize:
+        adapter.init_poolmanager(adapter._pool_connections, pool_size, block=adapter._pool_block)
+
+def diff_http_stats(before, after):
+    return {
+        host: {counter: value - before.get(host, {}).get(counter, 0) for counter, value in counts.items()}
+        for host, counts in after.items()
+        if counts != before.get(host)
+    }
+
+def format_http_stats(stats_snapshot):
+    return ", ".join(f"{host}: {counts['requests']} requests, {counts['retries']} retries" for host, counts in stats_snapshot.items()) or "no requests"
+
+# === GET ISSUES FROM JQL ===
+def get_issues_by_jql(jql, jira_url, username, api_token):
+    return list(get_issue_watermarks_by_jql(jql, jira_url, username, api_token))
+
+def get_issue_watermarks_by_jql(jql, jira_url, username, api_token):
+    # Issue key -> fields.updated, in JQL order; the cache uses it to decide what to refetch
+    session = get_http_session(jira_url, username, api_token)
+    if not jql.strip():
+        stop_report("JQL query cannot be empty.")
+    watermarks = OrderedDict()
+    start_at = 0
+    max_results = 50
+    while True:
+        url = f"{jira_url}/rest/api/3/search"
+        params = {
+            "jql": jql,
+            "fields": "updated",
+            "startAt": start_at,
+            "maxResults": max_results
+        }
+        try:
+            with perf_timer("search page (keys)"):
+                response = session.get(url, params=params)
+                response.raise_for_status()
+                data = response.json()
+            issues = data.get("issues", [])
+            watermarks.update((issue['key'], issue.get('fields', {}).get('updated')) for issue in issues)
+            if len(issues) < max_results:
+                break
+            start_at += max_results
+        except requests.exceptions.RequestException as e:
+            stop_report(f"Network or API error during JQL search: {e}")
+        except Exception as e:
+            stop_report(f"An unexpected error occurred during JQL search: {e}")
+    return watermarks
+
+# === GET ISSUES WITH CHANGELOG FROM JQL (BULK) ===
+def get_issues_with_changelog_by_jql(jql, jira_url, username, api_token):
+    return list(iter_issues_with_changelog_by_jql(jql, jira_url, username, api_token))
+
+def iter_issues_with_changelog_by_jql(jql, jira_url, username, api_token, report_total=False):
+    # Yields issues page by page so callers can start parsing before the search is finished
+    session = get_http_session(jira_url, username, api_token)
+    if not jql.strip():
+        stop_report("JQL query cannot be empty.")
+    start_at = 0
+    while True:
+        url = f"{jira_url}/rest/api/3/search"
+        params = {
+            "jql": jql,
+            "fields": ",".join(ISSUE_FIELDS),
+            "expand": "changelog",
+            "startAt": start_at,
+            "maxResults": SEARCH_PAGE_SIZE
+        }
+        try:
+            page_started_at = time.monotonic()
+            response = session.get(url, params=params)
+            response.raise_for_status()
+            data = response.json()
+            page = data.get("issues", [])
+            for issue in page:
+                complete_issue_changelog(issue, jira_url, session)
+            record_perf("search page (with changelogs)", time.monotonic() - page_started_at)
+            emit_job_event("fetched", elapsed=time.monotonic() - page_started_at, detail=len(page))
+        except requests.exceptions.RequestException as e:
+            stop_report(f"Network or API error during bulk JQL search: {e}")
+        except Exception as e:
+            stop_report(f"An unexpected error occurred during bulk JQL search: {e}")
+        if report_total and start_at == 0:
+            set_job_total(data.get("total", 0))
+        yield from page
+        # Jira may cap maxResults below what we ask for, so page by what actually came back
+        start_at += len(page)
+        if not page or start_at >= data.get("total", 0):
+            break
+
+def get_issues_with_changelog_by_keys(issue_keys, jira_url, username, api_token):
+    return list(iter_issues_with_changelog_by_keys(issue_keys, jira_url, username, api_token))
+
+def iter_issues_with_changelog_by_keys(issue_keys, jira_url, username, api_token):
+    for start in range(0, len(issue_keys), SEARCH_PAGE_SIZE):
+        chunk = issue_keys[start:start + SEARCH_PAGE_SIZE]
+        yield from iter_issues_with_changelog_by_jql(f"key in ({', '.join(chunk)})", jira_url, username, api_token)
+
+def is_changelog_truncated(changelog):
+    histories = changelog.get('histories', [])
+    return changelog.get('total', len(histories)) > len(histories)
+
+def complete_issue_changelog(issue_data, jira_url, session):
+    changelog = issue_data.setdefault('changelog', {'histories': []})
+    if is_changelog_truncated(changelog):
+        with perf_timer("changelog completion"):
+            histories = get_full_changelog(issue_data['key'], jira_url, session)
+        issue_data['changelog'] = {'startAt': 0, 'maxResults': len(histories), 'total': len(histories), 'histories': histories}
+    return issue_data
+
+def get_full_changelog(issue_key, jira_url, session):
+    histories = []
+    start_at = 0
+    while True:
+        url = f"{jira_url}/rest/api/3/issue/{issue_key}/changelog"
+        params = {"startAt": start_at, "maxResults": CHANGELOG_PAGE_SIZE}
+        response = session.get(url, params=params)
+        response.raise_for_status()
+        data = response.json()
+        values = data.get("values", [])
+        histories.extend(values)
+        start_at += len(values)
+        if not values or data.get("isLast", start_at >= data.get("total", 0)):
+            break
+    # The paged endpoint is oldest first; keep the newest-first order of embedded changelogs
+    histories.sort(key=lambda h: h['created'], reverse=True)
+    return histories
+
+# === FORMAT DURATION ===
+# def format_duration(hours):
+#     if hours is None: return "N/A"
+#     if hours < 24: return f"{int(round(hours))} hrs"
+#     days = int(hours // 24)
+#     rem_hrs = int(round(hours % 24))
+#     return f"{days} days" if rem_hrs == 0 else f"{days} days {rem_hrs} hrs"
+
+def format_duration(hours):
+    if hours is None or pd.isna(hours):
+        return "N/A"
+    total_minutes = int(round(hours * 60))  # Convert to minutes
+    days = total_minutes // (24 * 60)
+    rem_minutes = total_minutes % (24 * 60)
+    hrs = rem_minutes // 60
+    mins = rem_minutes % 60
+
+    parts = []
+    if days > 0:
+        parts.append(f"{days} days")
+    if hrs > 0:
+        parts.append(f"{hrs} hrs")
+    if mins > 0 or not parts:
+        parts.append(f"{mins} mins")
+
+    return " ".join(parts)
+
+def format_report_values(df):
+    # Durations as "2 days 3 hrs" text and missing story points as "N/A", the way the sheet and previews show them
+    formatted_df = df.copy()
+    for col in REPORT_DURATION_COLUMNS:
+        if col in formatted_df.columns:
+            formatted_df[col] = formatted_df[col].map(format_duration)
+    if "Story Points" in formatted_df.columns:
+        formatted_df["Story Points"] = format_story_points(formatted_df["Story Points"])
+    return formatted_df
+
+def format_story_points(story_points):
+    return story_points.astype(object).where(story_points.notna(), "N/A")
+
+# === GET ISSUE WITH CHANGELOG ===
+def get_issue_changelog(issue_key, jira_url, username, api_token, pool_size=CONCURRENCY_CEILING):
+    session = get_http_session(jira_url, username, api_token, pool_size)
+    url = f"{jira_url}/rest/api/3/issue/{issue_key}?expand=changelog"
+    try:
+        response = session.get(url)
+        response.raise_for_status()
+        return complete_issue_changelog(response.json(), jira_url, session)
+    except requests.exceptions.RequestException as e:
+        add_app_message("error", f"Network or API error fetching changelog for {issue_key}: {e}")
+        raise
+    except Exception as e:
+        add_app_message("error", f"An unexpected error occurred fetching changelog for {issue_key}: {e}")
+        raise
+
+def seconds_to_dhm(seconds):
+    days = seconds // 86400
+    hours = (seconds % 86400) // 3600
+    minutes = (seconds % 3600) // 60
+    return f"{days} days {hours} hrs {minutes} mins"
+
+def seconds_to_hm(seconds_str):
+    try:
+        seconds = int(seconds_str)
+    except (ValueError, TypeError):
+        return ""
+
+    hours = seconds // 3600
+    minutes = (seconds % 3600) // 60
+    return f"{hours} hrs {minutes} mins"
+
+# === EXCEL FORMATTER ===
+# The workbook is written in one streaming pass (openpyxl write-only mode): every cell gets its final
+# named style as it is appended, so there is no write -> load_workbook -> restyle -> save round trip.
+EXCEL_SHEET_TITLE = "JIRA Cycle Times"
+EXCEL_BREACH_COLOR = "FFD580"
+EXCEL_LEGEND_COLUMN_GAP = 2
+EXCEL_DATETIME_FORMAT = "yyyy-mm-dd hh:mm"
+EXCEL_HEATMAP_STYLE_NAMES = np.array([f"Report Heatmap {level:02X}" for level in range(256)], dtype=object)
+
+def format_excel(df, output_file_label, cycle_threshold, lead_threshold, excel_mode="cells"):
+    from openpyxl import Workbook
+    if cycle_threshold <= 0 or lead_threshold <= 0:
+        raise ValueError("Cycle Time and Lead Time thresholds must be positive integers.")
+
+    wb = Workbook(write_only=True)
+    selected_team_name_for_sprints = output_file_label.split('_')[0].replace('-', ' ').title()
+    write_report_sheet(wb, EXCEL_SHEET_TITLE, df, selected_team_name_for_sprints, cycle_threshold, lead_threshold, excel_mode)
+
+    output_buffer = io.BytesIO()
+    with perf_timer("excel: save workbook"):
+        wb.save(output_buffer)
+    output_buffer.seek(0)
+    return output_buffer
+
+def format_batch_excel(team_reports, summary_df, cycle_threshold, lead_threshold, excel_mode="cells"):
+    # One workbook: the cross-team summary first, then one report sheet per team
+    from openpyxl import Workbook
+    if cycle_threshold <= 0 or lead_threshold <= 0:
+        raise ValueError("Cycle Time and Lead Time thresholds must be positive integers.")
+
+    wb = Workbook(write_only=True)
+    write_summary_sheet(wb, summary_df)
+    for team_idx, (team_name, team_df) in enumerate(team_reports.items(), start=1):
+        if team_df.empty:
+            continue
+        write_report_sheet(wb, team_name[:31], team_df, team_name, cycle_threshold, lead_threshold, excel_mode, table_name=f"JIRAMetricsTable{team_idx}")
+
+    output_buffer = io.BytesIO()
+    with perf_timer("excel: save workbook"):
+        wb.save(output_buffer)
+    output_buffer.seek(0)
+    return output_buffer
+
+def format_batch_zip(team_reports, summary_df, file_label, cycle_threshold, lead_threshold, excel_mode="cells"):
+    # Separate files: one single-team workbook per team plus the summary workbook, zipped together
+    from openpyxl import Workbook
+    if cycle_threshold <= 0 or lead_threshold <= 0:
+        raise ValueError("Cycle Time and Lead Time thresholds must be positive integers.")
+    output_buffer = io.BytesIO()
+    with zipfile.ZipFile(output_buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
+        summary_wb = Workbook(write_only=True)
+        write_summary_sheet(summary_wb, summary_df)
+        summary_buffer = io.BytesIO()
+        summary_wb.save(summary_buffer)
+        zip_file.writestr(f"{file_label}_summary.xlsx", summary_buffer.getvalue())
+        for team_name, team_df in team_reports.items():
+            if team_df.empty:
+                continue
+            team_wb = Workbook(write_only=True)
+            write_report_sheet(team_wb, EXCEL_SHEET_TITLE, team_df, team_name, cycle_threshold, lead_threshold, excel_mode)
+            team_buffer = io.BytesIO()
+            team_wb.save(team_buffer)
+            zip_file.writestr(f"{file_label}_{team_name.lower().replace(' ', '_')}.xlsx", team_buffer.getvalue())
+    output_buffer.seek(0)
+    return output_buffer
+
+def write_report_sheet(wb, sheet_title, df, team_name_for_sprints, cycle_threshold, lead_threshold, excel_mode="cells", table_name="JIRAMetricsTable"):
+    ws = wb.create_sheet(sheet_title)
+    ws.sheet_properties.tabColor = "1072BA"
+
+    with perf_timer("excel: format values"):
+        export_df = format_report_values(df)
+        headers = list(export_df.columns)
+        column_widths = get_excel_column_widths(export_df)
+        mark_current_sprints(export_df, team_name_for_sprints)
+
+    with perf_timer("excel: sheet setup"):
+        format_sheet(ws, headers, column_widths, len(export_df), cycle_threshold, lead_threshold, table_name)
+    helper_df = None
+    with perf_timer("excel: highlighting"):
+        if excel_mode == "rules":
+            helper_df = get_excel_helper_columns(df)
+            cell_styles = np.full(df.shape, get_excel_named_style(wb, "Report Cell"), dtype=object)
+            add_highlight_rules(ws, headers, helper_df, len(export_df) + 1, cycle_threshold, lead_threshold)
+        else:
+            cell_styles = get_excel_cell_styles(wb, df, cycle_threshold, lead_threshold)
+        date_cols = [idx for idx, col in enumerate(headers) if col in REPORT_DATETIME_COLUMNS]
+        cell_styles[:, date_cols] = get_excel_named_style(wb, "Report Date", number_format=EXCEL_DATETIME_FORMAT)
+    header_comments = add_tooltip_comments(headers, cycle_threshold, lead_threshold)
+    with perf_timer("excel: write rows"):
+        write_sheet_rows(ws, export_df, cell_styles, header_comments, get_legend_entries(cycle_threshold, lead_threshold), helper_df)
+
+def write_summary_sheet(wb, summary_df):
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.utils import get_column_letter
+    ws = wb.create_sheet("Summary")
+    ws.sheet_properties.tabColor = "1072BA"
+    headers = list(summary_df.columns)
+    create_table(ws, headers, len(summary_df) + 1, "JIRASummaryTable")
+    freeze_top_row(ws)
+    for col, width in enumerate(get_excel_column_widths(summary_df), start=1):
+        ws.column_dimensions[get_column_letter(col)].width = width
+    ws.sheet_view.showGridLines = False
+
+    header_style = get_excel_named_style(wb, "Report Header", header=True)
+    cell_style = get_excel_named_style(wb, "Report Cell")
+    header_cells = []
+    for col in headers:
+        cell = WriteOnlyCell(ws, value=col)
+        cell.style = header_style
+        header_cells.append(cell)
+    ws.append(header_cells)
+    for values in summary_df.astype(object).where(summary_df.notna(), None).to_numpy().tolist():
+        cells = []
+        for value in values:
+            cell = WriteOnlyCell(ws, value=value)
+            cell.style = cell_style
+            cells.append(cell)
+        ws.append(cells)
+
+# === FORMAT SHEET ===
+def format_sheet(sheet, headers, column_widths, row_count, cycle_threshold, lead_threshold, table_name="JIRAMetricsTable"):
+    # Sheet-level settings have to be in place before the first row is streamed out
+    from openpyxl.utils import get_column_letter
+    last_row = row_count + 1
+    create_table(sheet, headers, last_row, table_name)
+    freeze_top_row(sheet)
+    for col, width in enumerate(column_widths, start=1):
+        sheet.column_dimensions[get_column_letter(col)].width = width
+    sheet.sheet_view.showGridLines = False
+    col_idx = {col: idx + 1 for idx, col in enumerate(headers)}
+    apply_story_points_gradient(sheet, col_idx, last_row)
+    legend_col = len(headers) + EXCEL_LEGEND_COLUMN_GAP
+    legend_labels = ["Legend"] + [label for label, _ in get_legend_entries(cycle_threshold, lead_threshold)]
+    sheet.column_dimensions[get_column_letter(legend_col)].width = max(len(label) for label in legend_labels) + 5
+
+# === TABLE CREATION AND FORMATTING ===
+def create_table(sheet, headers, last_row, table_name="JIRAMetricsTable"):
+    from openpyxl.utils import get_column_letter
+    from openpyxl.worksheet.table import Table, TableStyleInfo
+    table = Table(displayName=table_name, ref=f"A1:{get_column_letter(len(headers))}{last_row}")
+    # Write-only sheets can't read the header row back, so the table columns are declared up front
+    table._initialise_columns()
+    for table_column, header in zip(table.tableColumns, headers):
+        table_column.name = str(header)
+    style = TableStyleInfo(name="TableStyleMedium1", showFirstColumn=False, showLastColumn=False, showRowStripes=True)
+    table.tableStyleInfo = style
+    with warnings.catch_warnings():
+        # openpyxl warns on every write-only add_table, even when the columns are already declared
+        warnings.filterwarnings("ignore", message="In write-only mode you must add table columns manually")
+        sheet.add_table(table)
+
+# === SHEET FORMATTING FUNCTIONS ===
+def freeze_top_row(sheet):
+    sheet.freeze_panes = "B2"
+
+def get_excel_column_widths(export_df):
+    # Longest rendered value (header included) + 5, measured before the sprint markers are added
+    widths = []
+    for col in export_df.columns:
+        lengths = [len(str(val)) for val in export_df[col] if not pd.isna(val)]
+        widths.append(max([len(str(col))] + lengths) + 5)
+    return widths
+
+def get_excel_named_style(wb, name, fill_color=None, header=False, number_format=None):
+    # Named styles are stored once in the workbook; cells only reference them by name
+    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, NamedStyle
+    from openpyxl.styles.fonts import DEFAULT_FONT
+    if name not in wb.named_styles:
+        thin = Side(style='thin')
+        style = NamedStyle(name=name, font=copy(DEFAULT_FONT), border=Border(left=thin, right=thin, top=thin, bottom=thin))
+        if number_format:
+            style.number_format = number_format
+        if fill_color:
+            style.fill = PatternFill(start_color=fill_color, end_color=fill_color, fill_type="solid")
+        if header:
+            style.alignment = Alignment(horizontal="center")
+            style.font = Font(color="FFFFFF", bold=True)
+        wb.add_named_style(style)
+    return name
+
+def add_tooltip_comments(headers, cycle_threshold, lead_threshold):
+    from openpyxl.comments import Comment
+    comments = {
+        "Cycle Time": f"Orange if Cycle Time > {cycle_threshold // 24} days",
+        "Lead Time": f"Orange if Lead Time > {lead_threshold // 24} days",
+        "Story Points": "Green gradient: low → high Story Points",
+    }
+    return {col: Comment(comments[col], "System") for col in headers if col in comments}
+
+def apply_story_points_gradient(sheet, col_idx, last_row):
+    from openpyxl.formatting.rule import ColorScaleRule
+    from openpyxl.utils import get_column_letter
+    sp_col = col_idx.get("Story Points")
+    if sp_col:
+        sp_letter = get_column_letter(sp_col)
+        sp_range = f"{sp_letter}2:{sp_letter}{last_row}"
+        blue_gradient = ColorScaleRule(
+            start_type='min', start_color='E6F0FA',
+            mid_type='percentile', mid_value=50, mid_color='4FC3F7',
+            end_type='max', end_color='1565C0'
+        )
+        sheet.conditional_formatting.add(sp_range, blue_gradient)
+
+def get_current_and_previous_sprints(team_name_for_sprint, base_sprint="2025.12", base_start_date_str="2025-06-11", sprint_length_days=14):
+    base_year, base_sprint_num = map(int, base_sprint.split("."))
+    base_start_date = datetime.strptime(base_start_date_str, "%Y-%m-%d").date()
+    today = datetime.today().date()
+
+    days_elapsed = (today - base_start_date).days
+    if days_elapsed < 0:
+        return (f"{team_name_for_sprint} {base_year}.{base_sprint_num:02d}", f"{team_name_for_sprint} {max(base_sprint_num - 1, 1):02d}")
+
+    sprint_offset = days_elapsed // sprint_length_days
+    current_sprint_num = base_sprint_num + sprint_offset
+    current_year = base_year
+
+    while current_sprint_num > 52:
+        current_sprint_num -= 52
+        current_year += 1
+    
+    previous_sprint_num = current_sprint_num - 1
+    previous_sprint_year = current_year
+    if previous_sprint_num <= 0:
+        previous_sprint_num += 52
+        previous_sprint_year -= 1
+
+
+    return (
+        f"{team_name_for_sprint} {current_year}.{current_sprint_num:02d}",
+        f"{team_name_for_sprint} {previous_sprint_year}.{previous_sprint_num:02d}"
+    )
+
+def mark_current_sprints(export_df, team_name_for_sprint):
+    if "Sprints" not in export_df.columns:
+        add_app_message("warning", "Sprints column not found for sprint highlighting.")
+        return
+    current_sprint_full, previous_sprint_full = get_current_and_previous_sprints(team_name_for_sprint, base_sprint="2025.12", base_start_date_str="2025-06-11")
+    export_df["Sprints"] = export_df["Sprints"].map(lambda value: mark_sprint_cell(value, current_sprint_full, previous_sprint_full))
+
+def mark_sprint_cell(value, current_sprint_full, previous_sprint_full):
+    if not value or pd.isna(value):
+        return value
+    sprint_values_in_cell = [s.strip() for s in str(value).split(",")]
+    modified = False
+    updated_sprints = []
+
+    for sprint_text in sprint_values_in_cell:
+        sprint_clean = sprint_text.replace("🔶", "").replace("🔷", "").strip()
+
+        if sprint_clean == current_sprint_full:
+            updated_sprints.append(f"{sprint_clean} 🔶")
+            modified = True
+        elif sprint_clean == previous_sprint_full:
+            updated_sprints.append(f"{sprint_clean} 🔷")
+            modified = True
+        else:
+            updated_sprints.append(sprint_text)
+
+    return ", ".join(updated_sprints) if modified else value
+
+def calculate_cycle_time_hours(report_df):
+    # Time spent in the cycle statuses; a row with none of it has no cycle time to highlight
+    cycle_cols = [status for status in CYCLE_STATUSES if status in report_df.columns]
+    total_hours = report_df[cycle_cols].sum(axis=1, min_count=1)
+    return total_hours.where(total_hours > 0)
+
+def get_excel_cell_styles(wb, report_df, cycle_threshold, lead_threshold):
+    # Named style for every data cell, worked out column-wise from the numeric report
+    cell_styles = np.full(report_df.shape, get_excel_named_style(wb, "Report Cell"), dtype=object)
+    col_positions = {col: idx for idx, col in enumerate(report_df.columns)}
+    cycle_hours = calculate_cycle_time_hours(report_df).to_numpy(dtype=float)
+    lead_hours = report_df["Lead Time"].to_numpy(dtype=float) if "Lead Time" in col_positions else np.full(len(report_df), np.nan)
+
+    breach_style = get_excel_named_style(wb, "Report Breach", EXCEL_BREACH_COLOR)
+    if "Cycle Time" in col_positions:
+        cell_styles[cycle_hours > cycle_threshold, col_positions["Cycle Time"]] = breach_style
+    if "Lead Time" in col_positions:
+        cell_styles[lead_hours > lead_threshold, col_positions["Lead Time"]] = breach_style
+
+    # Rows breaching lead time get a heatmap over the pre-release statuses, rows breaching only cycle time over the cycle statuses
+    lead_breached = lead_hours >= lead_threshold
+    cycle_breached = (cycle_hours >= cycle_threshold) & ~lead_breached
+    lead_scope = [status for status in WORKFLOW_STATUSES if status not in {"Released", "Closed"}]
+    for scope_statuses, scope_rows in ((lead_scope, lead_breached), (CYCLE_STATUSES, cycle_breached)):
+        scope_cols = [status for status in scope_statuses if status in col_positions]
+        if not scope_cols or not scope_rows.any():
+            continue
+        levels, present = workflow_heatmap_levels(report_df.loc[scope_rows, scope_cols].to_numpy(dtype=float))
+        for level in np.unique(levels[present]):
+            get_excel_named_style(wb, EXCEL_HEATMAP_STYLE_NAMES[level], f"FFFF{level:02X}{level:02X}")
+        scope_cells = np.ix_(np.flatnonzero(scope_rows), [col_positions[status] for status in scope_cols])
+        scope_styles = cell_styles[scope_cells]
+        scope_styles[present] = EXCEL_HEATMAP_STYLE_NAMES[levels[present]]
+        cell_styles[scope_cells] = scope_styles
+    return cell_styles
+
+def workflow_heatmap_levels(hours):
+    # Per-row min/max normalisation; same arithmetic as calculate_heatmap_color so the shades match exactly.
+    # Returns the green/blue byte of each cell's red shade and which cells have a duration at all.
+    row_min = np.fmin.reduce(hours, axis=1, keepdims=True)
+    row_max = np.fmax.reduce(hours, axis=1, keepdims=True)
+    delta = row_max - row_min
+    delta[delta == 0] = 1
+    present = ~np.isnan(hours)
+    intensity = np.where(present, (hours - row_min) / delta, 0.0)
+    return np.clip(np.trunc(200 - 120 * intensity), 0, 255).astype(int), present
+
+def calculate_heatmap_color(intensity):
+    r = 255; g = int(200 - 120 * intensity); b = int(200 - 120 * intensity)
+    r = max(0, min(255, r)); g = max(0, min(255, g)); b = max(0, min(255, b))
+    return f"FF{r:02X}{g:02X}{b:02X}"
+
+def get_legend_entries(cycle_threshold, lead_threshold):
+    from openpyxl.styles import PatternFill
+    orange_fill = PatternFill(start_color=EXCEL_BREACH_COLOR, end_color=EXCEL_BREACH_COLOR, fill_type="solid")
+    return [
+        (f"Cycle Time > {cycle_threshold // 24}d", orange_fill),
+        (f"Lead Time > {lead_threshold // 24}d", orange_fill),
+        ("Story Points: Light→Dark Blue", PatternFill(start_color="A9D0F5", end_color="1565C0", fill_type="solid")),
+        ("Workflow: Light→Dark Red (per row, if breached)", PatternFill(start_color="FFCCCC", end_color="FF6666", fill_type="solid")),
+    ]
+
+def write_sheet_rows(sheet, export_df, cell_styles, header_comments, legend_entries, helper_df=None):
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+    header_style = get_excel_named_style(sheet.parent, "Report Header", header=True)
+    legend_gap = [None] * (EXCEL_LEGEND_COLUMN_GAP - 1)
+    helper_rows = [[]] * (len(export_df) + 1)
+    if helper_df is not None:
+        helper_rows = [legend_gap + list(helper_df.columns)] + [legend_gap + values for values in helper_df.astype(object).where(helper_df.notna(), None).to_numpy().tolist()]
+    legend_title = WriteOnlyCell(sheet, value="Legend")
+    legend_title.font = Font(bold=True, size=12, underline="single")
+    legend_cells = [legend_title]
+    for label, fill in legend_entries:
+        legend_cell = WriteOnlyCell(sheet, value=label)
+        legend_cell.fill = fill
+        legend_cell.font = Font(bold=True)
+        legend_cells.append(legend_cell)
+
+    header_cells = []
+    for col in export_df.columns:
+        cell = WriteOnlyCell(sheet, value=col)
+        cell.style = header_style
+        if col in header_comments:
+            cell.comment = header_comments[col]
+        header_cells.append(cell)
+    sheet.append(header_cells + legend_gap + [legend_cells[0]] + helper_rows[0])
+
+    # Resolving a named style by name is a list scan in openpyxl; resolve each one once and reuse its style array
+    style_arrays = {}
+    for style in np.unique(cell_styles):
+        template_cell = WriteOnlyCell(sheet)
+        template_cell.style = style
+        style_arrays[style] = template_cell._style
+
+    row_values = export_df.astype(object).where(export_df.notna(), None).to_numpy()
+    for row_number, (values, styles) in enumerate(zip(row_values, cell_styles), start=1):
+        cells = []
+        for value, style in zip(values, styles):
+            cell = WriteOnlyCell(sheet, value=value)
+            cell._style = copy(style_arrays[style])
+            cells.append(cell)
+        cells += legend_gap + [legend_cells[row_number] if row_number < len(legend_cells) else None] + helper_rows[row_number]
+        sheet.append(cells)
+    for legend_cell in legend_cells[len(row_values) + 1:]:
+        sheet.append([None] * len(export_df.columns) + legend_gap + [legend_cell])
+
+# === CONDITIONAL FORMATTING EXPORT ===
+# Instead of one fill per cell, the "rules" export writes the durations as numbers into hidden helper
+# columns (after the legend) and adds a fixed set of worksheet rules that read them, so Excel shades
+# the sheet itself and re-evaluates it when a helper value is edited. Rule count depends on the
+# columns only; the per-row heatmap is approximated with EXCEL_HEATMAP_BUCKETS shades.
+def get_excel_helper_columns(report_df):
+    # Hundredths of an hour are enough for thresholds and shading and keep the helper cells short
+    duration_cols = [col for col in REPORT_DURATION_COLUMNS if col in report_df.columns]
+    return report_df[duration_cols].astype("float64").round(2).rename(columns=lambda col: f"{col} (hrs)")
+
+def get_excel_helper_letters(headers, helper_df):
+    from openpyxl.utils import get_column_letter
+    first_helper_col = len(headers) + 2 * EXCEL_LEGEND_COLUMN_GAP
+    return {col[:-len(" (hrs)")]: get_column_letter(first_helper_col + idx) for idx, col in enumerate(helper_df.columns)}
+
+def get_excel_column_runs(col_numbers):
+    # Consecutive sheet columns are grouped so each group can share one rule with a relative reference
+    runs = []
+    for col in sorted(col_numbers):
+        if runs and runs[-1][-1] == col - 1:
+            runs[-1].append(col)
+        else:
+            runs.append([col])
+    return runs
+
+def add_highlight_rules(sheet, headers, helper_df, last_row, cycle_threshold, lead_threshold):
+    from openpyxl.formatting.rule import FormulaRule
+    from openpyxl.styles import PatternFill
+    from openpyxl.utils import get_column_letter, column_index_from_string
+    col_idx = {col: idx + 1 for idx, col in enumerate(headers)}
+    helper_letters = get_excel_helper_letters(headers, helper_df)
+    for helper_letter in helper_letters.values():
+        sheet.column_dimensions[helper_letter].hidden = True
+
+    helper_col_numbers = {status: column_index_from_string(letter) for status, letter in helper_letters.items()}
+
+    def row_refs(statuses):
+        runs = get_excel_column_runs(helper_col_numbers[status] for status in statuses if status in helper_col_numbers)
+        return ",".join(f"${get_column_letter(run[0])}2" + (f":${get_column_letter(run[-1])}2" if len(run) > 1 else "") for run in runs)
+
+    orange_fill = PatternFill(start_color=EXCEL_BREACH_COLOR, end_color=EXCEL_BREACH_COLOR, fill_type="solid")
+    lead_hours = f"${helper_letters['Lead Time']}2"
+    cycle_hours = f"SUM({row_refs(CYCLE_STATUSES)})"
+    lead_breached = f"AND(ISNUMBER({lead_hours}),{lead_hours}>={lead_threshold})"
+    cycle_breached = f"AND(NOT({lead_breached}),{cycle_hours}>={cycle_threshold})"
+
+    if "Cycle Time" in col_idx:
+        cycle_letter = get_column_letter(col_idx["Cycle Time"])
+        sheet.conditional_formatting.add(f"{cycle_letter}2:{cycle_letter}{last_row}", FormulaRule(formula=[f"{cycle_hours}>{cycle_threshold}"], fill=orange_fill))
+    if "Lead Time" in col_idx:
+        lead_letter = get_column_letter(col_idx["Lead Time"])
+        sheet.conditional_formatting.add(f"{lead_letter}2:{lead_letter}{last_row}", FormulaRule(formula=[f"AND(ISNUMBER({lead_hours}),{lead_hours}>{lead_threshold})"], fill=orange_fill))
+
+    lead_scope = [status for status in WORKFLOW_STATUSES if status not in {"Released", "Closed"}]
+    for scope_statuses, scope_breached in ((lead_scope, lead_breached), (CYCLE_STATUSES, cycle_breached)):
+        scope_refs = row_refs(scope_statuses)
+        if not scope_refs:
+            continue
+        row_min = f"MIN({scope_refs})"
+        row_span = f"IF(MAX({scope_refs})={row_min},1,MAX({scope_refs})-{row_min})"
+        for run in get_excel_column_runs(col_idx[status] for status in scope_statuses if status in col_idx and status in helper_letters):
+            run_range = f"{get_column_letter(run[0])}2:{get_column_letter(run[-1])}{last_row}"
+            # Relative reference: each cell reads its own helper column
+            own_hours = f"{helper_letters[headers[run[0] - 1]]}2"
+            for bucket in range(EXCEL_HEATMAP_BUCKETS - 1, -1, -1):
+                hex_color = calculate_heatmap_color(bucket / (EXCEL_HEATMAP_BUCKETS - 1))
+                bucket_fill = PatternFill(start_color=hex_color, end_color=hex_color, fill_type="solid")
+                formula = f"AND({scope_breached},ISNUMBER({own_hours}),({own_hours}-{row_min})/{row_span}>={bucket / EXCEL_HEATMAP_BUCKETS})"
+                sheet.conditional_formatting.add(run_range, FormulaRule(formula=[formula], fill=bucket_fill, stopIfTrue=True))
+
+# === ADAPTIVE CONCURRENCY ===
+class AdaptiveConcurrencyLimiter:
+    # Additive increase (+1 slot per window of successful fetches) while latency stays near
+    # the best seen; multiplicative decrease on throttling, at most once per congestion event.
+    def __init__(self, floor=CONCURRENCY_FLOOR, ceiling=CONCURRENCY_CEILING, start=CONCURRENCY_START):
+        self.floor = max(1, floor)
+        self.ceiling = max(self.floor, ceiling)
+        self.limit = float(min(self.ceiling, max(self.floor, start)))
+        self.start_limit = int(self.limit)
+        self.peak_limit = int(self.limit)
+        self.decreases = 0
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._min_latency = None
+        self._last_decrease = 0.0
+        self._started = time.monotonic()
+        self._last_tick = self._started
+        self._in_flight_seconds = 0.0
+
+    def _tick(self):
+        now = time.monotonic()
+        self._in_flight_seconds += self._in_flight * (now - self._last_tick)
+        self._last_tick = now
+        return now
+
+    def acquire(self):
+        with self._cond:
+            while self._in_flight >= int(self.limit):
+                self._cond.wait()
+            return self._start_request()
+
+    def try_acquire(self):
+        # Non-blocking acquire for the asyncio engine, which waits on its own condition; None when no slot is free
+        with self._cond:
+            if self._in_flight >= int(self.limit):
+                return None
+            return self._start_request()
+
+    def _start_request(self):
+        now = self._tick()
+        self._in_flight += 1
+        return now
+
+    def release(self, started_at, throttled):
+        with self._cond:
+            now = self._tick()
+            self._in_flight -= 1
+            latency = now - started_at
+            if throttled:
+                # Requests already in flight when we backed off will report the same congestion
+                if started_at >= self._last_decrease:
+                    self.limit = max(self.floor, self.limit * CONCURRENCY_DECREASE_FACTOR)
+                    self._last_decrease = now
+                    self.decreases += 1
+            else:
+                if self._min_latency is None or latency < self._min_latency:
+                    self._min_latency = latency
+                if latency <= self._min_latency * CONCURRENCY_LATENCY_TOLERANCE:
+                    self.limit = min(self.ceiling, self.limit + 1.0 / self.limit)
+                    self.peak_limit = max(self.peak_limit, int(self.limit))
+            self._cond.notify_all()
+
+    def summary(self):
+        with self._cond:
+            elapsed = self._tick() - self._started
+            return {
+                "effective_parallelism": self._in_flight_seconds / elapsed if elapsed > 0 else 0.0,
+                "start_limit": self.start_limit,
+                "final_limit": int(self.limit),
+                "peak_limit": self.peak_limit,
+                "decreases": self.decreases,
+                "floor": self.floor,
+                "ceiling": self.ceiling,
+            }
+
+def format_concurrency_summary(summary):
+    return (
+        f"Fetch concurrency: {summary['effective_parallelism']:.1f} effective in flight, "
+        f"limit {summary['start_limit']} -> {summary['final_limit']} (peak {summary['peak_limit']}, "
+        f"{summary['decreases']} backoffs, range {summary['floor']}-{summary['ceiling']})"
+    )
+
+# === ASYNCIO FETCH ENGINE ===
+# Per-task count of throttled responses, the asyncio counterpart of _http_thread_state
+_async_throttle_count = contextvars.ContextVar("async_throttle_count", default=0)
+
+@lru_cache(maxsize=None)
+def is_async_engine_available():
+    return find_spec("aiohttp") is not None
+
+def resolve_fetch_engine(fetch_engine):
+    if fetch_engine == "asyncio" and not is_async_engine_available():
+        add_app_message("warning", "aiohttp is not installed; falling back to the threaded fetch engine.")
+        return "threads"
+    return fetch_engine
+
+def open_async_http_session(username, api_token, max_in_flight=CONCURRENCY_CEILING):
+    import aiohttp
+    return aiohttp.ClientSession(
+        auth=aiohttp.BasicAuth(username, api_token),
+        connector=aiohttp.TCPConnector(limit=max_in_flight),
+        headers={"Accept": "application/json", "Accept-Encoding": "gzip, deflate"},
+        timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT_SECONDS),
+    )
+
+async def async_get_json(http, url, params=None):
+    # Same retry policy as RetryingHTTPAdapter, but sleeping without holding a thread
+    import aiohttp
+    stats = get_http_stats()
+    host = urlparse(url).netloc
+    attempt = 0
+    while True:
+        check_job_cancelled()
+        stats.record(host, "requests")
+        request_started_at = time.perf_counter()
+        try:
+            async with http.get(url, params=params) as response:
+                if response.status in HTTP_THROTTLE_STATUSES:
+                    _async_throttle_count.set(_async_throttle_count.get() + 1)
+                if response.status not in HTTP_RETRY_STATUSES or attempt >= HTTP_MAX_RETRIES:
+                    response.raise_for_status()
+                    body = await response.read()
+                    count_perf("bytes downloaded", response.content_length or len(body))
+                    record_perf("http request", time.perf_counter() - request_started_at)
+                    return json.loads(body)
+                delay = get_retry_after_delay(response)
+                if delay is None:
+                    delay = get_backoff_delay(attempt)
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            if attempt >= HTTP_MAX_RETRIES:
+                raise
+            delay = get_backoff_delay(attempt)
+        attempt += 1
+        stats.record(host, "retries")
+        count_perf("http retries")
+        emit_job_event("retried", elapsed=min(delay, HTTP_BACKOFF_MAX_SECONDS), detail=host)
+        await asyncio.sleep(min(delay, HTTP_BACKOFF_MAX_SECONDS))
+
+async def async_get_search_pages(http, jira_url, params):
+    # The first page tells us the total, the remaining pages are fetched concurrently
+    url = f"{jira_url}/rest/api/3/search"
+    first_page = await async_get_search_page(http, url, {**params, "startAt": 0})
+    issues = first_page.get("issues", [])
+    page_size = len(issues)
+    if page_size:
+        remaining_pages = await asyncio.gather(*(
+            async_get_search_page(http, url, {**params, "startAt": start_at})
+            for start_at in range(page_size, first_page.get("total", 0), page_size)
+        ))
+        for page in remaining_pages:
+            issues.extend(page.get("issues", []))
+    return issues
+
+async def async_get_search_page(http, url, params):
+    page_started_at = time.monotonic()
+    page = await async_get_json(http, url, params)
+    record_perf("search page (with changelogs)" if "expand" in params else "search page (keys)", time.monotonic() - page_started_at)
+    emit_job_event("fetched", elapsed=time.monotonic() - page_started_at, detail=len(page.get("issues", [])))
+    return page
+
+async def async_get_full_changelog(http, issue_key, jira_url):
+    histories = []
+    start_at = 0
+    while True:
+        data = await async_get_json(http, f"{jira_url}/rest/api/3/issue/{issue_key}/changelog", {"startAt": start_at, "maxResults": CHANGELOG_PAGE_SIZE})
+        values = data.get("values", [])
+        histories.extend(values)
+        start_at += len(values)
+        if not values or data.get("isLast", start_at >= data.get("total", 0)):
+            break
+    histories.sort(key=lambda h: h['created'], reverse=True)
+    return histories
+
+async def async_complete_issue_changelog(http, issue_data, jira_url):
+    changelog = issue_data.setdefault('changelog', {'histories': []})
+    if is_changelog_truncated(changelog):
+        completion_started_at = time.perf_counter()
+        histories = await async_get_full_changelog(http, issue_data['key'], jira_url)
+        record_perf("changelog completion", time.perf_counter() - completion_started_at)
+        issue_data['changelog'] = {'startAt': 0, 'maxResults': len(histories), 'total': len(histories), 'histories': histories}
+    return issue_data
+
+async def async_get_issue_changelog(http, issue_key, jira_url):
+    issue_data = await async_get_json(http, f"{jira_url}/rest/api/3/issue/{issue_key}", {"expand": "changelog"})
+    return await async_complete_issue_changelog(http, issue_data, jira_url)
+
+def run_async_fetch(coro_factory, username, api_token, description, max_in_flight=CONCURRENCY_CEILING):
+    import aiohttp
+    async def runner():
+        async with open_async_http_session(username, api_token, max_in_flight) as http:
+            return await coro_factory(http)
+    try:
+        return asyncio.run(runner())
+    except aiohttp.ClientError as e:
+        stop_report(f"Network or API error during {description}: {e}")
+    except asyncio.TimeoutError as e:
+        stop_report(f"Timed out during {description}: {e}")
+
+def get_issues_by_jql_async(jql, jira_url, username, api_token):
+    return list(get_issue_watermarks_by_jql_async(jql, jira_url, username, api_token))
+
+def get_issue_watermarks_by_jql_async(jql, jira_url, username, api_token):
+    if not jql.strip():
+        stop_report("JQL query cannot be empty.")
+    params = {"jql": jql, "fields": "updated", "maxResults": SEARCH_PAGE_SIZE}
+
+    async def fetch(http):
+        issues = await async_get_search_pages(http, jira_url, params)
+        return OrderedDict((issue['key'], issue.get('fields', {}).get('updated')) for issue in issues)
+    return run_async_fetch(fetch, username, api_token, "JQL search")
+
+def get_issues_with_changelog_by_jql_async(jql, jira_url, username, api_token):
+    if not jql.strip():
+        stop_report("JQL query cannot be empty.")
+    params = {"jql": jql, "fields": ",".join(ISSUE_FIELDS), "expand": "changelog", "maxResults": SEARCH_PAGE_SIZE}
+
+    async def fetch(http):
+        issues = await async_get_search_pages(http, jira_url, params)
+        return list(await asyncio.gather(*(async_complete_issue_changelog(http, issue, jira_url) for issue in issues)))
+    return run_async_fetch(fetch, username, api_token, "bulk JQL search")
+
+def get_issues_with_changelog_by_keys_async(issue_keys, jira_url, username, api_token):
+    params = {"fields": ",".join(ISSUE_FIELDS), "expand": "changelog", "maxResults": SEARCH_PAGE_SIZE}
+
+    async def fetch_chunk(http, chunk):
+        issues = await async_get_search_pages(http, jira_url, {**params, "jql": f"key in ({', '.join(chunk)})"})
+        return await asyncio.gather(*(async_complete_issue_changelog(http, issue, jira_url) for issue in issues))
+
+    async def fetch(http):
+        chunks = [issue_keys[start:start + SEARCH_PAGE_SIZE] for start in range(0, len(issue_keys), SEARCH_PAGE_SIZE)]
+        return [issue for chunk_issues in await asyncio.gather(*(fetch_chunk(http, chunk) for chunk in chunks)) for issue in chunk_issues]
+    return run_async_fetch(fetch, username, api_token, "bulk issue fetch")
+
+def collect_metrics_async(issue_keys, jira_url, username, api_token, concurrency_floor=CONCURRENCY_FLOOR, concurrency_ceiling=CONCURRENCY_CEILING, fetched_issues=None, on_result=None):
+    # Same AIMD limiter as the threaded engine, so both back off alike when Jira throttles
+    limiter = AdaptiveConcurrencyLimiter(concurrency_floor, concurrency_ceiling)
+    results = [None] * len(issue_keys)
+
+    async def acquire_slot(slot_freed):
+        async with slot_freed:
+            while True:
+                started_at = limiter.try_acquire()
+                if started_at is not None:
+                    return started_at
+                await slot_freed.wait()
+
+    async def fetch_one(http, slot_freed, index, key):
+        started_at = await acquire_slot(slot_freed)
+        throttled_before = _async_throttle_count.get()
+        try:
+            issue_data = await async_get_issue_changelog(http, key, jira_url)
+        except Exception as e:
+            return index, key, None, e
+        finally:
+            limiter.release(started_at, _async_throttle_count.get() > throttled_before)
+            # A release frees one slot and additive increase adds at most one more, so two waiters are enough
+            async with slot_freed:
+                slot_freed.notify(2)
+        record_perf("issue fetch", time.monotonic() - started_at)
+        emit_job_event("fetched", key, time.monotonic() - started_at)
+        return index, key, issue_data, None
+
+    async def fetch_all(http):
+        slot_freed = asyncio.Condition()
+        tasks = [fetch_one(http, slot_freed, index, key) for index, key in enumerate(issue_keys)]
+        # Parse each issue on the event loop as soon as it arrives
+        for next_done in asyncio.as_completed(tasks):
+            index, key, issue_data, error = await next_done
+            advance_job_progress()
+            if error is not None:
+                emit_job_event("failed", key, detail=str(error))
+                add_app_message("error", f"Network error fetching issue {key}: {error}")
+                continue
+            if fetched_issues is not None:
+                fetched_issues.append(issue_data)
+            results[index] = parse_issue(key, issue_data)
+            if results[index] is None:
+                continue
+            if on_result is not None:
+                on_result(results[index])
+
+    run_async_fetch(fetch_all, username, api_token, "changelog fetch", limiter.ceiling)
+    add_app_message("Info", format_concurrency_summary(limiter.summary()))
+    return [result for result in results if result is not None]
+
+def iter_metrics_async(issue_keys, jira_url, username, api_token, concurrency_floor=CONCURRENCY_FLOOR, concurrency_ceiling=CONCURRENCY_CEILING, fetched_issues=None):
+    # The event loop runs on a helper thread and hands each parsed issue over as it completes
+    results = queue.Queue()
+    job = get_current_job()
+
+    def run():
+        try:
+            with bind_job(job):
+                collect_metrics_async(issue_keys, jira_url, username, api_token, concurrency_floor, concurrency_ceiling, fetched_issues, lambda result: results.put(("result", result)))
+            results.put(("done", None))
+        except BaseException as e:
+            results.put(("error", e))
+
+    threading.Thread(target=run, name="report-async-fetch", daemon=True).start()
+    while True:
+        kind, value = results.get()
+        if kind == "done":
+            return
+        if kind == "error":
+            raise value
+        yield value
+
+# === PERSISTENT ISSUE CACHE ===
+class IssueCache:
+    # Raw issue JSON (trimmed to ISSUE_FIELDS, zlib-compressed) keyed by site + issue key, with the
+    # fields.updated watermark it was fetched at. Shared across worker threads and sessions.
+    def __init__(self, path=ISSUE_CACHE_PATH, max_age_days=ISSUE_CACHE_MAX_AGE_DAYS, max_size_mb=ISSUE_CACHE_MAX_SIZE_MB):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.max_age_seconds = max_age_days * 86400
+        self.max_size_bytes = max_size_mb * 1024 * 1024
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS issues ("
+                "jira_url TEXT NOT NULL, issue_key TEXT NOT NULL, updated TEXT, fetched_at REAL NOT NULL, "
+                "accessed_at REAL NOT NULL, size INTEGER NOT NULL, payload BLOB NOT NULL, "
+                "PRIMARY KEY (jira_url, issue_key))"
+            )
+
+    def get_fresh(self, jira_url, watermarks):
+        # Only issues whose cached watermark matches the one Jira reports now are returned
+        fresh = {}
+        keys = list(watermarks)
+        now = time.time()
+        with self._lock, self._conn:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT issue_key, updated, payload FROM issues WHERE jira_url = ? AND issue_key IN ({', '.join('?' * len(chunk))})",
+                    [jira_url, *chunk]
+                ).fetchall()
+                for issue_key, updated, payload in rows:
+                    if updated and updated == watermarks.get(issue_key):
+                        fresh[issue_key] = json.loads(zlib.decompress(payload))
+            self._conn.executemany(
+                "UPDATE issues SET accessed_at = ? WHERE jira_url = ? AND issue_key = ?",
+                [(now, jira_url, issue_key) for issue_key in fresh]
+            )
+        return fresh
+
+    def put_many(self, jira_url, issues):
+        now = time.time()
+        rows = []
+        for issue_data in issues:
+            fields = issue_data.get('fields') or {}
+            compact_issue = {
+                'key': issue_data['key'],
+                'fields': {field: fields.get(field) for field in ISSUE_FIELDS},
+                'changelog': {'histories': issue_data.get('changelog', {}).get('histories', [])},
+            }
+            payload = zlib.compress(json.dumps(compact_issue, separators=(",", ":")).encode("utf-8"))
+            rows.append((jira_url, issue_data['key'], fields.get('updated'), now, now, len(payload), payload))
+        if not rows:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO issues VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def evict(self):
+        with self._lock, self._conn:
+            expired = self._conn.execute("DELETE FROM issues WHERE fetched_at < ?", (time.time() - self.max_age_seconds,)).rowcount
+            total_size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM issues").fetchone()[0]
+            evicted = 0
+            if total_size > self.max_size_bytes:
+                # Least recently read first
+                for jira_url, issue_key, size in self._conn.execute("SELECT jira_url, issue_key, size FROM issues ORDER BY accessed_at").fetchall():
+                    if total_size <= self.max_size_bytes:
+                        break
+                    self._conn.execute("DELETE FROM issues WHERE jira_url = ? AND issue_key = ?", (jira_url, issue_key))
+                    total_size -= size
+                    evicted += 1
+        return expired + evicted
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM issues")
+
+@lru_cache(maxsize=None)
+def get_issue_cache():
+    return IssueCache()
+
+# === REPORT SNAPSHOTS (DELTA REFRESH) ===
+class ReportSnapshotStore:
+    # Per-issue (meta, metrics) of the last successful run of each JQL, stored next to the issue cache
+    def __init__(self, path=ISSUE_CACHE_PATH, max_age_days=ISSUE_CACHE_MAX_AGE_DAYS):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.max_age_seconds = max_age_days * 86400
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS report_snapshots ("
+                "jira_url TEXT NOT NULL, jql TEXT NOT NULL, last_run_at REAL NOT NULL, payload BLOB NOT NULL, "
+                "PRIMARY KEY (jira_url, jql))"
+            )
+
+    def load(self, jira_url, jql):
+        with self._lock:
+            row = self._conn.execute("SELECT last_run_at, payload FROM report_snapshots WHERE jira_url = ? AND jql = ?", (jira_url, jql)).fetchone()
+        if row is None:
+            return None
+        last_run_at, payload = row
+        return last_run_at, OrderedDict((meta["Key"], (meta, metrics)) for meta, metrics in json.loads(zlib.decompress(payload)))
+
+    def save(self, jira_url, jql, last_run_at, all_metrics):
+        payload = zlib.compress(json.dumps(all_metrics, separators=(",", ":")).encode("utf-8"))
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO report_snapshots VALUES (?, ?, ?, ?)", (jira_url, jql, last_run_at, payload))
+            self._conn.execute("DELETE FROM report_snapshots WHERE last_run_at < ?", (time.time() - self.max_age_seconds,))
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM report_snapshots")
+
+@lru_cache(maxsize=None)
+def get_report_snapshot_store():
+    return ReportSnapshotStore()
+
+def build_delta_jql(jql, since_epoch):
+    # Relative 'updated >= -Nm' sidesteps the Jira user's timezone, which absolute JQL dates are read in
+    minutes = int((time.time() - since_epoch) // 60) + 1 + DELTA_OVERLAP_MINUTES
+    match = re.search(r"\s+ORDER\s+BY\s+.*$", jql, flags=re.IGNORECASE | re.DOTALL)
+    base_jql, order_by = (jql[:match.start()], match.group(0)) if match else (jql, "")
+    return f"({base_jql.strip()}) AND updated >= -{minutes}m{order_by}"
+
+# === SHARED REPORT CACHE ===
+class ReportCache:
+    # Process-wide LRU of finished reports with a TTL. Concurrent requests for the same key wait
+    # for the one computation in flight (single-flight) instead of starting their own crawl.
+    def __init__(self, ttl_seconds=REPORT_CACHE_TTL_SECONDS, max_entries=REPORT_CACHE_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._in_flight = {}
+
+    def get_or_compute(self, key, compute, refresh=False):
+        # Returns (value, age_seconds); age is None when this call computed the value itself
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry and not refresh and time.monotonic() - entry[0] <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    return entry[1], time.monotonic() - entry[0]
+                flight = self._in_flight.get(key)
+                is_leader = flight is None
+                if is_leader:
+                    flight = self._in_flight[key] = {"done": threading.Event(), "ok": False}
+            if is_leader:
+                break
+            while not flight["done"].wait(REPORT_CACHE_WAIT_POLL_SECONDS):
+                check_job_cancelled()
+            if flight["ok"]:
+                with self._lock:
+                    entry = self._entries.get(key)
+                if entry:
+                    return entry[1], time.monotonic() - entry[0]
+                return None, None
+            # The leader failed; retry, possibly becoming the next leader
+            refresh = False
+
+        try:
+            value = compute()
+            with self._lock:
+                if value is not None:
+                    self._entries[key] = (time.monotonic(), value)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+                flight["ok"] = True
+            return value, None
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            flight["done"].set()
+
+@lru_cache(maxsize=None)
+def get_report_cache():
+    return ReportCache()
+
+def normalize_jql(jql):
+    return re.sub(r"\s+", " ", jql).strip()
+
+def build_report_cache_key(jira_url, username, api_token, jql, cycle_threshold, lead_threshold, selected_team_name, excel_mode="cells"):
+    # Scoped to the credentials: a report is only shared between sessions that could have crawled it themselves
+    return (jira_url.rstrip("/"), get_credential_fingerprint(username, api_token), normalize_jql(jql), cycle_threshold, lead_threshold, selected_team_name, excel_mode)
+
+def get_credential_fingerprint(username, api_token):
+    # The token itself is never kept in a cache key
+    return hashlib.sha256(f"{username}\0{api_token}".encode("utf-8")).hexdigest()
+
+# === REPORT GENERATOR ===
+def collect_metrics_streamlit(issue_keys, jira_url, username, api_token, concurrency_floor=CONCURRENCY_FLOOR, concurrency_ceiling=CONCURRENCY_CEILING, fetched_issues=None):
+    all_metrics = iter_metrics_threaded(issue_keys, jira_url, username, api_token, concurrency_floor, concurrency_ceiling, fetched_issues)
+    return order_metrics_by_keys(all_metrics, issue_keys)
+
+def iter_metrics_threaded(issue_keys, jira_url, username, api_token, concurrency_floor=CONCURRENCY_FLOOR, concurrency_ceiling=CONCURRENCY_CEILING, fetched_issues=None):
+    limiter = AdaptiveConcurrencyLimiter(concurrency_floor, concurrency_ceiling)
+    job = get_current_job()
+
+    def process_issue(key):
+        with bind_job(job):
+            issue_data, result = fetch_and_process_issue(key)
+            advance_job_progress()
+        return issue_data, result
+
+    def fetch_and_process_issue(key):
+        # Returns (issue_data, metrics); the consuming thread keeps both, workers share no lists
+        check_job_cancelled()
+        started_at = limiter.acquire()
+        throttled_before = get_thread_throttle_count()
+        try:
+            issue_data = get_issue_changelog(key, jira_url, username, api_token, limiter.ceiling)
+        except requests.exceptions.RequestException as req_e:
+            emit_job_event("failed", key, detail=str(req_e))
+            add_app_message("error", f"Network error fetching issue {key}: {req_e}")
+            return None, None
+        except Exception as e:
+            emit_job_event("failed", key, detail=str(e))
+            add_app_message("error", f"Error processing issue {key}: {e}")
+            return None, None
+        finally:
+            limiter.release(started_at, get_thread_throttle_count() > throttled_before)
+        record_perf("issue fetch", time.monotonic() - started_at)
+        emit_job_event("fetched", key, time.monotonic() - started_at)
+        return issue_data, parse_issue(key, issue_data)
+
+    executor = ThreadPoolExecutor(max_workers=limiter.ceiling)
+    try:
+        futures = [executor.submit(process_issue, key) for key in issue_keys]
+        for future in as_completed(futures):
+            issue_data, result = future.result()
+            if issue_data is not None and fetched_issues is not None:
+                fetched_issues.append(issue_data)
+            if result is not None:
+                yield result
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+    add_app_message("Info", format_concurrency_summary(limiter.summary()))
+
+def iter_metrics_from_issues(issues):
+    for issue_data in issues:
+        result = parse_issue(issue_data['key'], issue_data)
+        advance_job_progress()
+        if result is not None:
+            yield result
+
+def parse_issue(key, issue_data):
+    # build_issue_metrics with the parsed/failed events and error message every engine reports
+    parse_started_at = time.monotonic()
+    try:
+        result = build_issue_metrics(key, issue_data)
+    except Exception as e:
+        emit_job_event("failed", key, detail=str(e))
+        add_app_message("error", f"Error processing issue {key}: {e}")
+        return None
+    emit_job_event("parsed", key, time.monotonic() - parse_started_at)
+    return result
+
+def order_metrics_by_keys(all_metrics, issue_keys):
+    # Rows arrive in completion order; reports list them in JQL order whichever engine fetched them
+    key_positions = {key: position for position, key in enumerate(issue_keys)}
+    return sorted(all_metrics, key=lambda item: key_positions.get(item[0].get("Key"), len(key_positions)))
+
+def build_issue_metrics(key, issue_data):
+    with perf_timer("scan changelog"):
+        changelog_scan = get_issue_changelog_scan(issue_data)
+    with perf_timer("parse issue fields"):
+        issue_meta = extract_issue_meta(key, issue_data, changelog_scan)
+    with perf_timer("calculate durations"):
+        metrics = calculate_state_durations(key, issue_data, changelog_scan)
+    return issue_meta, metrics
+
+def fetch_report_issues(jql, jira_url, username, api_token, bulk_fetch=True, fetch_engine="threads", issue_cache=None, force_refresh=False, stream=False):
+    # Returns the report's issue keys plus whatever issue JSON is already in hand (bulk search
+    # pages or the on-disk cache); keys without JSON are fetched one by one later.
+    # With stream=True the threaded bulk search is returned as a lazy page iterator and the keys
+    # as None, since they are only known once every page has been read.
+    use_async = fetch_engine == "asyncio"
+    if issue_cache is None:
+        if bulk_fetch and stream and not use_async:
+            return None, iter_issues_with_changelog_by_jql(jql, jira_url, username, api_token, report_total=True)
+        if bulk_fetch:
+            issues = (get_issues_with_changelog_by_jql_async if use_async else get_issues_with_changelog_by_jql)(jql, jira_url, username, api_token)
+            return [issue['key'] for issue in issues], issues
+        return (get_issues_by_jql_async if use_async else get_issues_by_jql)(jql, jira_url, username, api_token), []
+
+    watermarks = (get_issue_watermarks_by_jql_async if use_async else get_issue_watermarks_by_jql)(jql, jira_url, username, api_token)
+    cached_issues = {} if force_refresh else issue_cache.get_fresh(jira_url, watermarks)
+    stale_keys = [key for key in watermarks if key not in cached_issues]
+    add_app_message("Info", f"Issue cache: {len(cached_issues)} issues served from disk, {len(stale_keys)} to fetch.")
+    if not (bulk_fetch and stale_keys):
+        return list(watermarks), list(cached_issues.values())
+    if use_async:
+        fetched_issues = get_issues_with_changelog_by_keys_async(stale_keys, jira_url, username, api_token)
+        issue_cache.put_many(jira_url, fetched_issues)
+        return list(watermarks), list(cached_issues.values()) + fetched_issues
+    return list(watermarks), iter_cached_then_fetched_issues(cached_issues.values(), stale_keys, jira_url, username, api_token, issue_cache)
+
+def iter_cached_then_fetched_issues(cached_issues, stale_keys, jira_url, username, api_token, issue_cache):
+    yield from cached_issues
+    fetched_batch = []
+    for issue_data in iter_issues_with_changelog_by_keys(stale_keys, jira_url, username, api_token):
+        fetched_batch.append(issue_data)
+        if len(fetched_batch) >= SEARCH_PAGE_SIZE:
+            issue_cache.put_many(jira_url, fetched_batch)
+            fetched_batch = []
+        yield issue_data
+    issue_cache.put_many(jira_url, fetched_batch)
+
+def generate_report_streamlit(issue_keys, jira_url, username, api_token, cycle_threshold, lead_threshold, file_label, selected_team_name, issues=None, concurrency_limits=(CONCURRENCY_FLOOR, CONCURRENCY_CEILING), fetch_engine="threads", issue_cache=None):
+    if issue_keys is not None:
+        add_app_message("Info", f"Collecting metrics for {len(issue_keys)} issues. This may take a while...")
+    all_metrics = collect_report_metrics(issue_keys, jira_url, username, api_token, issues, concurrency_limits, fetch_engine, issue_cache)
+    return generate_report_from_metrics(all_metrics, cycle_threshold, lead_threshold, file_label, selected_team_name)
+
+def collect_report_metrics(issue_keys, jira_url, username, api_token, issues=None, concurrency_limits=(CONCURRENCY_FLOOR, CONCURRENCY_CEILING), fetch_engine="threads", issue_cache=None):
+    # Every row is handed to the running job as soon as it is parsed so the page can preview it;
+    # issue_keys=None means the issues iterable is the whole report, in JQL order
+    set_job_phase("Collecting metrics", total=len(issue_keys) if issue_keys is not None else 0)
+    all_metrics = []
+    for result in iter_report_metrics(issue_keys, jira_url, username, api_token, issues, concurrency_limits, fetch_engine, issue_cache):
+        all_metrics.append(result)
+        publish_job_result(result)
+    if issue_keys is None:
+        return all_metrics
+    return order_metrics_by_keys(all_metrics, issue_keys)
+
+def iter_report_metrics(issue_keys, jira_url, username, api_token, issues=None, concurrency_limits=(CONCURRENCY_FLOOR, CONCURRENCY_CEILING), fetch_engine="threads", issue_cache=None):
+    # Issues already in hand (bulk search pages or the issue cache) are only parsed; the rest are fetched per issue
+    prefetched_keys = set()
+
+    def remember_keys(issues):
+        for issue_data in issues:
+            prefetched_keys.add(issue_data['key'])
+            yield issue_data
+
+    yield from iter_metrics_from_issues(remember_keys(issues or []))
+    missing_keys = [key for key in issue_keys or [] if key not in prefetched_keys]
+    if missing_keys:
+        fetched_issues = []
+        if fetch_engine == "asyncio":
+            yield from iter_metrics_async(missing_keys, jira_url, username, api_token, *concurrency_limits, fetched_issues=fetched_issues)
+        else:
+            yield from iter_metrics_threaded(missing_keys, jira_url, username, api_token, *concurrency_limits, fetched_issues=fetched_issues)
+        if issue_cache is not None:
+            issue_cache.put_many(jira_url, fetched_issues)
+
+def collect_report_metrics_delta(jql, jira_url, username, api_token, snapshot_store, bulk_fetch=True, concurrency_limits=(CONCURRENCY_FLOOR, CONCURRENCY_CEILING), fetch_engine="threads", issue_cache=None, force_refresh=False):
+    # Re-collects only issues updated since the last run of this JQL, reuses the stored rows for
+    # everything else, and drops rows for issues that no longer match. Returns (issue_keys, all_metrics).
+    # force_refresh only bypasses the issue cache for what is fetched; the snapshot is still used.
+    run_started_at = time.time()
+    snapshot = snapshot_store.load(jira_url, jql)
+    if snapshot is None:
+        issue_keys, issues = fetch_report_issues(jql, jira_url, username, api_token, bulk_fetch, fetch_engine, issue_cache, force_refresh)
+        all_metrics = collect_report_metrics(issue_keys, jira_url, username, api_token, issues, concurrency_limits, fetch_engine, issue_cache)
+        add_app_message("Info", f"Delta refresh: no previous run of this query, collected all {len(all_metrics)} issues.")
+    else:
+        last_run_at, previous_metrics = snapshot
+        # Membership is a cheap key-only listing; it catches issues that left or joined the result set
+        issue_keys = (get_issues_by_jql_async if fetch_engine == "asyncio" else get_issues_by_jql)(jql, jira_url, username, api_token)
+        changed_keys, changed_issues = fetch_report_issues(build_delta_jql(jql, last_run_at), jira_url, username, api_token, bulk_fetch, fetch_engine, issue_cache, force_refresh)
+        current_keys = set(issue_keys)
+        changed_keys = [key for key in changed_keys if key in current_keys]
+        changed_key_set = set(changed_keys)
+        joined_keys = [key for key in issue_keys if key not in previous_metrics and key not in changed_key_set]
+        recompute_keys = changed_keys + joined_keys
+        recomputed = {meta["Key"]: (meta, metrics) for meta, metrics in collect_report_metrics(recompute_keys, jira_url, username, api_token, changed_issues, concurrency_limits, fetch_engine, issue_cache)}
+
+        now = time.time()
+        all_metrics = []
+        for key in issue_keys:
+            if key in recomputed:
+                all_metrics.append(recomputed[key])
+            elif key in previous_metrics:
+                meta, metrics = previous_metrics[key]
+                all_metrics.append((meta, refresh_open_status_duration(metrics, now)))
+        dropped_count = sum(1 for key in previous_metrics if key not in current_keys)
+        add_app_message("Info", f"Delta refresh: {len(recomputed)} issues recomputed, {len(all_metrics) - len(recomputed)} reused, {dropped_count} dropped.")
+    snapshot_store.save(jira_url, jql, run_started_at, all_metrics)
+    return issue_keys, all_metrics
+
+def run_report_pipeline(jql, jira_url, username, api_token, cycle_threshold, lead_threshold, file_label, selected_team_name, fetch_options=None):
+    fetch_options = {**DEFAULT_FETCH_OPTIONS, **(fetch_options or {})}
+    issue_cache = get_issue_cache() if fetch_options["use_issue_cache"] else None
+    set_job_phase("Searching issues")
+    if fetch_options["delta_refresh"]:
+        issue_keys, all_metrics = collect_report_metrics_delta(
+            jql, jira_url, username, api_token, get_report_snapshot_store(),
+            bulk_fetch=fetch_options["bulk_fetch"], concurrency_limits=fetch_options["concurrency_limits"],
+            fetch_engine=fetch_options["fetch_engine"], issue_cache=issue_cache, force_refresh=fetch_options["force_refresh"]
+        )
+    else:
+        issue_keys, issues = fetch_report_issues(
+            jql, jira_url, username, api_token, bulk_fetch=fetch_options["bulk_fetch"],
+            fetch_engine=fetch_options["fetch_engine"], issue_cache=issue_cache, force_refresh=fetch_options["force_refresh"],
+            stream=True
+        )
+        all_metrics = [] if issue_keys == [] else collect_report_metrics(
+            issue_keys, jira_url, username, api_token, issues, fetch_options["concurrency_limits"], fetch_options["fetch_engine"], issue_cache
+        )
+        if issue_keys is None:
+            issue_keys = [meta["Key"] for meta, metrics in all_metrics]
+
+    if not issue_keys:
+        add_app_message("warning", "No issues found matching the JQL query. Report will be empty.")
+        return None, None, None
+    add_app_message("Info", f"Found {len(issue_keys)} issues matching the JQL query.")
+
+    # The workbook is only built once every row is in; the page previews rows while they stream
+    report = generate_report_from_metrics(all_metrics, cycle_threshold, lead_threshold, file_label, selected_team_name, fetch_options["excel_mode"])
+    if issue_cache is not None:
+        evicted_count = issue_cache.evict()
+        if evicted_count:
+            add_app_message("Info", f"Issue cache: evicted {evicted_count} old entries.")
+    return report
+
+def run_report_job(job, jql, jira_url, username, api_token, cycle_threshold, lead_threshold, file_label, selected_team_name, fetch_options):
+    # Runs on a JobRunner thread: returns ((report_bytes, filename, df) or None, cache_age_seconds)
+    report_cache_key = build_report_cache_key(jira_url, username, api_token, jql, cycle_threshold, lead_threshold, selected_team_name, fetch_options.get("excel_mode", "cells"))
+    # A delta run is cheap and exists to be fresher than the cache TTL, so it never takes a cached report
+    refresh = fetch_options.get("force_refresh", False) or fetch_options.get("delta_refresh", False)
+    return run_cached_report(report_cache_key, lambda: run_report_pipeline(
+        jql, jira_url, username, api_token, cycle_threshold, lead_threshold, file_label, selected_team_name, fetch_options
+    ), refresh)
+
+def run_batch_report_job(job, team_jqls, jira_url, username, api_token, cycle_threshold, lead_threshold, file_label, fetch_options, split_files=False):
+    report_cache_key = build_report_cache_key(
+        jira_url, username, api_token, " OR ".join(f"({jql})" for jql in team_jqls.values()), cycle_threshold, lead_threshold,
+        ("batch", tuple(team_jqls), split_files), fetch_options.get("excel_mode", "cells")
+    )
+    return run_cached_report(report_cache_key, lambda: run_batch_report_pipeline(
+        team_jqls, jira_url, username, api_token, cycle_threshold, lead_threshold, file_label, fetch_options, split_files
+    ), fetch_options.get("force_refresh", False))
+
+def run_cached_report(report_cache_key, run_pipeline, refresh=False):
+    start_time = datetime.now()
+    http_stats_before = get_http_stats().snapshot()
+
+    def compute_report():
+        output_buffer, output_filename, report_df = run_pipeline()
+        return None if report_df is None else (output_buffer.getvalue(), output_filename, report_df)
+
+    set_job_phase("Waiting for report")
+    # refresh skips a finished entry but still joins a crawl already in flight for the same key
+    cached_report, cache_age_seconds = get_report_cache().get_or_compute(report_cache_key, compute_report, refresh=refresh)
+    if cached_report is not None:
+        if cache_age_seconds is not None:
+            add_app_message("Info", f"Served from cache (age {int(cache_age_seconds // 60)} min): {cached_report[1]}")
+        else:
+            add_app_message("Info", f"Report generated! Ready for download: {cached_report[1]}")
+        add_app_message("Info", f"Success: Data fetching complete! Duration: {datetime.now() - start_time}")
+        add_app_message("Info", f"HTTP: {format_http_stats(diff_http_stats(http_stats_before, get_http_stats().snapshot()))}")
+    return cached_report, cache_age_seconds
+
+def run_batch_report_pipeline(team_jqls, jira_url, username, api_token, cycle_threshold, lead_threshold, file_label, fetch_options=None, split_files=False):
+    # The per-team searches run side by side, so the wall time follows the slowest team. Teams are then
+    # merged into one key list and collected once under a single concurrency budget before being split again.
+    if not team_jqls:
+        stop_report("No teams selected for the batch report.")
+    fetch_options = {**DEFAULT_FETCH_OPTIONS, **(fetch_options or {})}
+    issue_cache = get_issue_cache() if fetch_options["use_issue_cache"] else None
+    set_job_phase(f"Searching issues for {len(team_jqls)} teams", total=len(team_jqls))
+    job = get_current_job()
+
+    def fetch_team_issues(jql):
+        with bind_job(job):
+            issue_keys, issues = fetch_report_issues(
+                jql, jira_url, username, api_token, bulk_fetch=fetch_options["bulk_fetch"],
+                fetch_engine=fetch_options["fetch_engine"], issue_cache=issue_cache, force_refresh=fetch_options["force_refresh"]
+            )
+            issues = list(issues)
+            advance_job_progress()
+        return issue_keys, issues
+
+    with ThreadPoolExecutor(max_workers=min(len(team_jqls), fetch_options["concurrency_limits"][1])) as executor:
+        team_results = OrderedDict(zip(team_jqls, executor.map(fetch_team_issues, team_jqls.values())))
+
+    issue_keys = list(OrderedDict.fromkeys(key for team_keys, _ in team_results.values() for key in team_keys))
+    if not issue_keys:
+        add_app_message("warning", "No issues found for any of the selected teams. Report will be empty.")
+        return None, None, None
+    issues = list({issue['key']: issue for _, team_issues in team_results.values() for issue in team_issues}.values())
+    add_app_message("Info", f"Found {len(issue_keys)} issues across {len(team_jqls)} teams: " + ", ".join(f"{team} {len(team_keys)}" for team, (team_keys, _) in team_results.items()))
+
+    all_metrics = collect_report_metrics(issue_keys, jira_url, username, api_token, issues, fetch_options["concurrency_limits"], fetch_options["fetch_engine"], issue_cache)
+    if not all_metrics:
+        add_app_message("warning", "No metrics collected. Report will be empty.")
+        return None, None, None
+    metrics_by_key = {meta["Key"]: (meta, metrics) for meta, metrics in all_metrics}
+    team_reports = OrderedDict(
+        (team, build_report_dataframe([create_row(*metrics_by_key[key], team) for key in team_keys if key in metrics_by_key]))
+        for team, (team_keys, _) in team_results.items()
+    )
+    summary_df = build_team_summary(team_reports, cycle_threshold, lead_threshold)
+
+    check_job_cancelled()
+    set_job_phase("Building Excel report")
+    if split_files:
+        output_buffer, output_filename = format_batch_zip(team_reports, summary_df, file_label, cycle_threshold, lead_threshold, fetch_options["excel_mode"]), f"{file_label}.zip"
+    else:
+        output_buffer, output_filename = format_batch_excel(team_reports, summary_df, cycle_threshold, lead_threshold, fetch_options["excel_mode"]), f"{file_label}.xlsx"
+    if issue_cache is not None:
+        issue_cache.evict()
+    add_app_message("Info", "Report data generated successfully!")
+    # Categories differ per team, so concat falls back to object columns; the schema is applied again
+    combined_df = apply_report_schema(pd.concat([team_df.assign(Team=team) for team, team_df in team_reports.items()], ignore_index=True))
+    return output_buffer, output_filename, combined_df[["Team"] + generate_headers()].astype({"Team": "category"})
+
+def run_batch_report(team_names, duration_name, jira_url, username, api_token, cycle_threshold, lead_threshold, fetch_options=None, custom_date_range=None, split_files=False):
+    # Headless entry point for the weekly all-teams run: returns (output_buffer, filename, combined_df)
+    duration_func = DURATIONS_DATA[duration_name]
+    team_jqls = OrderedDict((team_name, build_team_duration_jql(TEAMS_DATA[team_name], duration_func, custom_date_range)) for team_name in team_names)
+    file_label = build_team_duration_label("teams", duration_name, custom_date_range)
+    return run_batch_report_pipeline(team_jqls, jira_url, username, api_token, cycle_threshold, lead_threshold, file_label, fetch_options, split_files)
+
+def build_team_duration_jql(team_id, duration_func, custom_date_range=None):
+    if duration_func == "customDateRange()":
+        start_date_str, end_date_str = (d.strftime("%Y-%m-%d") for d in custom_date_range)
+        return (
+            f"'Team[Team]' = \"{team_id}\" AND issuetype NOT IN (Epic, Sub-task) "
+            f"AND created >= \"{start_date_str}\" AND created <= \"{end_date_str}\" "
+            f"AND status IN ({STATUS_INPUT}) ORDER BY KEY"
+        )
+    return (
+        f"'Team[Team]' = \"{team_id}\" AND issuetype NOT IN (Epic, Sub-task) "
+        f"AND created > {duration_func} AND status IN ({STATUS_INPUT}) ORDER BY KEY"
+    )
+
+def build_team_duration_label(team_name, duration_name, custom_date_range=None):
+    if DURATIONS_DATA.get(duration_name) == "customDateRange()":
+        start_date_str, end_date_str = (d.strftime("%Y-%m-%d") for d in custom_date_range)
+        return f"{team_name.lower().replace(' ', '_')}_custom_{start_date_str}_to_{end_date_str}_asof_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    return f"{team_name.lower().replace(' ', '_')}_{duration_name.lower().replace(' ', '_')}_asof_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+
+def build_team_summary(team_reports, cycle_threshold, lead_threshold):
+    # One row per team plus an all-teams row; durations in days
+    summary_rows = []
+    for team, team_df in list(team_reports.items()) + [("All Teams", pd.concat(team_reports.values(), ignore_index=True))]:
+        cycle_days = team_df["Cycle Time"].astype("float64") / 24
+        lead_days = team_df["Lead Time"].astype("float64") / 24
+        summary_rows.append({
+            "Team": team,
+            "Issues": len(team_df),
+            "Story Points": int(team_df["Story Points"].sum()),
+            "Median Cycle Time (days)": round(cycle_days.median(), 1),
+            "85th pct Cycle Time (days)": round(cycle_days.quantile(0.85), 1),
+            "Median Lead Time (days)": round(lead_days.median(), 1),
+            "85th pct Lead Time (days)": round(lead_days.quantile(0.85), 1),
+            "Cycle Time Breaches": int((calculate_cycle_time_hours(team_df) > cycle_threshold).sum()),
+            "Lead Time Breaches": int((team_df["Lead Time"] > lead_threshold).sum()),
+            "Failed QA Count": int(team_df["Failed QA Count"].sum()),
+        })
+    return pd.DataFrame(summary_rows)
+
+def generate_report_from_metrics(all_metrics, cycle_threshold, lead_threshold, file_label, selected_team_name, excel_mode="cells"):
+    if not all_metrics:
+        add_app_message("warning", "No metrics collected. Report will be empty.")
+        return None, None, None
+    check_job_cancelled()
+    set_job_phase("Building Excel report")
+
+    with perf_timer("build DataFrame"):
+        data = [create_row(meta, metrics, selected_team_name) for meta, metrics in all_metrics]
+        df = build_report_dataframe(data)
+
+    output_buffer = format_excel(df, file_label, cycle_threshold, lead_threshold, excel_mode)
+
+    add_app_message("Info", "Report data generated successfully!")
+    return output_buffer, f"{file_label}.xlsx", df
+
+# === JIRA TIMESTAMPS ===
+# Jira sends every timestamp in one fixed layout ("2025-01-31T09:15:00.000+1000"); these parse it without strptime,
+# which costs ~12 us a call in its regex and locale handling. Anything in another layout falls back to strptime.
+JIRA_TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.%f%z"
+JIRA_TIMESTAMP_LENGTH = len("2025-01-31T09:15:00.000+1000")
+JIRA_LOCAL_TIME_LENGTH = len("2025-01-31T09:15:00.000")
+FROMISOFORMAT_READS_JIRA_OFFSETS = sys.version_info >= (3, 11) # Older fromisoformat rejects "+1000" without a colon
+
+def is_jira_timestamp_layout(value):
+    return len(value) == JIRA_TIMESTAMP_LENGTH and value[10] == "T" and value[19] == "." and value[23] in "+-"
+
+def parse_jira_timestamp(value):
+    # Same datetime as datetime.strptime(value, JIRA_TIMESTAMP_FORMAT)
+    if not is_jira_timestamp_layout(value):
+        return datetime.strptime(value, JIRA_TIMESTAMP_FORMAT)
+    if FROMISOFORMAT_READS_JIRA_OFFSETS:
+        return datetime.fromisoformat(value)
+    return datetime(
+        int(value[0:4]), int(value[5:7]), int(value[8:10]), int(value[11:13]), int(value[14:16]), int(value[17:19]),
+        int(value[20:23]) * 1000, get_utc_offset_timezone(value[23:])
+    )
+
+@lru_cache(maxsize=None)
+def get_utc_offset_timezone(offset_text):
+    # "+0530" -> tzinfo; a tenant's timestamps only use a handful of offsets
+    return datetime.strptime(offset_text, "%z").tzinfo
+
+
+# === CHANGELOG EVENTS ===
+# Changelog items the report reads, by field name; everything else (assignee, rank, description, ...) is skipped
+CHANGELOG_EVENT_FIELDS = {"status": "status", "timespent": "timespent", "WorklogId": "worklog", "Sprint": "sprint"}
+CHANGELOG_NAMED_VALUE_KINDS = ("status", "sprint") # Events that carry display names (fromString/toString), not raw values
+FAILED_QA_TRANSITION = ("In Testing", "Rejected")
+
+def scan_changelog(histories):
+    # One walk over an issue's histories: the compact event stream plus every per-issue figure the report derives from it
+    events = []
+    append_event = events.append
+    event_kind = CHANGELOG_EVENT_FIELDS.get
+    for history in histories:
+        created = history['created']
+        for item in history['items']:
+            kind = event_kind(item['field'])
+            if kind is None:
+                continue
+            if kind in CHANGELOG_NAMED_VALUE_KINDS:
+                append_event((created, kind, item.get('fromString'), item.get('toString')))
+            else:
+                append_event((created, kind, item.get('from'), item.get('to')))
+    # Histories are newest first, so the first timespent event is the latest total
+    logged_time = next((to_value for _, kind, _, to_value in events if kind == "timespent"), None)
+    # Stable on the created strings, so events in one history keep their item order
+    events.sort(key=itemgetter(0))
+
+    failed_qa_count = 0
+    resolved_at = None
+    status_entered = {} # First entry into each status in changelog order
+    status_reached = {} # Earliest entry into each status in time
+    reached_created = {}
+    for created, kind, from_status, to_status in events:
+        if kind != "status":
+            continue
+        if (from_status, to_status) == FAILED_QA_TRANSITION:
+            failed_qa_count += 1
+        if not to_status:
+            continue
+        if to_status.lower() in RESOLVED_STATUSES:
+            resolved_at = created
+        previous_created = reached_created.get(to_status)
+        # Events are in created-string order: a later string with the same UTC offset cannot be an earlier time
+        if previous_created is not None and previous_created[-5:] == created[-5:]:
+            continue
+        timestamp = parse_jira_timestamp(created)
+        if previous_created is None:
+            status_entered[to_status] = timestamp
+            status_reached[to_status] = timestamp
+            reached_created[to_status] = created
+        elif timestamp < status_reached[to_status]:
+            status_reached[to_status] = timestamp
+            reached_created[to_status] = created
+    return {
+        "events": events,
+        "status_entered": status_entered,
+        "status_reached": status_reached,
+        "failed_qa_count": failed_qa_count,
+        "logged_time": logged_time,
+        "resolved_at": resolved_at, # Raw timestamp of the last move into a resolved status
+    }
+
+def get_issue_changelog_scan(issue_data):
+    return scan_changelog(issue_data['changelog']['histories'])
+
+# === CALCULATE DURATIONS ===
+def calculate_durations(status_entered, created_time, issue_key):
+    durations = {}
+    status_times = {"To Do": created_time}
+    for status, timestamp in status_entered.items():
+        if status not in status_times:
+            status_times[status] = timestamp
+
+    ordered_statuses = sorted(
+        [status for status in WORKFLOW_STATUSES if status in status_times],
+        key=lambda s: status_times[s]
+    )
+
+    for i in range(len(ordered_statuses) - 1):
+        curr = ordered_statuses[i]
+        nxt = ordered_statuses[i + 1]
+        start_time = status_times[curr]
+        end_time = status_times[nxt]
+        diff = (end_time - start_time).total_seconds() / 3600.0
+        if diff >= 0:
+            durations[curr] = diff
+        else:
+            add_app_message("warning", f"Negative duration between {curr} and {nxt} in issue {issue_key}.")
+
+    # The latest status is still open: its duration runs until now
+    open_status = None
+    if ordered_statuses:
+        last_status = ordered_statuses[-1]
+        if last_status not in durations:
+            end_time = datetime.now(tz=status_times[last_status].tzinfo)
+            diff = (end_time - status_times[last_status]).total_seconds() / 3600.0
+            if diff >= 0:
+                durations[last_status] = diff
+                open_status = last_status
+
+    return durations, open_status
+
+# === CALCULATE METRICS ===
+def calculate_metrics(status_reached, created_time):
+    lead_start = created_time
+    lead_end = status_reached.get("Released") or status_reached.get("Closed")
+    cycle_start = status_reached.get("In Progress")
+    cycle_end = status_reached.get("QA Complete")
+
+    lead_time = (lead_end - lead_start).total_seconds() / 3600.0 if lead_end else None
+    cycle_time = (cycle_end - cycle_start).total_seconds() / 3600.0 if cycle_start and cycle_end else None
+    return lead_time, cycle_time
+
+# === CALCULATE STATE DURATIONS ===
+def calculate_state_durations(issue_key, issue_data, changelog_scan=None):
+    if changelog_scan is None:
+        changelog_scan = get_issue_changelog_scan(issue_data)
+    created_time = parse_jira_timestamp(issue_data['fields']['created'])
+    durations, open_status = calculate_durations(changelog_scan["status_entered"], created_time, issue_key)
+    lead_time, cycle_time = calculate_metrics(changelog_scan["status_reached"], created_time)
+    return {
+        "lead_time_hours": lead_time,
+        "cycle_time_hours": cycle_time,
+        "durations_by_status_hours": dict(durations),
+        "open_status": open_status,
+        "computed_at": time.time()
+    }
+
+def refresh_open_status_duration(metrics, now=None):
+    # Rows reused by a delta refresh: extend the still-open status up to now without re-parsing
+    now = time.time() if now is None else now
+    open_status = metrics.get("open_status")
+    if open_status and open_status in metrics["durations_by_status_hours"]:
+        metrics["durations_by_status_hours"][open_status] += max(0.0, now - metrics["computed_at"]) / 3600.0
+        metrics["computed_at"] = now
+    return metrics
+
+# === EXTRACT ISSUE META ===
+def extract_issue_meta(key, issue_data, changelog_scan=None):
+    fields = issue_data['fields']
+    if not fields:
+        add_app_message("error", f"No fields found for issue {key}.")
+        return {}
+    
+    if changelog_scan is None:
+        changelog_scan = get_issue_changelog_scan(issue_data)
+    sprints_field = fields.get(CUSTOM_FIELD_SPRINTS_ID)
+
+    sprint_str = "N/A"
+    if isinstance(sprints_field, list):        
+        sprint_names = []
+        sprints_field.sort(key=lambda x: x.get('id', 0), reverse=True)
+        for sprint in sprints_field:
+            if isinstance(sprint, dict) and 'name' in sprint:
+                sprint_names.append(sprint['name'])
+        sprint_str = ", ".join(sprint_names) if sprint_names else "N/A"
+
+    # Fix: Ensure Story Points are explicitly converted to int if numeric, handle None/NaN
+    story_points_value = fields.get(CUSTOM_FIELD_STORY_POINTS_ID, None) # Default to None if not found
+    if story_points_value is None or (isinstance(story_points_value, float) and np.isnan(story_points_value)):
+        story_points_value = "N/A" # Display "N/A" for missing values
+    elif isinstance(story_points_value, (int, float)):
+        story_points_value = int(story_points_value) # Cast to int
+    elif isinstance(story_points_value, str) and story_points_value.replace('.','',1).isdigit():
+        try:
+            story_points_value = int(float(story_points_value)) # Handle '1.0' as string
+        except ValueError:
+            story_points_value = "N/A" # Fallback if string is not convertible to number
+    else:
+        story_points_value = str(story_points_value) # Keep as string if some other non-numeric type
+
+    failed_qa_count = changelog_scan["failed_qa_count"]
+    logged_time_in_seconds = int(changelog_scan["logged_time"]) if changelog_scan["logged_time"] is not None else 0
+    # st.info(f"Extracted issue meta for {key}: Type={fields['issuetype']['name']}, Summary={fields['summary']}, Assignee={fields['assignee']['displayName'] if fields['assignee'] else 'Unassigned'}, Status={fields['status']['name']}, Story Points={story_points_value}, Sprints={sprint_str}, Failed QA Count={failed_qa_count}, Logged Time={logged_time}")
+
+    return {
+        "Key": key,
+        "Type": fields['issuetype']['name'],
+        "Summary": fields['summary'],
+        "Assignee": fields['assignee']['displayName'] if fields['assignee'] else "Unassigned",
+        "Status": fields['status']['name'],
+        "Created": fields['created'],
+        "Resolved": changelog_scan["resolved_at"],
+        "Story Points": story_points_value, # Use the potentially converted int/string value
+        "Sprints": sprint_str,
+        "Failed QA Count": failed_qa_count,
+        "Logged Time": seconds_to_hm(logged_time_in_seconds),
+    }
+
+# === GENERATE HEADERS ===
+def generate_headers():
+    return ["Key", "Type", "Summary", "Assignee", "Status", "Created", "Resolved", "Story Points", "Sprints", "Failed QA Count", "Logged Time", "Cycle Time", "Lead Time"] + WORKFLOW_STATUSES
+
+def build_report_dataframe(rows):
+    return apply_report_schema(pd.DataFrame(rows, columns=generate_headers()))
+
+def apply_report_schema(df):
+    # Rows keep JSON-friendly values (raw timestamps, "N/A" story points) for snapshots and previews; the frame is typed here
+    typed_columns = {}
+    for col in df.columns:
+        if col in REPORT_CATEGORY_COLUMNS:
+            typed_columns[col] = df[col].astype("category")
+        elif col in REPORT_INTEGER_COLUMNS:
+            typed_columns[col] = pd.to_numeric(df[col], errors="coerce").astype(REPORT_INTEGER_DTYPE)
+        elif col in REPORT_DATETIME_COLUMNS:
+            typed_columns[col] = parse_report_timestamps(df[col])
+        elif col in REPORT_DURATION_COLUMNS:
+            typed_columns[col] = df[col].astype(REPORT_HOURS_DTYPE)
+    return df.assign(**typed_columns)
+
+def parse_report_timestamps(values):
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    # Jira's fixed layout minus the UTC offset: the wall-clock time as Jira reported it
+    return pd.to_datetime(values.astype("string").str[:JIRA_LOCAL_TIME_LENGTH], format="%Y-%m-%dT%H:%M:%S.%f", errors="coerce")
+
+# === CREATE ROW FOR EXPORT ===
+def create_row(meta, metrics, selected_team_name):
+    durations = metrics['durations_by_status_hours']
+    row = {
+        **meta,
+        "Cycle Time": metrics['cycle_time_hours'],
+        "Lead Time": metrics['lead_time_hours'],
+    }
+    
+    # --- Fix: Embed diamond differentiators in Sprints column in DataFrame ---
+    if "Sprints" in meta and selected_team_name:
+        original_sprints_str = meta["Sprints"]
+        if original_sprints_str != "N/A":
+            current_sprint_full, previous_sprint_full = get_current_and_previous_sprints(selected_team_name)
+            
+            sprint_values_in_cell = [s.strip() for s in original_sprints_str.split(",")]
+            updated_sprints = []
+            for sprint_text in sprint_values_in_cell:
+                sprint_clean = sprint_text.replace("🔶", "").replace("🔷", "").strip()
+
+                if sprint_clean == current_sprint_full:
+                    updated_sprints.append(f"{sprint_clean} 🔶")
+                elif sprint_clean == previous_sprint_full:
+                    updated_sprints.append(f"{sprint_clean} 🔷")
+                else:
+                    updated_sprints.append(sprint_text)
+
+            row["Sprints"] = ", ".join(updated_sprints)
+    # --- End Fix ---
+
+    for status in WORKFLOW_STATUSES:
+        row[status] = durations.get(status)
+    return row
+
+# === COMMAND LINE ===
+def parse_cli_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a Jira cycle/lead time Excel report without the Streamlit UI.")
+    parser.add_argument("--url", default=os.environ.get("JIRA_URL"), help="Jira URL (default: $JIRA_URL)")
+    parser.add_argument("--username", default=os.environ.get("JIRA_USERNAME"), help="Jira email/username (default: $JIRA_USERNAME)")
+    parser.add_argument("--api-token", default=os.environ.get("JIRA_API_TOKEN"), help="Jira API token (default: $JIRA_API_TOKEN)")
+    selection = parser.add_mutually_exclusive_group(required=True)
+    selection.add_argument("--jql", help="Report on the issues matching this JQL")
+    selection.add_argument("--keys", help="Report on these issue keys, e.g. MAIN-22,MAIN-24")
+    selection.add_argument("--team", choices=list(TEAMS_DATA), help="Report on one team (current sprint unless --duration is given)")
+    selection.add_argument("--teams", nargs="+", choices=list(TEAMS_DATA), help="Batch report: one sheet per team plus a summary")
+    parser.add_argument("--duration", choices=list(DURATIONS_DATA), help="Created-date window for --team/--teams")
+    parser.add_argument("--start-date", type=date.fromisoformat, help="Start of a custom date range (YYYY-MM-DD)")
+    parser.add_argument("--end-date", type=date.fromisoformat, help="End of a custom date range (YYYY-MM-DD)")
+    parser.add_argument("--cycle-threshold-days", type=int, default=7)
+    parser.add_argument("--lead-threshold-days", type=int, default=21)
+    parser.add_argument("--excel-mode", choices=list(EXCEL_EXPORT_MODES.values()), default=DEFAULT_FETCH_OPTIONS["excel_mode"])
+    parser.add_argument("--fetch-engine", choices=list(FETCH_ENGINES.values()), default=DEFAULT_FETCH_OPTIONS["fetch_engine"])
+    parser.add_argument("--no-bulk-fetch", action="store_true", help="Fetch issues one request at a time")
+    parser.add_argument("--no-issue-cache", action="store_true", help="Do not read or write the on-disk issue cache")
+    parser.add_argument("--force-refresh", action="store_true", help="Ignore cached issues")
+    parser.add_argument("--delta-refresh", action="store_true", help="Only re-collect issues changed since the last run of the same query (--force-refresh then only bypasses the issue cache)")
+    parser.add_argument("--split-files", action="store_true", help="With --teams, write a zip of per-team workbooks")
+    parser.add_argument("--output-dir", default=".", help="Directory the report is written to")
+    parser.add_argument("--quiet", action="store_true", help="Only log warnings and errors")
+    args = parser.parse_args(argv)
+    if not (args.url and args.username and args.api_token):
+        parser.error("Jira URL, username and API token are required (flags or JIRA_URL/JIRA_USERNAME/JIRA_API_TOKEN).")
+    # Options that would otherwise be silently ignored are rejected, so a typo in a scheduled run fails loudly
+    is_custom_range = args.duration is not None and DURATIONS_DATA[args.duration] == "customDateRange()"
+    if (args.jql or args.keys) and (args.duration or args.start_date or args.end_date):
+        parser.error("--duration, --start-date and --end-date only apply to --team/--teams.")
+    if is_custom_range and not (args.start_date and args.end_date):
+        parser.error("--duration 'Custom Date Range' needs --start-date and --end-date.")
+    if (args.start_date or args.end_date) and not is_custom_range:
+        parser.error("--start-date and --end-date need --duration 'Custom Date Range'.")
+    if is_custom_range and args.start_date > args.end_date:
+        parser.error("--start-date must not be after --end-date.")
+    if args.teams and not args.duration:
+        parser.error("--teams needs --duration.")
+    if args.split_files and not args.teams:
+        parser.error("--split-files only applies to --teams.")
+    if args.delta_refresh and args.teams:
+        parser.error("--delta-refresh is not supported for --teams batch reports.")
+    return args
+
+def main(argv=None):
+    args = parse_cli_args(argv)
+    logging.basicConfig(level=logging.WARNING if args.quiet else logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    cycle_threshold_hours = args.cycle_threshold_days * 24
+    lead_threshold_hours = args.lead_threshold_days * 24
+    fetch_options = {
+        **DEFAULT_FETCH_OPTIONS,
+        "bulk_fetch": not args.no_bulk_fetch,
+        "fetch_engine": resolve_fetch_engine(args.fetch_engine),
+        "use_issue_cache": not args.no_issue_cache,
+        "force_refresh": args.force_refresh,
+        "delta_refresh": args.delta_refresh,
+        "excel_mode": args.excel_mode,
+    }
+    custom_date_range = (args.start_date, args.end_date) if args.start_date and args.end_date else None
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+
+    try:
+        if args.teams:
+            output_buffer, output_filename, report_df = run_batch_report(
+                args.teams, args.duration, args.url, args.username, args.api_token, cycle_threshold_hours, lead_threshold_hours,
+                fetch_options, custom_date_range, args.split_files
+            )
+        else:
+            team_name = args.team
+            if args.jql:
+                jql, file_label = args.jql, f"jql_asof_{timestamp}"
+            elif args.keys:
+                jql, file_label = f"KEY IN ({args.keys})", f"tickets_{args.keys.replace(',', '_')}_asof_{timestamp}"
+            elif args.duration:
+                jql = build_team_duration_jql(TEAMS_DATA[team_name], DURATIONS_DATA[args.duration], custom_date_range)
+                file_label = build_team_duration_label(team_name, args.duration, custom_date_range)
+            else:
+                jql = f"'Team[Team]' = \"{TEAMS_DATA[team_name]}\" AND sprint in openSprints() AND issuetype NOT IN (Sub-task) ORDER BY KEY"
+                file_label = f"{team_name.lower().replace(' ', '_')}_current_sprint_asof_{timestamp}"
+            output_buffer, output_filename, report_df = run_report_pipeline(
+                jql, args.url, args.username, args.api_token, cycle_threshold_hours, lead_threshold_hours, file_label, team_name, fetch_options
+            )
+    except ReportAborted:
+        return 1
+    except (requests.exceptions.RequestException, OSError, ValueError) as e:
+        print(f"jira_metrics: report failed: {e}", file=sys.stderr)
+        return 1
+
+    if report_df is None:
+        return 0
+    output_path = os.path.join(args.output_dir, output_filename)
+    try:
+        os.makedirs(args.output_dir, exist_ok=True)
+        with open(output_path, "wb") as output_file:
+            output_file.write(output_buffer.getvalue())
+    except OSError as e:
+        print(f"jira_metrics: could not write {output_path}: {e}", file=sys.stderr)
+        return 1
+    logger.info(f"Wrote {len(report_df)} issues to {output_path}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,63 +1,63 @@
 import streamlit as st
 import pandas as pd
-from jira import JIRA
-from jira.exceptions import JIRAError
-import re
 import numpy as np
 import io
-from concurrent.futures import ThreadPoolExecutor
+import json
+import time
 from datetime import datetime, date
-import requests
-from requests.auth import HTTPBasicAuth
-from openpyxl import load_workbook
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-from openpyxl.formatting.rule import ColorScaleRule
-from openpyxl.utils import get_column_letter
-from openpyxl.worksheet.table import Table, TableStyleInfo
-from openpyxl.comments import Comment
-import os
 from collections import OrderedDict
-
-# --- Configuration Constants (from your jira_cycle_lead_time.ipynb) ---
-STATUS_INPUT = "Released, Closed"
-CYCLE_STATUSES = ["In Progress", "In Review", "Ready for Testing", "In Testing"]
-WORKFLOW_STATUSES = [
-    "To Do", "In Progress", "Paused", "In Review", "Ready for Testing",
-    "In Testing", "QA Complete", "In UAT", "In UAT Testing",
-    "Ready for Release", "Released", "Closed"
-]
-
+from jira_metrics import (
+    CONCURRENCY_CEILING,
+    CONCURRENCY_FLOOR,
+    DURATIONS_DATA,
+    EXCEL_EXPORT_MODES,
+    FETCH_ENGINES,
+    PROFILE_MODE,
+    PROFILE_MODES,
+    PROFILE_TOP_N,
+    REPORT_DURATION_COLUMNS,
+    TEAMS_DATA,
+    WORKFLOW_STATUSES,
+    add_app_message,
+    build_report_dataframe,
+    build_team_duration_jql,
+    build_team_duration_label,
+    create_row,
+    format_duration,
+    format_job_event_summary,
+    format_report_values,
+    get_http_session,
+    get_issue_cache,
+    get_job_runner,
+    get_report_snapshot_store,
+    resolve_fetch_engine,
+    run_batch_report_job,
+    run_report_job,
+    set_message_sink,
+    summarize_job_events,
+    workflow_heatmap_levels,
+)
+
+# --- UI Constants ---
 SEARCH_OPTIONS_DISPLAY = OrderedDict([
     ("JIRA Story", 1),
     ("Team and Current Sprint", 2),
-    ("Team and Duration", 3)
+    ("Team and Duration", 3),
+    ("Multiple Teams and Duration", 4)
 ])
 
-# Hardcoded TEAMS data from your ipynb file (name mapped to ID)
-TEAMS_DATA = OrderedDict([
-    ("A Team", "34e068f6-978d-4ad9-a4ef-3bf5eec72f65"),
-    ("Avengers", "8d39d512-0220-4711-9ad0-f14fbf74a50e"),
-    ("Jarvis", "1ec8443e-a42c-4613-bc88-513ee29203d0"),
-    ("Mavrix", "1d8f251a-8fd9-4385-8f5f-6541c28bda19"),
-    ("Phoenix", "ac9cc58b-b860-4c4d-8a4e-5a64f50c5122"),
-    ("Quantum", "99b45e3f-49de-446c-b28d-25ef8e915ad6")
+BATCH_OUTPUT_FORMATS = OrderedDict([
+    ("One workbook (sheet per team)", False),
+    ("Separate files (zip)", True)
 ])
 
-# Hardcoded DURATIONS data from your ipynb file
-DURATIONS_DATA = OrderedDict([
-    ("Year to Date", "startOfYear()"),
-    ("Current Month", "startOfMonth()"),
-    ("Last Month", "startOfMonth(-1)"),
-    ("Last 2 Months", "startOfMonth(-2)"),
-    ("Last 3 Months", "startOfMonth(-3)"),
-    ("Last 6 Months", "startOfMonth(-6)"),
-    ("Custom Date Range", "customDateRange()")
-])
+# Report preview: only the visible page is styled and sent to the browser
+PREVIEW_PAGE_SIZES = [25, 50, 100, 250]
+LIVE_PREVIEW_MAX_ROWS = 100 # While a job runs only its latest rows are shown, so each poll costs the same
+PREVIEW_CACHE_MAX_ENTRIES = 32
 
-# --- Custom Field IDs (from previous context, used in extract_issue_meta) ---
-CUSTOM_FIELD_ACCOUNT_ID = 'customfield_10267' # Not used in this report script's JQL
-CUSTOM_FIELD_TEAM_ID = 'customfield_10001' # Used for JQL based on name, not ID here
-CUSTOM_FIELD_STORY_POINTS_ID = 'customfield_10014' # Used in extract_issue_meta for Story Points column
+# Background report jobs are polled by the page this often
+JOB_POLL_SECONDS = 1.0
 
 
 # --- Initialize ALL Streamlit session state variables at the TOP LEVEL ---
@@ -100,6 +100,26 @@ if 'generated_report_file_buffer' not in st.session_state:
     st.session_state.generated_report_file_buffer = None
 if 'generated_report_filename' not in st.session_state:
     st.session_state.generated_report_filename = None
+if 'generated_report_cache_age' not in st.session_state:
+    st.session_state.generated_report_cache_age = None
+if 'report_job_id' not in st.session_state:
+    st.session_state.report_job_id = None
+if 'report_job_alerts' not in st.session_state:
+    st.session_state.report_job_alerts = []
+if 'report_job_team' not in st.session_state:
+    st.session_state.report_job_team = None
+if 'report_job_preview_rows' not in st.session_state:
+    st.session_state.report_job_preview_rows = []
+if 'report_job_events' not in st.session_state:
+    st.session_state.report_job_events = None
+if 'generated_report_id' not in st.session_state:
+    st.session_state.generated_report_id = None
+if 'report_preview_cache' not in st.session_state:
+    st.session_state.report_preview_cache = OrderedDict()
+if 'generated_report_perf' not in st.session_state:
+    st.session_state.generated_report_perf = None
+if 'generated_report_profiler' not in st.session_state:
+    st.session_state.generated_report_profiler = None
 
 
 # --- Global Message Handling ---
@@ -123,7 +143,7 @@ if 'generated_report_filename' not in st.session_state:
 #                 st.rerun()
 #     else: placeholder_widget.empty()
 
-def add_app_message(level, message):
+def show_app_message(level, message):
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     if 'app_messages' not in st.session_state: st.session_state.app_messages = []
     st.session_state.app_messages.append(f"[{timestamp}] [{level.upper()}] {message}")
@@ -133,12 +153,22 @@ def add_app_message(level, message):
     elif level == "warning":
         st.warning(f"[{timestamp}] {message}")
 
+# add_app_message calls made on the script thread are rendered on the page
+set_message_sink(show_app_message)
+
 # --- Jira Connection Function ---
 @st.cache_resource
 def connect_to_jira_streamlit(url, username, api_token):
+    # python-jira is only imported once someone connects, so the first page render doesn't pay for it
     try:
+        from jira import JIRA
         jira_options = {'server': url}
-        jira = JIRA(options=jira_options, basic_auth=(username, api_token))
+        # python-jira's own retry loop is disabled; the shared adapter handles retries and backoff
+        jira = JIRA(options=jira_options, basic_auth=(username, api_token), max_retries=0, get_server_info=False)
+        session = get_http_session(url, username, api_token)
+        jira._session.mount("https://", session.get_adapter("https://"))
+        jira._session.mount("http://", session.get_adapter("http://"))
+        jira.server_info()
         return jira
     except Exception as e:
         add_app_message("error", f"Error connecting to Jira: {e}")
@@ -149,6 +179,7 @@ def connect_to_jira_streamlit(url, username, api_token):
 def get_available_projects_streamlit(jira_url, jira_username, jira_api_token):
     jira_instance = connect_to_jira_streamlit(jira_url, jira_username, jira_api_token)
     if not jira_instance: return []
+    from jira.exceptions import JIRAError
     try:
         projects = jira_instance.projects()
         project_list = [{'key': p.key, 'name': p.name} for p in projects]
@@ -185,6 +216,7 @@ def get_all_jira_users_streamlit(jira_url, jira_username, jira_api_token, filter
 
 
 def fetch_users_page(jira_instance, start_at, max_results):
+    from jira.exceptions import JIRAError
     try:
         return jira_instance.search_users(query='*', startAt=start_at, maxResults=max_results, includeInactive=False)
     except JIRAError as e:
@@ -321,684 +353,66 @@ def fetch_options_from_jql(jira_instance, field_id, project_key, field_name):
         add_app_message("error", f"Error fetching options via JQL for '{field_name}' ({field_id}): {e}")
         return []
 
-# === GET ISSUES FROM JQL ===
-def get_issues_by_jql(jql, jira_url, username, api_token):
-    auth = HTTPBasicAuth(username, api_token)
-    if not jql.strip():
-        add_app_message("error", "JQL query cannot be empty.")
-        st.stop()
-    issue_keys = []
-    start_at = 0
-    max_results = 50
-    while True:
-        url = f"{jira_url}/rest/api/3/search"
-        params = {
-            "jql": jql,
-            "fields": "key",
-            "startAt": start_at,
-            "maxResults": max_results
-        }
-        try:
-            response = requests.get(url, auth=auth, params=params)
-            response.raise_for_status()
-            data = response.json()
-            issues = data.get("issues", [])
-            issue_keys.extend(issue['key'] for issue in issues)
-            if len(issues) < max_results:
-                break
-            start_at += max_results
-        except requests.exceptions.RequestException as e:
-            add_app_message("error", f"Network or API error during JQL search: {e}")
-            st.stop()
-        except Exception as e:
-            add_app_message("error", f"An unexpected error occurred during JQL search: {e}")
-            st.stop()
-    return issue_keys
-
-# === FORMAT DURATION ===
-# def format_duration(hours):
-#     if hours is None: return "N/A"
-#     if hours < 24: return f"{int(round(hours))} hrs"
-#     days = int(hours // 24)
-#     rem_hrs = int(round(hours % 24))
-#     return f"{days} days" if rem_hrs == 0 else f"{days} days {rem_hrs} hrs"
-
-def format_duration(hours):
-    if hours is None:
-        return "N/A"
-    total_minutes = int(round(hours * 60))  # Convert to minutes
-    days = total_minutes // (24 * 60)
-    rem_minutes = total_minutes % (24 * 60)
-    hrs = rem_minutes // 60
-    mins = rem_minutes % 60
-
-    parts = []
-    if days > 0:
-        parts.append(f"{days} days")
-    if hrs > 0:
-        parts.append(f"{hrs} hrs")
-    if mins > 0 or not parts:
-        parts.append(f"{mins} mins")
-
-    return " ".join(parts)
-
-# === GET ISSUE WITH CHANGELOG ===
-def get_issue_changelog(issue_key, jira_url, username, api_token):
-    auth = HTTPBasicAuth(username, api_token)
-    url = f"{jira_url}/rest/api/3/issue/{issue_key}?expand=changelog"
-    try:
-        response = requests.get(url, auth=auth)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        add_app_message("error", f"Network or API error fetching changelog for {issue_key}: {e}")
-        raise
-    except Exception as e:
-        add_app_message("error", f"An unexpected error occurred fetching changelog for {issue_key}: {e}")
-        raise
-
-def count_transitions(histories, from_status, to_status):
-    count = 0
-    for history in histories:
-        for item in history['items']:
-            if item['field'] == 'status':
-                from_str = item['fromString']
-                to_str = item['toString']
-                
-                if from_str == from_status and to_str == to_status:
-                    # print(f"Transition found: {history['created']} - {from_str} to {to_str}")
-                    count += 1
-
-    return count
-
-def seconds_to_dhm(seconds):
-    days = seconds // 86400
-    hours = (seconds % 86400) // 3600
-    minutes = (seconds % 3600) // 60
-    return f"{days} days {hours} hrs {minutes} mins"
-
-def seconds_to_hm(seconds_str):
-    try:
-        seconds = int(seconds_str)
-    except (ValueError, TypeError):
-        return ""
-
-    hours = seconds // 3600
-    minutes = (seconds % 3600) // 60
-    return f"{hours} hrs {minutes} mins"
-
-def get_logged_time(histories):
-    for history in histories:
-        for item in history['items']:
-            if item.get('field') == 'timespent':
-                return int(item['to'])
-    return 0
-
-# === EXCEL FORMATTER ===
-def format_excel(df, output_file_label, cycle_threshold, lead_threshold):
-    if cycle_threshold <= 0 or lead_threshold <= 0:
-        raise ValueError("Cycle Time and Lead Time thresholds must be positive integers.")
-    
-    output_buffer = io.BytesIO()
-    with pd.ExcelWriter(output_buffer, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name="JIRA Cycle Times")
-    
-    wb = load_workbook(output_buffer)
-    ws = wb.active
-    ws.title = "JIRA Cycle Times"
-    ws.sheet_properties.tabColor = "1072BA"
-
-    format_sheet(ws, df.columns, cycle_threshold, lead_threshold, output_file_label)
-    
-    wb.save(output_buffer)
-    output_buffer.seek(0)
-    return output_buffer
-
-# === FORMAT SHEET ===
-def format_sheet(sheet, headers, cycle_threshold, lead_threshold, output_file_label):
-    create_table(sheet)
-    freeze_top_row(sheet)
-    auto_adjust_column_width(sheet)
-    align_headers(sheet)
-    selected_team_name_for_sprints = output_file_label.split('_')[0].replace('-', ' ').title()
-    highlight_current_sprint_multiline(sheet, headers, selected_team_name_for_sprints) 
-    highlight_long_durations(sheet, cycle_threshold, lead_threshold)
-
-# === TABLE CREATION AND FORMATTING ===
-def create_table(sheet):
-    table = Table(displayName="JIRAMetricsTable", ref=f"A1:{get_column_letter(sheet.max_column)}{sheet.max_row}")
-    style = TableStyleInfo(name="TableStyleMedium1", showFirstColumn=False, showLastColumn=False, showRowStripes=True)
-    table.tableStyleInfo = style
-    sheet.add_table(table)
-
-# === SHEET FORMATTING FUNCTIONS ===
-def freeze_top_row(sheet):
-    sheet.freeze_panes = "B2"
-
-def auto_adjust_column_width(sheet):
-    for col in sheet.columns:
-        max_length = 0
-        col_letter = get_column_letter(col[0].column)
-        for cell in col:
-            if cell.value:
-                max_length = max(max_length, len(str(cell.value)))
-        sheet.column_dimensions[col_letter].width = max_length + 5
-    set_border(sheet, f"A1:{get_column_letter(sheet.max_column)}{sheet.max_row}")
-    sheet.sheet_view.showGridLines = False
-
-def align_headers(sheet):
-    for col in range(1, sheet.max_column + 1):
-        cell = sheet.cell(row=1, column=col)
-        cell.alignment = Alignment(horizontal="center")
-        cell.font = Font(color="FFFFFF", bold=True)
-
-def set_border(sheet, cell_range):
-    thin_border = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
-    for row in sheet[cell_range]:
-        for cell in row:
-            cell.border = thin_border
-
-def highlight_long_durations(sheet, cycle_threshold, lead_threshold):
-    orange_fill = PatternFill(start_color="FFD580", end_color="FFD580", fill_type="solid")
-    col_idx = map_columns(sheet)
-    add_tooltip_comments(sheet, col_idx, cycle_threshold, lead_threshold)
-    apply_story_points_gradient(sheet, col_idx)
-    highlight_rows(sheet, col_idx, orange_fill, cycle_threshold, lead_threshold)
-    add_legend(sheet, orange_fill, cycle_threshold, lead_threshold)
-
-def map_columns(sheet):
-    header = [cell.value for cell in sheet[1]]
-    return {col: idx + 1 for idx, col in enumerate(header)}
-
-def add_tooltip_comments(sheet, col_idx, cycle_threshold, lead_threshold):
-    if col_idx.get("Cycle Time"):
-        sheet.cell(row=1, column=col_idx["Cycle Time"]).comment = Comment(f"Orange if Cycle Time > {cycle_threshold // 24} days", "System")
-    if col_idx.get("Lead Time"):
-        sheet.cell(row=1, column=col_idx["Lead Time"]).comment = Comment(f"Orange if Lead Time > {lead_threshold // 24} days", "System")
-    if col_idx.get("Story Points"):
-        sheet.cell(row=1, column=col_idx["Story Points"]).comment = Comment("Green gradient: low → high Story Points", "System")
-
-def apply_story_points_gradient(sheet, col_idx):
-    sp_col = col_idx.get("Story Points")
-    if sp_col:
-        sp_letter = get_column_letter(sp_col)
-        sp_range = f"{sp_letter}2:{sp_letter}{sheet.max_row}"
-        blue_gradient = ColorScaleRule(
-            start_type='min', start_color='E6F0FA',
-            mid_type='percentile', mid_value=50, mid_color='4FC3F7',
-            end_type='max', end_color='1565C0'
-        )
-        sheet.conditional_formatting.add(sp_range, blue_gradient)
-
-def duration_to_hours(val):
-    if not isinstance(val, str) or val.strip().upper() == "N/A":
-        return None
-    days = hrs = 0
-    if m := re.search(r"(\d+)\s*days?", val):
-        days = int(m.group(1))
-    if m := re.search(r"(\d+)\s*hrs?", val):
-        hrs = int(m.group(1))
-    return days * 24 + hrs
-   
-def get_current_and_previous_sprints(team_name_for_sprint, base_sprint="2025.12", base_start_date_str="2025-06-11", sprint_length_days=14):
-    base_year, base_sprint_num = map(int, base_sprint.split("."))
-    base_start_date = datetime.strptime(base_start_date_str, "%Y-%m-%d").date()
-    today = datetime.today().date()
-
-    days_elapsed = (today - base_start_date).days
-    if days_elapsed < 0:
-        return (f"{team_name_for_sprint} {base_year}.{base_sprint_num:02d}", f"{team_name_for_sprint} {max(base_sprint_num - 1, 1):02d}")
-
-    sprint_offset = days_elapsed // sprint_length_days
-    current_sprint_num = base_sprint_num + sprint_offset
-    current_year = base_year
-
-    while current_sprint_num > 52:
-        current_sprint_num -= 52
-        current_year += 1
-    
-    previous_sprint_num = current_sprint_num - 1
-    previous_sprint_year = current_year
-    if previous_sprint_num <= 0:
-        previous_sprint_num += 52
-        previous_sprint_year -= 1
-
-
-    return (
-        f"{team_name_for_sprint} {current_year}.{current_sprint_num:02d}",
-        f"{team_name_for_sprint} {previous_sprint_year}.{previous_sprint_num:02d}"
-    )
-
-def get_column_index_by_header(sheet, header_name):
-    for cell in sheet[1]:
-        if str(cell.value).strip().lower() == header_name.lower():
-            return cell.column
-    return -1
-
-def highlight_current_sprint_multiline(sheet, headers, team_name_for_sprint):
-    current_sprint_full, previous_sprint_full = get_current_and_previous_sprints(team_name_for_sprint, base_sprint="2025.12", base_start_date_str="2025-06-11")
-
-    col_idx = get_column_index_by_header(sheet, "Sprints")
-    if col_idx == -1:
-        add_app_message("warning", "Sprints column not found for sprint highlighting.")
-        return
-    
-    for row in sheet.iter_rows(min_row=2):
-        cell = row[col_idx - 1]
-
-        if not cell.value:
-            continue
-
-        sprint_values_in_cell = [s.strip() for s in str(cell.value).split(",")]
-        modified = False
-        updated_sprints = []
-
-        for sprint_text in sprint_values_in_cell:
-            sprint_clean = sprint_text.replace("🔶", "").replace("🔷", "").strip()
-
-            if sprint_clean == current_sprint_full:
-                updated_sprints.append(f"{sprint_clean} 🔶")
-                modified = True
-            elif sprint_clean == previous_sprint_full:
-                updated_sprints.append(f"{sprint_clean} 🔷")
-                modified = True
-            else:
-                updated_sprints.append(sprint_text)
-
-        if modified:
-            cell.value = ", ".join(updated_sprints)
-
-def get_duration_hours_from_excel_cell(sheet, row, col):
-    if col:
-        val = sheet.cell(row=row, column=col).value
-        return duration_to_hours(val) if isinstance(val, str) and val.strip().upper() == "N/A" else None
-    return None
-
-def highlight_cell(sheet, row, col, hours, threshold, fill):
-    if col and hours is not None and hours > threshold:
-        sheet.cell(row=row, column=col).fill = fill
-
-def is_threshold_breached(hours, threshold):
-    return hours is not None and hours >= threshold
-
-def calculate_cycle_time_hours_from_excel(sheet, row, col_idx):
-    total_hours = 0
-    for status in CYCLE_STATUSES:
-        col = col_idx.get(status)
-        if not col: continue
-        val = sheet.cell(row=row, column=col).value
-        if isinstance(val, str) and val.strip().upper() != "N/A":
-            hours_in_status = duration_to_hours(val)
-            if hours_in_status is not None: total_hours += hours_in_status
-    return total_hours if total_hours > 0 else None
-
-def highlight_rows(sheet, col_idx, orange_fill, cycle_threshold, lead_threshold):
-    cycle_time_header_col_idx = col_idx.get("Cycle Time")
-    lead_time_header_col_idx = col_idx.get("Lead Time")
-
-    for row in range(2, sheet.max_row + 1):
-        current_cycle_hours = calculate_cycle_time_hours_from_excel(sheet, row, col_idx)
-        current_lead_hours = get_duration_hours_from_excel_cell(sheet, row, lead_time_header_col_idx)
-
-        highlight_cell(sheet, row, cycle_time_header_col_idx, current_cycle_hours, cycle_threshold, orange_fill)
-        highlight_cell(sheet, row, lead_time_header_col_idx, current_lead_hours, lead_threshold, orange_fill)
-
-        if should_apply_heatmap(current_cycle_hours, cycle_threshold, current_lead_hours, lead_threshold):
-            breach_scope = determine_breach_scope(current_cycle_hours, cycle_threshold, current_lead_hours, lead_threshold)
-            apply_workflow_heatmap(sheet, row, col_idx, breach_scope)
-
-def should_apply_heatmap(cycle_hours, cycle_threshold, lead_hours, lead_threshold):
-    return (is_threshold_breached(cycle_hours, cycle_threshold) or is_threshold_breached(lead_hours, lead_threshold))
-
-def determine_breach_scope(cycle_hours, cycle_threshold, lead_hours, lead_threshold):
-    lead_breach = is_threshold_breached(lead_hours, lead_threshold)
-    cycle_breach = is_threshold_breached(cycle_hours, cycle_threshold)
-    if lead_breach: return "lead"
-    elif cycle_breach: return "cycle"
-    return None
-
-def apply_workflow_heatmap(sheet, row, col_idx, scope="lead"):
-    if scope is None: return
-    if scope == "cycle": workflow_subset = CYCLE_STATUSES
-    elif scope == "lead": workflow_subset = [status for status in WORKFLOW_STATUSES if status not in {"Released", "Closed"}]
-    else: workflow_subset = WORKFLOW_STATUSES
-
-    row_durations = {}; values = []
-    for status in workflow_subset:
-        col = col_idx.get(status)
-        if not col: continue
-        val = sheet.cell(row=row, column=col).value
-        hours = duration_to_hours(val)
-        row_durations[status] = (col, hours)
-        if hours is not None: values.append(hours)
-    
-    if not values: return
-
-    min_val, max_val = min(values), max(values)
-    delta = max_val - min_val if max_val != min_val else 1
-
-    for status, (col, hours) in row_durations.items():
-        if hours is None: continue
-        intensity = (hours - min_val) / delta
-        hex_color = calculate_heatmap_color(intensity)
-        sheet.cell(row=row, column=col).fill = PatternFill(start_color=hex_color, end_color=hex_color, fill_type="solid")
-
-def calculate_heatmap_color(intensity):
-    r = 255; g = int(200 - 120 * intensity); b = int(200 - 120 * intensity)
-    r = max(0, min(255, r)); g = max(0, min(255, g)); b = max(0, min(255, b))
-    return f"FF{r:02X}{g:02X}{b:02X}"
-
-def add_legend(sheet, orange_fill, cycle_threshold, lead_threshold):
-    legend_col = sheet.max_column + 2
-    sheet.cell(row=1, column=legend_col, value="Legend").font = Font(bold=True, size=12, underline="single")
-    legends = [
-        (f"Cycle Time > {cycle_threshold // 24}d", orange_fill),
-        (f"Lead Time > {lead_threshold // 24}d", orange_fill),
-        ("Story Points: Light→Dark Blue", PatternFill(start_color="A9D0F5", end_color="1565C0", fill_type="solid")),
-        ("Workflow: Light→Dark Red (per row, if breached)", PatternFill(start_color="FFCCCC", end_color="FF6666", fill_type="solid")),
-    ]
-    for i, (label, fill) in enumerate(legends, start=2):
-        cell = sheet.cell(row=i, column=legend_col, value=label)
-        cell.fill = fill
-        cell.font = Font(bold=True)
-    adjust_legend_column_width(sheet, legend_col)
-
-def adjust_legend_column_width(sheet, legend_col):
-    legend_letter = get_column_letter(legend_col)
-    max_len = max((len(str(sheet.cell(row=row, column=legend_col).value)) for row in range(1, sheet.max_row + 1) if sheet.cell(row=row, column=legend_col).value), default=0)
-    sheet.column_dimensions[legend_letter].width = max_len + 5
-
-# === REPORT GENERATOR ===
-def collect_metrics_streamlit(issue_keys, jira_url, username, api_token):
-    all_metrics = []
-    auth = HTTPBasicAuth(username, api_token)
-
-    def process_issue(key):
-        try:
-            issue_data = get_issue_changelog(key, jira_url, username, api_token)
-            issue_meta = extract_issue_meta(key, issue_data)
-            metrics = calculate_state_durations(key, issue_data)
-            all_metrics.append((issue_meta, metrics))
-        except requests.exceptions.RequestException as req_e:
-            add_app_message("error", f"Network error fetching issue {key}: {req_e}")
-        except Exception as e:
-            add_app_message("error", f"Error processing issue {key}: {e}")
-
-    with ThreadPoolExecutor(max_workers=5) as executor:
-        list(executor.map(process_issue, issue_keys))
-    return all_metrics
-
-def generate_report_streamlit(issue_keys, jira_url, username, api_token, cycle_threshold, lead_threshold, file_label, selected_team_name):
-    add_app_message("Info", f"Collecting metrics for {len(issue_keys)} issues. This may take a while...")
-    all_metrics = collect_metrics_streamlit(issue_keys, jira_url, username, api_token)
-    
-    if not all_metrics:
-        add_app_message("warning", "No metrics collected. Report will be empty.")
-        return None, None, None
-
-    headers = generate_headers()
-    data = [create_row(meta, metrics, selected_team_name) for meta, metrics in all_metrics]
-    
-    df = pd.DataFrame(data, columns=headers)
-
-    output_buffer = format_excel(df, file_label, cycle_threshold, lead_threshold)
-    
-    add_app_message("Info", "Report data generated successfully!")
-    return output_buffer, f"{file_label}.xlsx", df
-
-# === CALCULATE DURATIONS ===
-def calculate_durations(transitions, created_time, issue_key):
-    durations = {}
-    status_times = {"To Do": created_time}
-
-    for _, to_status, timestamp in transitions:
-        if to_status and to_status not in status_times:
-            status_times[to_status] = timestamp
-
-    ordered_statuses = sorted(
-        [status for status in WORKFLOW_STATUSES if status in status_times],
-        key=lambda s: status_times[s]
-    )
-
-    for i in range(len(ordered_statuses) - 1):
-        curr = ordered_statuses[i]
-        nxt = ordered_statuses[i + 1]
-        start_time = status_times[curr]
-        end_time = status_times[nxt]
-        diff = (end_time - start_time).total_seconds() / 3600.0
-        if diff >= 0:
-            durations[curr] = diff
-        else:
-            add_app_message("warning", f"Negative duration between {curr} and {nxt} in issue {issue_key}.")
-
-    if ordered_statuses:
-        last_status = ordered_statuses[-1]
-        if last_status not in durations:
-            end_time = datetime.now(tz=status_times[last_status].tzinfo)
-            diff = (end_time - status_times[last_status]).total_seconds() / 3600.0
-            if diff >= 0:
-                durations[last_status] = diff
-
-    return durations
-
-# === CALCULATE METRICS ===
-def calculate_metrics(transitions, created_time):
-    status_times = {}
-    for _, to_status, timestamp in sorted(transitions, key=lambda x: x[2]):
-        if to_status and to_status not in status_times:
-            status_times[to_status] = timestamp
-
-    lead_start = created_time
-    lead_end = status_times.get("Released") or status_times.get("Closed")
-    cycle_start = status_times.get("In Progress")
-    cycle_end = status_times.get("QA Complete")
-
-    lead_time = (lead_end - lead_start).total_seconds() / 3600.0 if lead_end else None
-    cycle_time = (cycle_end - cycle_start).total_seconds() / 3600.0 if cycle_start and cycle_end else None
-    return lead_time, cycle_time
-
-# === PARSE CHANGELOG ===
-def parse_changelog_from_history(changelog):
-    transitions = []
-    resolved_time = None
-
-    for change in sorted(changelog, key=lambda x: x['created']):
-        for item in change['items']:
-            if item['field'] == 'status':
-                from_status = item.get('fromString')
-                to_status = item.get('toString')
-                timestamp = datetime.strptime(change['created'], "%Y-%m-%dT%H:%M:%S.%f%z")
-                
-                transitions.append((from_status, to_status, timestamp))
-                if to_status and to_status.lower() in ['qa complete', 'done', 'closed']:
-                    resolved_time = timestamp
-    return transitions, resolved_time
-
-# === CALCULATE STATE DURATIONS ===
-def calculate_state_durations(issue_key, issue_data):   
-    changelog = issue_data['changelog']['histories']
-    created_time = datetime.strptime(issue_data['fields']['created'], "%Y-%m-%dT%H:%M:%S.%f%z")
-    transitions, resolved_time = parse_changelog_from_history(changelog)
-    durations = calculate_durations(transitions, created_time, issue_key)
-    lead_time, cycle_time = calculate_metrics(transitions, created_time)
-    return {
-        "lead_time_hours": lead_time,
-        "cycle_time_hours": cycle_time,
-        "durations_by_status_hours": dict(durations)
-    }
-
-# === EXTRACT ISSUE META ===
-def extract_issue_meta(key, issue_data):
-    fields = issue_data['fields']
-    if not fields:
-        add_app_message("error", f"No fields found for issue {key}.")
-        return {}
-    
-    histories = issue_data['changelog']['histories']
-    # print(f"histories = {histories}...")
-    sprints_field = fields.get('customfield_10010')
-
-    sprint_str = "N/A"
-    if isinstance(sprints_field, list):        
-        sprint_names = []
-        sprints_field.sort(key=lambda x: x.get('id', 0), reverse=True)
-        for sprint in sprints_field:
-            if isinstance(sprint, dict) and 'name' in sprint:
-                sprint_names.append(sprint['name'])
-        sprint_str = ", ".join(sprint_names) if sprint_names else "N/A"
-
-    # Fix: Ensure Story Points are explicitly converted to int if numeric, handle None/NaN
-    story_points_value = fields.get(CUSTOM_FIELD_STORY_POINTS_ID, None) # Default to None if not found
-    if story_points_value is None or (isinstance(story_points_value, float) and np.isnan(story_points_value)):
-        story_points_value = "N/A" # Display "N/A" for missing values
-    elif isinstance(story_points_value, (int, float)):
-        story_points_value = int(story_points_value) # Cast to int
-    elif isinstance(story_points_value, str) and story_points_value.replace('.','',1).isdigit():
-        try:
-            story_points_value = int(float(story_points_value)) # Handle '1.0' as string
-        except ValueError:
-            story_points_value = "N/A" # Fallback if string is not convertible to number
-    else:
-        story_points_value = str(story_points_value) # Keep as string if some other non-numeric type
-
-    failed_qa_count = count_transitions(histories, "In Testing", "Rejected")
-    if failed_qa_count is None:
-        failed_qa_count = 0  # Default to 0 if no transitions found
-
-    logged_time_in_seconds = get_logged_time(histories)      
-    # st.info(f"Extracted issue meta for {key}: Type={fields['issuetype']['name']}, Summary={fields['summary']}, Assignee={fields['assignee']['displayName'] if fields['assignee'] else 'Unassigned'}, Status={fields['status']['name']}, Story Points={story_points_value}, Sprints={sprint_str}, Failed QA Count={failed_qa_count}, Logged Time={logged_time}")
-
-    return {
-        "Key": key,
-        "Type": fields['issuetype']['name'],
-        "Summary": fields['summary'],
-        "Assignee": fields['assignee']['displayName'] if fields['assignee'] else "Unassigned",
-        "Status": fields['status']['name'],
-        "Story Points": story_points_value, # Use the potentially converted int/string value
-        "Sprints": sprint_str,
-        "Failed QA Count": failed_qa_count,
-        "Logged Time": seconds_to_hm(logged_time_in_seconds),
-    }
-
-# === GENERATE HEADERS ===
-def generate_headers():
-    return ["Key", "Type", "Summary", "Assignee", "Status", "Story Points", "Sprints", "Failed QA Count", "Logged Time", "Cycle Time", "Lead Time"] + WORKFLOW_STATUSES
-
-# === CREATE ROW FOR EXPORT ===
-def create_row(meta, metrics, selected_team_name):
-    durations = metrics['durations_by_status_hours']
-    row = {
-        **meta,
-        "Cycle Time": format_duration(metrics['cycle_time_hours']),
-        "Lead Time": format_duration(metrics['lead_time_hours']),
-    }
-    
-    # --- Fix: Embed diamond differentiators in Sprints column in DataFrame ---
-    if "Sprints" in meta and selected_team_name:
-        original_sprints_str = meta["Sprints"]
-        if original_sprints_str != "N/A":
-            current_sprint_full, previous_sprint_full = get_current_and_previous_sprints(selected_team_name)
-            
-            sprint_values_in_cell = [s.strip() for s in original_sprints_str.split(",")]
-            updated_sprints = []
-            for sprint_text in sprint_values_in_cell:
-                sprint_clean = sprint_text.replace("🔶", "").replace("🔷", "").strip()
-
-                if sprint_clean == current_sprint_full:
-                    updated_sprints.append(f"{sprint_clean} 🔶")
-                elif sprint_clean == previous_sprint_full:
-                    updated_sprints.append(f"{sprint_clean} 🔷")
-                else:
-                    updated_sprints.append(sprint_text)
-
-            row["Sprints"] = ", ".join(updated_sprints)
-    # --- End Fix ---
-
-    for status in WORKFLOW_STATUSES:
-        duration_in_hours = durations.get(status)
-        row[status] = format_duration(duration_in_hours)
-    return row
-
 # --- Pandas Styling Functions for UI Display ---
-def highlight_breached_durations_ui(s, cycle_threshold_hours, lead_threshold_hours):
-    cycle_time_hours = duration_to_hours(s.get("Cycle Time"))
-    lead_time_hours = duration_to_hours(s.get("Lead Time"))
-
-    styles = [''] * len(s)
-
-    try:
-        if "Cycle Time" in s.index:
-            cycle_col_idx = s.index.get_loc("Cycle Time")
-            if cycle_time_hours is not None and cycle_time_hours > cycle_threshold_hours:
-                styles[cycle_col_idx] = 'background-color: #FFD580' # Orange
-        
-        if "Lead Time" in s.index:
-            lead_col_idx = s.index.get_loc("Lead Time")
-            if lead_time_hours is not None and lead_time_hours > lead_threshold_hours:
-                styles[lead_col_idx] = 'background-color: #FFD580' # Orange
-    except KeyError:
-        pass
-
+BREACHED_DURATION_STYLE = 'background-color: #FFD580' # Orange
+# calculate_heatmap_color only varies the green/blue byte, so every possible red shade is one of 256 styles
+WORKFLOW_HEATMAP_STYLES = np.array([f"background-color: #FF{level:02X}{level:02X}" for level in range(256)], dtype=object)
+
+def build_report_preview_styles(df, cycle_threshold_hours, lead_threshold_hours, story_point_bounds=None):
+    # One CSS string per cell, computed column-wise instead of with per-row Styler.apply passes
+    styles = pd.DataFrame('', index=df.index, columns=df.columns)
+    if "Cycle Time" in df.columns:
+        styles.loc[(df["Cycle Time"] > cycle_threshold_hours).to_numpy(), "Cycle Time"] = BREACHED_DURATION_STYLE
+    if "Lead Time" in df.columns:
+        styles.loc[(df["Lead Time"] > lead_threshold_hours).to_numpy(), "Lead Time"] = BREACHED_DURATION_STYLE
+
+    heatmap_cols = [col for col in WORKFLOW_STATUSES if col not in {"Released", "Closed"} and col in df.columns]
+    if heatmap_cols:
+        styles[heatmap_cols] = workflow_heatmap_styles(df[heatmap_cols].to_numpy(dtype=float))
+    if "Story Points" in df.columns:
+        styles["Story Points"] = story_points_gradient_styles(df["Story Points"], story_point_bounds)
     return styles
 
-def apply_workflow_heatmap_ui(s):
-    workflow_cols_in_row = [col for col in WORKFLOW_STATUSES if col not in {"Released", "Closed"} and col in s.index]
-
-    row_durations_numerical = []
-    for col_name in workflow_cols_in_row: # Use filtered subset
-        hours = duration_to_hours(s.get(col_name))
-        if hours is not None:
-            row_durations_numerical.append(hours)
-    
-    if not row_durations_numerical:
-        return [''] * len(s)
-
-    min_val, max_val = min(row_durations_numerical), max(row_durations_numerical)
-    delta = max_val - min_val if max_val != min_val else 1
-
-    styles = [''] * len(s)
-
-    for col_idx, col_name in enumerate(s.index):
-        if col_name in workflow_cols_in_row: # Apply style only to filtered subset columns
-            hours = duration_to_hours(s.get(col_name))
-            if hours is not None:
-                intensity = (hours - min_val) / delta
-                hex_color = calculate_heatmap_color(intensity)
-                styles[col_idx] = f'background-color: #{hex_color[2:]}'
+def workflow_heatmap_styles(hours):
+    levels, present = workflow_heatmap_levels(hours)
+    styles = np.full(hours.shape, '', dtype=object)
+    styles[present] = WORKFLOW_HEATMAP_STYLES[levels[present]]
     return styles
 
-def apply_story_points_gradient_ui(s, min_sp_data, max_sp_data):
-    styles = [''] * len(s)
-
+def get_story_point_bounds(story_points):
+    sp_values = pd.to_numeric(story_points, errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+    counted = sp_values >= 0
+    if not counted.any():
+        return None
+    return sp_values[counted].min(), sp_values[counted].max()
+
+def story_points_gradient_styles(story_points, story_point_bounds=None):
+    # Story points arrive as display strings ("5" / "N/A"); only whole numbers >= 1 are shaded.
+    # A paged preview passes the whole report's bounds so a page is shaded as it would be in the full table.
+    sp_values = pd.to_numeric(story_points, errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+    if story_point_bounds is None:
+        story_point_bounds = get_story_point_bounds(story_points)
+    if story_point_bounds is None:
+        return [''] * len(sp_values)
+    min_sp_data, max_sp_data = story_point_bounds
     if max_sp_data == min_sp_data:
-        single_color_val = max(0, min(1, (min_sp_data - 1) / 20.0))
-        single_hex = calculate_heatmap_color_blue_gradient(single_color_val)
-        return [f'background-color: #{single_hex[2:]}'] * len(s)
-
-    delta_sp = max_sp_data - min_sp_data
-    if delta_sp == 0: delta_sp = 1
-
-    for idx, val in enumerate(s):
-        try:
-            sp_value = float(val)
-            if sp_value >= 1 and sp_value == int(sp_value):
-                normalized_value = (sp_value - min_sp_data) / delta_sp
-                normalized_value = max(0, min(1, normalized_value))
-                
-                hex_color = calculate_heatmap_color_blue_gradient(normalized_value)
-                styles[idx] = f'background-color: #{hex_color[2:]}'
-        except ValueError:
-            pass
-    return styles
+        single_hex = calculate_heatmap_color_blue_gradient(max(0, min(1, (min_sp_data - 1) / 20.0)))
+        return [f'background-color: #{single_hex[2:]}'] * len(sp_values)
+
+    shaded = (sp_values >= 1) & (sp_values == np.floor(sp_values))
+    intensity = np.clip((sp_values - min_sp_data) / (max_sp_data - min_sp_data), 0, 1)
+    channels = [np.trunc(start + (end - start) * intensity) for start, end in zip(BLUE_GRADIENT_START, BLUE_GRADIENT_END)]
+    return [
+        f'background-color: #{int(r):02X}{int(g):02X}{int(b):02X}' if is_shaded else ''
+        for is_shaded, r, g, b in zip(shaded, *channels)
+    ]
 
-def calculate_heatmap_color(intensity):
-    r = 255; g = int(200 - 120 * intensity); b = int(200 - 120 * intensity)
-    r = max(0, min(255, r)); g = max(0, min(255, g)); b = max(0, min(255, b))
-    return f"FF{r:02X}{g:02X}{b:02X}"
+BLUE_GRADIENT_START = (230, 240, 250)
+BLUE_GRADIENT_END = (21, 101, 192)
 
 def calculate_heatmap_color_blue_gradient(intensity):
-    r_start, g_start, b_start = (230, 240, 250)
-    r_end, g_end, b_end = (21, 101, 192)
+    r_start, g_start, b_start = BLUE_GRADIENT_START
+    r_end, g_end, b_end = BLUE_GRADIENT_END
 
     r = int(r_start + (r_end - r_start) * intensity)
     g = int(g_start + (g_end - g_start) * intensity)
@@ -1006,6 +420,213 @@ def calculate_heatmap_color_blue_gradient(intensity):
     
     return f"FF{r:02X}{g:02X}{b:02X}"
 
+# --- Background Report Job Display ---
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def render_report_job_status():
+    job = get_job_runner().get(st.session_state.report_job_id) if st.session_state.report_job_id else None
+    if job is None:
+        return
+    job.heartbeat()
+    # Worker threads never touch session state; their events are drained here, on the script thread
+    st.session_state.report_job_events = summarize_job_events(job.drain_events(), st.session_state.report_job_events)
+
+    if job.status in ("queued", "running"):
+        progress = job.done / job.total if job.total else 0.0
+        progress_text = f"{job.phase}: {job.done}/{job.total} issues" if job.total else f"{job.phase}..."
+        eta_seconds = job.eta_seconds()
+        if eta_seconds is not None:
+            progress_text += f" (ETA {int(eta_seconds // 60)}m {int(eta_seconds % 60):02d}s)"
+        st.progress(min(progress, 1.0), text=progress_text)
+        st.caption(format_job_event_summary(st.session_state.report_job_events))
+        job_alerts = [(level, f"[{timestamp}] {message}") for level, timestamp, message in st.session_state.report_job_events["log"] if level in ("error", "critical", "warning")]
+        if job_alerts:
+            with st.expander(f"{len(job_alerts)} warnings/errors so far"):
+                for level, message in job_alerts[-20:]:
+                    (st.warning if level == "warning" else st.error)(message)
+        if st.button("Cancel report", key=f"cancel_job_{job.job_id}"):
+            job.cancel()
+        render_report_job_preview(job)
+        return
+
+    publish_report_job(job)
+    st.rerun(scope="app")
+
+def render_report_job_preview(job):
+    # Only rows that arrived since the last poll become row dicts, and only the latest LIVE_PREVIEW_MAX_ROWS
+    # are framed and formatted; the full, sortable table replaces this once the job finishes
+    preview_rows = st.session_state.report_job_preview_rows
+    preview_rows.extend(create_row(meta, metrics, st.session_state.report_job_team) for meta, metrics in job.partial_results(len(preview_rows)))
+    if not preview_rows:
+        return
+    st.caption(f"Preview: {len(preview_rows)} rows so far (showing the latest {min(len(preview_rows), LIVE_PREVIEW_MAX_ROWS)}). The Excel report is built once all issues are in.")
+    st.dataframe(format_report_values(build_report_dataframe(preview_rows[-LIVE_PREVIEW_MAX_ROWS:])), hide_index=True, height=300)
+
+def publish_report_job(job):
+    st.session_state.report_job_id = None
+    st.session_state.report_job_preview_rows = []
+    for level, timestamp, message in job.messages():
+        st.session_state.app_messages.append(f"[{timestamp}] [{level.upper()}] {message}")
+    if st.session_state.report_job_events is not None:
+        st.session_state.app_messages.append(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] [INFO] Job events: {format_job_event_summary(st.session_state.report_job_events)}")
+        st.session_state.report_job_events = None
+    st.session_state.report_job_alerts = [(level, f"[{timestamp}] {message}") for level, timestamp, message in job.messages() if level in ("error", "critical", "warning")]
+
+    if job.status == "cancelled":
+        st.session_state.report_job_alerts.append(("warning", "Report generation was cancelled."))
+        return
+    if job.status != "done":
+        return
+    cached_report, cache_age_seconds = job.result
+    st.session_state.generated_report_cache_age = cache_age_seconds
+    st.session_state.generated_report_id = job.job_id
+    st.session_state.generated_report_perf = job.perf
+    st.session_state.generated_report_profiler = job.profiler
+    st.session_state.report_preview_cache = OrderedDict()
+    if cached_report is None:
+        st.session_state.generated_report_df_display = None
+        st.session_state.generated_report_file_buffer = None
+        st.session_state.generated_report_filename = None
+    else:
+        report_bytes, output_filename, report_df_for_display = cached_report
+        st.session_state.generated_report_file_buffer = io.BytesIO(report_bytes)
+        st.session_state.generated_report_filename = output_filename
+        st.session_state.generated_report_df_display = report_df_for_display
+
+# --- Paginated Report Preview ---
+def format_story_points_for_display(story_points):
+    return story_points.astype("string").fillna("N/A").astype(object)
+
+def get_report_preview_cached(cache_key, compute):
+    # Per-session LRU so paging back and forth or rerunning for another widget is a dict lookup
+    preview_cache = st.session_state.report_preview_cache
+    if cache_key in preview_cache:
+        preview_cache.move_to_end(cache_key)
+        return preview_cache[cache_key]
+    value = compute()
+    preview_cache[cache_key] = value
+    while len(preview_cache) > PREVIEW_CACHE_MAX_ENTRIES:
+        preview_cache.popitem(last=False)
+    return value
+
+def get_report_preview_rows(df, sort_column, sort_descending, filter_column, filter_text, key_search):
+    # Row positions of the filtered, sorted report; text filters match what the preview shows
+    mask = pd.Series(True, index=df.index)
+    if key_search:
+        mask &= df["Key"].str.contains(key_search, case=False, regex=False)
+    if filter_column and filter_text:
+        if filter_column in REPORT_DURATION_COLUMNS:
+            shown_values = df[filter_column].map(format_duration)
+        elif filter_column == "Story Points":
+            shown_values = format_story_points_for_display(df[filter_column])
+        else:
+            shown_values = df[filter_column].astype(str)
+        mask &= shown_values.str.contains(filter_text, case=False, regex=False)
+    rows = df[mask]
+    if sort_column:
+        rows = rows.sort_values(sort_column, ascending=not sort_descending, na_position="last", kind="stable")
+    return df.index.get_indexer(rows.index)
+
+def build_styled_report_page(df, row_positions, story_point_bounds, cycle_threshold_hours, lead_threshold_hours):
+    page_df = df.iloc[row_positions].copy()
+    page_df.index = row_positions + 1
+    if "Story Points" in page_df.columns:
+        page_df["Story Points"] = format_story_points_for_display(page_df["Story Points"])
+    # Threshold highlight (orange), workflow heatmap (red) and story points gradient (blue) in one pass
+    page_styles = build_report_preview_styles(page_df, cycle_threshold_hours, lead_threshold_hours, story_point_bounds)
+    styled_page = page_df.style.apply(lambda _: page_styles, axis=None)
+    duration_cols_present = [col for col in REPORT_DURATION_COLUMNS if col in page_df.columns]
+    return styled_page.format(format_duration, subset=duration_cols_present, na_rep="N/A")
+
+def render_report_preview(df, cycle_threshold_hours, lead_threshold_hours):
+    report_id = st.session_state.generated_report_id
+    columns = list(df.columns)
+
+    control_cols = st.columns([2, 2, 1, 2, 2, 1])
+    key_search = control_cols[0].text_input("Search key", key="report_preview_key_search").strip()
+    sort_column = control_cols[1].selectbox("Sort by", [None] + columns, format_func=lambda col: "Report order" if col is None else col, key="report_preview_sort_column")
+    sort_descending = control_cols[2].checkbox("Descending", key="report_preview_sort_descending")
+    filter_column = control_cols[3].selectbox("Filter column", [None] + columns, format_func=lambda col: "No filter" if col is None else col, key="report_preview_filter_column")
+    filter_text = control_cols[4].text_input("Contains", key="report_preview_filter_text", disabled=filter_column is None).strip()
+    page_size = control_cols[5].selectbox("Rows", PREVIEW_PAGE_SIZES, index=1, key="report_preview_page_size")
+
+    view_key = (report_id, sort_column, sort_descending, filter_column, filter_text, key_search)
+    row_positions = get_report_preview_cached(("rows",) + view_key, lambda: get_report_preview_rows(df, sort_column, sort_descending, filter_column, filter_text, key_search))
+    story_point_bounds = get_report_preview_cached(("story_point_bounds", report_id), lambda: get_story_point_bounds(df["Story Points"]) if "Story Points" in df.columns else None)
+
+    page_count = max(1, -(-len(row_positions) // page_size))
+    if st.session_state.get("report_preview_page", 1) > page_count:
+        st.session_state.report_preview_page = page_count
+    page = st.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, step=1, key="report_preview_page")
+    st.markdown(f"**Matching Records:** {len(row_positions)}")
+    if not len(row_positions):
+        return
+
+    page_key = ("page",) + view_key + (page_size, page, cycle_threshold_hours, lead_threshold_hours)
+    styled_page = get_report_preview_cached(page_key, lambda: timed_preview_step("preview: style page", lambda: build_styled_report_page(
+        df, row_positions[(page - 1) * page_size:page * page_size], story_point_bounds, cycle_threshold_hours, lead_threshold_hours
+    )))
+    timed_preview_step("preview: render page", lambda: st.dataframe(styled_page, use_container_width=True, column_config={
+        "Key": st.column_config.Column(
+            "Key",
+            width="small",
+            help="Jira Issue Key"
+        ),
+        "Type": st.column_config.Column(
+            "Type",
+            width="small",
+            help="Jira Issue Type"
+        )
+    }))
+
+def timed_preview_step(name, step):
+    # Preview work happens after the job has finished, so it is added to that report's recorder (and profile) here
+    started_at = time.perf_counter()
+    if st.session_state.generated_report_profiler is not None:
+        with st.session_state.generated_report_profiler.profile_thread():
+            result = step()
+    else:
+        result = step()
+    if st.session_state.generated_report_perf is not None:
+        st.session_state.generated_report_perf.record(name, time.perf_counter() - started_at)
+    return result
+
+# --- Performance Panel ---
+def render_performance_panel():
+    with st.expander("Performance"):
+        perf = st.session_state.generated_report_perf
+        if perf is None:
+            st.info("Generate a report to see where its time went.")
+            return
+        snapshot = perf.snapshot()
+        counters = snapshot["counters"]
+        if st.session_state.generated_report_cache_age is not None:
+            st.caption("This report was served from the report cache, so only the cache lookup and preview were timed.")
+        metric_cols = st.columns(3)
+        metric_cols[0].metric("Downloaded", f"{counters.get('bytes downloaded', 0) / 1_000_000:.1f} MB")
+        metric_cols[1].metric("HTTP requests", next((step["count"] for step in snapshot["steps"] if step["step"] == "http request"), 0))
+        metric_cols[2].metric("Retries", counters.get("http retries", 0))
+        st.dataframe(pd.DataFrame(snapshot["steps"]), hide_index=True, use_container_width=True)
+        st.download_button(
+            label="Download timings (JSON)",
+            data=json.dumps({"report": st.session_state.generated_report_filename, **snapshot}, indent=2),
+            file_name=f"{(st.session_state.generated_report_filename or 'report').rsplit('.', 1)[0]}_timings.json",
+            mime="application/json",
+            key="download_perf_json"
+        )
+
+        profiler = st.session_state.generated_report_profiler
+        if profiler is None:
+            return
+        st.markdown(f"##### Profile: top {PROFILE_TOP_N} functions by self time")
+        st.dataframe(pd.DataFrame(profiler.top_functions()), hide_index=True, use_container_width=True)
+        st.download_button(
+            label="Download profile",
+            data=profiler.artifact(),
+            file_name=f"{(st.session_state.generated_report_filename or 'report').rsplit('.', 1)[0]}_profile{profiler.artifact_suffix}",
+            mime="application/octet-stream",
+            key="download_profile"
+        )
+
 # --- Main Streamlit App Layout ---
 def main():
     st.set_page_config(layout="wide", page_title="Jira Cycle Time Reporter", page_icon=":bar_chart:")
@@ -1032,6 +653,16 @@ def main():
     if 'generated_report_df_display' not in st.session_state: st.session_state.generated_report_df_display = None
     if 'generated_report_file_buffer' not in st.session_state: st.session_state.generated_report_file_buffer = None
     if 'generated_report_filename' not in st.session_state: st.session_state.generated_report_filename = None
+    if 'generated_report_cache_age' not in st.session_state: st.session_state.generated_report_cache_age = None
+    if 'report_job_id' not in st.session_state: st.session_state.report_job_id = None
+    if 'report_job_alerts' not in st.session_state: st.session_state.report_job_alerts = []
+    if 'report_job_team' not in st.session_state: st.session_state.report_job_team = None
+    if 'report_job_preview_rows' not in st.session_state: st.session_state.report_job_preview_rows = []
+    if 'report_job_events' not in st.session_state: st.session_state.report_job_events = None
+    if 'generated_report_id' not in st.session_state: st.session_state.generated_report_id = None
+    if 'report_preview_cache' not in st.session_state: st.session_state.report_preview_cache = OrderedDict()
+    if 'generated_report_perf' not in st.session_state: st.session_state.generated_report_perf = None
+    if 'generated_report_profiler' not in st.session_state: st.session_state.generated_report_profiler = None
 
 
     # Display global messages at the very top
@@ -1055,6 +686,32 @@ def main():
         cycle_threshold_hours = cycle_time_threshold_days * 24
         lead_threshold_hours = lead_time_threshold_days * 24
 
+        excel_mode_name = st.selectbox("Excel highlighting", options=list(EXCEL_EXPORT_MODES.keys()), key="excel_mode_selector", help="Conditional formatting keeps the durations in hidden numeric columns and lets Excel apply the highlights; smaller files for large reports.")
+
+        st.header("Fetch Options")
+        bulk_fetch = st.checkbox("Bulk fetch (issues and changelogs in search pages)", value=True, key="bulk_fetch_checkbox", help="Fetch fields and changelogs 100 issues per request instead of one request per issue.")
+        st.header("Issue Cache")
+        use_issue_cache = st.checkbox("Use local issue cache", value=True, key="use_issue_cache_checkbox", help="Reuse issues from disk when Jira reports them unchanged (same 'updated' timestamp).")
+        force_refresh = st.checkbox("Force refresh (ignore cached issues)", value=False, key="force_refresh_checkbox")
+        delta_refresh = st.checkbox("Delta refresh (only changed issues)", value=False, key="delta_refresh_checkbox", help="Re-collect only issues updated since the last run of the same query and reuse the other rows. Always skips the shared report cache; with Force refresh the changed issues are also refetched instead of read from the issue cache.")
+        if st.button("Clear issue cache"):
+            get_issue_cache().clear()
+            get_report_snapshot_store().clear()
+            add_app_message("Info", "Issue cache cleared.")
+
+        st.header("Concurrency")
+        concurrency_floor = st.number_input("Min parallel fetches", min_value=1, max_value=CONCURRENCY_CEILING, value=CONCURRENCY_FLOOR, step=1, key="concurrency_floor_input", help="Lower bound for the adaptive per-issue fetch concurrency.")
+        fetch_engine_name = st.selectbox("Fetch engine", options=list(FETCH_ENGINES.keys()), key="fetch_engine_selector", help="Asyncio keeps hundreds of requests in flight from one thread (requires aiohttp).")
+        fetch_engine = FETCH_ENGINES[fetch_engine_name]
+        concurrency_ceiling = st.number_input("Max parallel fetches", min_value=1, max_value=128, value=CONCURRENCY_CEILING, step=1, key="concurrency_ceiling_input", help="Upper bound for the adaptive per-issue fetch concurrency.")
+
+        # Profiling is off unless JIRA_METRICS_PROFILE is set or the page is opened with ?profile=1
+        profile_mode = PROFILE_MODE
+        if "profile" in st.query_params:
+            st.header("Profiling")
+            profile_options = [None] + list(PROFILE_MODES)
+            profile_mode = st.selectbox("Profile report generation", profile_options, index=profile_options.index(PROFILE_MODE) if PROFILE_MODE in profile_options else 0, format_func=lambda mode: "Off" if mode is None else mode, key="profile_mode_selector", help="cprofile traces every call (slower run); sampling snapshots stacks every few ms.")
+
         st.header("Connect & Verify Credentials")
         if st.button("Connect to Jira and Verify"):
             st.session_state.app_messages = [] 
@@ -1112,29 +769,33 @@ def main():
                     key="ticket_keys_widget"
                 )
         
-        elif st.session_state.selected_search_option_key in [2, 3]: # Team and Current Sprint OR Team and Duration
+        elif st.session_state.selected_search_option_key in [2, 3, 4]: # Team and Current Sprint OR Team(s) and Duration
             with col_team_select: # Team Selection (second column for these options)
-                team_names_display = list(TEAMS_DATA.keys())
-                current_team_name_for_selector = st.session_state.selected_team_name
-                current_team_idx = team_names_display.index(current_team_name_for_selector) if current_team_name_for_selector in team_names_display else 0
+                if st.session_state.selected_search_option_key == 4: # Several teams in one run
+                    st.multiselect("Select Teams", options=list(TEAMS_DATA.keys()), default=list(TEAMS_DATA.keys()), key="batch_teams_widget_key", help="Each team gets its own sheet plus a cross-team summary.")
+                    st.selectbox("Batch Output", options=list(BATCH_OUTPUT_FORMATS.keys()), key="batch_output_widget_key")
+                else:
+                    team_names_display = list(TEAMS_DATA.keys())
+                    current_team_name_for_selector = st.session_state.selected_team_name
+                    current_team_idx = team_names_display.index(current_team_name_for_selector) if current_team_name_for_selector in team_names_display else 0
                 
-                # Callback to update session state (rerun will happen automatically from on_change)
-                def on_team_selector_change_callback():
-                    st.session_state.selected_team_name = st.session_state.team_selector_widget_key
-                    st.session_state.selected_team_id = TEAMS_DATA.get(st.session_state.selected_team_name)
-                    # No explicit st.rerun() here, as the widget's on_change already triggers one.
-
-                st.selectbox(
-                    "Select Team",
-                    options=team_names_display,
-                    index=current_team_idx,
-                    key="team_selector_widget_key",
-                    on_change=on_team_selector_change_callback,
-                    help="Select the team to filter issues."
-                )
+                    # Callback to update session state (rerun will happen automatically from on_change)
+                    def on_team_selector_change_callback():
+                        st.session_state.selected_team_name = st.session_state.team_selector_widget_key
+                        st.session_state.selected_team_id = TEAMS_DATA.get(st.session_state.selected_team_name)
+                        # No explicit st.rerun() here, as the widget's on_change already triggers one.
+
+                    st.selectbox(
+                        "Select Team",
+                        options=team_names_display,
+                        index=current_team_idx,
+                        key="team_selector_widget_key",
+                        on_change=on_team_selector_change_callback,
+                        help="Select the team to filter issues."
+                    )
             
             with col_duration_select: # Duration Selection (third column for option 3)
-                if st.session_state.selected_search_option_key == 3:
+                if st.session_state.selected_search_option_key in [3, 4]:
                     duration_names = list(DURATIONS_DATA.keys())
                     current_duration_name_for_selector = st.session_state.selected_duration_name
                     current_duration_idx = duration_names.index(current_duration_name_for_selector) if current_duration_name_for_selector in duration_names else 0
@@ -1167,8 +828,6 @@ def main():
             st.markdown("Click the button below to generate the report based on your selections.")
 
             if st.button("Generate Report"):
-                start_time = datetime.now()
-
                 st.session_state.app_messages = [] 
                 JQL_QUERY = ""
                 file_label = ""
@@ -1192,8 +851,9 @@ def main():
                     if st.session_state.selected_search_option_key == 2: # Team and Current Sprint
                         JQL_QUERY = f"'Team[Team]' = \"{selected_team_id_for_report}\" AND sprint in openSprints() AND issuetype NOT IN (Sub-task) ORDER BY KEY"
                         file_label = f"{selected_team_name_for_report.lower().replace(' ', '_')}_current_sprint_asof_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-                    elif st.session_state.selected_search_option_key == 3: # Team and Duration
+                    elif st.session_state.selected_search_option_key in [3, 4]: # Team(s) and Duration
                         duration_func_str = st.session_state.selected_duration_func
+                        custom_date_range = None
 
                         if duration_func_str == "customDateRange()":
                             start_date = st.session_state.selected_custom_start_date
@@ -1205,21 +865,21 @@ def main():
                                 add_app_message("error", "Start Date cannot be after End Date.")
                                 st.stop()
                             
-                            start_date_str = start_date.strftime("%Y-%m-%d")
-                            end_date_str = end_date.strftime("%Y-%m-%d")
-                            JQL_QUERY = (
-                                f"'Team[Team]' = \"{selected_team_id_for_report}\" AND issuetype NOT IN (Epic, Sub-task) "
-                                f"AND created >= \"{start_date_str}\" AND created <= \"{end_date_str}\" "
-                                f"AND status IN ({STATUS_INPUT}) ORDER BY KEY"
+                            custom_date_range = (start_date, end_date)
+
+                        if st.session_state.selected_search_option_key == 4:
+                            if not st.session_state.batch_teams_widget_key:
+                                add_app_message("error", "Please select at least one Team.")
+                                st.stop()
+                            batch_team_jqls = OrderedDict(
+                                (team_name, build_team_duration_jql(TEAMS_DATA[team_name], duration_func_str, custom_date_range))
+                                for team_name in st.session_state.batch_teams_widget_key
                             )
-                            file_label = f"{selected_team_name_for_report.lower().replace(' ', '_')}_custom_{start_date_str}_to_{end_date_str}_asof_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+                            JQL_QUERY = " OR ".join(f"({team_jql.replace(' ORDER BY KEY', '')})" for team_jql in batch_team_jqls.values()) + " ORDER BY KEY"
+                            file_label = build_team_duration_label("teams", st.session_state.selected_duration_name, custom_date_range)
                         else:
-                            JQL_QUERY = (
-                                f"'Team[Team]' = \"{selected_team_id_for_report}\" AND issuetype NOT IN (Epic, Sub-task) "
-                                f"AND created > {duration_func_str} AND status IN ({STATUS_INPUT}) ORDER BY KEY"
-                            )   
-                            duration_name_from_display = st.session_state.selected_duration_name
-                            file_label = f"{selected_team_name_for_report.lower().replace(' ', '_')}_{duration_name_from_display.lower().replace(' ', '_')}_asof_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+                            JQL_QUERY = build_team_duration_jql(selected_team_id_for_report, duration_func_str, custom_date_range)
+                            file_label = build_team_duration_label(selected_team_name_for_report, st.session_state.selected_duration_name, custom_date_range)
                 
                 if not JQL_QUERY:
                     add_app_message("error", "Failed to generate JQL query. Please check your selections.")
@@ -1227,44 +887,59 @@ def main():
 
                 add_app_message("Info", f"Generated JQL Query: `{JQL_QUERY}`")
 
-                with st.spinner("Fetching issues and generating report..."):
-                    auth_url, auth_username, auth_api_token = st.session_state.jira_conn_details
-
-                    issue_keys = get_issues_by_jql(JQL_QUERY, auth_url, auth_username, auth_api_token)
-                    
-                    if not issue_keys:
-                        add_app_message("warning", "No issues found matching the JQL query. Report will be empty.")
-                        st.session_state.generated_report_df_display = None
-                        st.session_state.generated_report_file_buffer = None
-                        st.session_state.generated_report_filename = None
-                    else:
-                        add_app_message("Info", f"Found {len(issue_keys)} issues matching the JQL query.")
-                        output_buffer, output_filename, report_df_for_display = generate_report_streamlit(
-                            issue_keys, 
-                            auth_url, 
-                            auth_username, 
-                            auth_api_token,
-                            cycle_threshold_hours, 
-                            lead_threshold_hours, 
-                            file_label,
-                            selected_team_name_for_report
-                        )
-                        st.session_state.generated_report_file_buffer = output_buffer
-                        st.session_state.generated_report_filename = output_filename
-                        st.session_state.generated_report_df_display = report_df_for_display
-                        add_app_message("Info", f"Report generated! Ready for download: {output_filename}")
-
-                        end_time = datetime.now()
-                        add_app_message("Info", f"Success: Data fetching complete! Duration: {end_time - start_time}")
+                auth_url, auth_username, auth_api_token = st.session_state.jira_conn_details
+                fetch_options = {
+                    "bulk_fetch": bulk_fetch,
+                    "fetch_engine": resolve_fetch_engine(fetch_engine),
+                    "use_issue_cache": use_issue_cache,
+                    "force_refresh": force_refresh,
+                    "delta_refresh": delta_refresh,
+                    "concurrency_limits": (concurrency_floor, max(concurrency_floor, concurrency_ceiling)),
+                    "excel_mode": EXCEL_EXPORT_MODES[excel_mode_name],
+                }
+                previous_job = get_job_runner().get(st.session_state.report_job_id) if st.session_state.report_job_id else None
+                if previous_job is not None:
+                    previous_job.cancel()
+                if st.session_state.selected_search_option_key == 4:
+                    split_files = BATCH_OUTPUT_FORMATS[st.session_state.batch_output_widget_key]
+                    job = get_job_runner().submit(
+                        file_label,
+                        lambda job: run_batch_report_job(
+                            job, batch_team_jqls, auth_url, auth_username, auth_api_token,
+                            cycle_threshold_hours, lead_threshold_hours, file_label, fetch_options, split_files
+                        ),
+                        profile_mode
+                    )
+                    selected_team_name_for_report = None
+                else:
+                    job = get_job_runner().submit(
+                        file_label,
+                        lambda job: run_report_job(
+                            job, JQL_QUERY, auth_url, auth_username, auth_api_token,
+                            cycle_threshold_hours, lead_threshold_hours, file_label, selected_team_name_for_report, fetch_options
+                        ),
+                        profile_mode
+                    )
+                st.session_state.report_job_id = job.job_id
+                st.session_state.report_job_alerts = []
+                st.session_state.report_job_team = selected_team_name_for_report
+                st.session_state.report_job_preview_rows = []
+                st.session_state.report_job_events = None
+
+            render_report_job_status()
+            for alert_level, alert_message in st.session_state.report_job_alerts:
+                (st.error if alert_level in ("error", "critical") else st.warning)(alert_message)
         
         with col2:
             if st.session_state.generated_report_file_buffer:
                 st.markdown("Once the report is generated, you can download it using the button below.")
+                if st.session_state.generated_report_cache_age is not None:
+                    st.info(f"Served from cache (age {int(st.session_state.generated_report_cache_age // 60)} min). Tick 'Force refresh' to rebuild it.")
                 st.download_button(
                     label="Download Report Excel",
                     data=st.session_state.generated_report_file_buffer,
                     file_name=st.session_state.generated_report_filename,
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                    mime="application/zip" if st.session_state.generated_report_filename.endswith(".zip") else "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
                 )
 
     # st.markdown("---")
@@ -1274,6 +949,7 @@ def main():
                 st.code(log_msg, language="text")
         else:
             st.info("No logs generated yet. Click 'Generate Metrics' to see activity.")
+    render_performance_panel()
    
 
     # --- Display the generated report preview if available ---
@@ -1293,63 +969,7 @@ def main():
         
         st.markdown(f"**Total Records:** {df_size[0]}") # Display total number of records
 
-        # --- Fix: Convert Story Points to string to avoid decimals and handle N/A ---
-        df_for_display_final = st.session_state.generated_report_df_display.copy()
-        df_for_display_final.index = df_for_display_final.index + 1
-
-        if "Story Points" in df_for_display_final.columns:
-            df_for_display_final["Story Points"] = df_for_display_final["Story Points"].apply(
-                lambda x: str(int(x)) if isinstance(x, (int, float)) and not pd.isna(x) else 'N/A' # Convert to int then str, handle NaN
-            )
-
-        styled_df = df_for_display_final.style # Start styling here
-
-        # 1. Highlight Breached Durations (Orange)
-        styled_df = styled_df.apply(
-            lambda s: highlight_breached_durations_ui(s, cycle_threshold_hours, lead_threshold_hours), axis=1
-        )
-        
-        # 2. Apply Workflow Heatmap (Red Gradient)
-        workflow_cols_present = [col for col in WORKFLOW_STATUSES if col in df_for_display_final.columns]
-        if workflow_cols_present:
-                styled_df = styled_df.apply(lambda row: apply_workflow_heatmap_ui(row), axis=1, subset=workflow_cols_present)
-
-        # 3. Apply Story Points Gradient (Blue Gradient)
-        if "Story Points" in df_for_display_final.columns:
-            temp_sp_series = df_for_display_final["Story Points"].apply(lambda x: float(str(x)) if str(x).replace('.','',1).isdigit() else np.nan)
-            
-            numerical_sp_values = temp_sp_series.dropna()
-
-            if not numerical_sp_values.empty:
-                min_sp_data = numerical_sp_values.min()
-                max_sp_data = numerical_sp_values.max()
-                
-                if max_sp_data == min_sp_data:
-                        single_color_val = max(0, min(1, (min_sp_data - 1) / 20.0))
-                        single_hex = calculate_heatmap_color_blue_gradient(single_color_val)
-                        styled_df = styled_df.apply(
-                            lambda s_col: [f'background-color: #{single_hex[2:]}'] * len(s_col), 
-                            subset=["Story Points"]
-                        )
-                else:
-                    styled_df = styled_df.apply(
-                        lambda s_col: apply_story_points_gradient_ui(s_col, min_sp_data, max_sp_data), 
-                        subset=["Story Points"]
-                    )
-        # --- End Styling ---
-
-        st.dataframe(styled_df, use_container_width=True, column_config={
-            "Key": st.column_config.Column(
-                "Key",
-                width="small",
-                help="Jira Issue Key"
-            ),
-            "Type": st.column_config.Column(
-                "Type",
-                width="small",
-                help="Jira Issue Type"
-            )
-        })
+        render_report_preview(st.session_state.generated_report_df_display, cycle_threshold_hours, lead_threshold_hours)
 
         # --- Display the legend from the image ---
         st.markdown("##### Legend")